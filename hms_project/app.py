@@ -8,12 +8,28 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hms_project.settings')
 django.setup()
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.contrib.auth import authenticate
-from core.models import Specialty
 from patient_app.models import Patient
 from doctor_app.models import Doctor, Appointment, MedicalRecord
-from datetime import date, time
+from core import metrics, refdata, routing
+from core.authentication import AmbiguousAccount, LoginError, login_latency, principal, sign_in
+from core.lru import LRUCache
+from core.instrumentation import instrumented
+from core.pagination import PAGE_SIZE_OPTIONS, DEFAULT_PAGE_SIZE
+from core.queries import specialty_list
+from patient_app.queries import patient_list
+from patient_app.search import search_patients
+from doctor_app.queries import doctor_list, appointment_list, record_body, record_timeline
+from doctor_app.search import search_records
+from doctor_app.booking import BookingError, SlotUnavailable, book_appointment, cancel_appointment
+from doctor_app.availability import earliest_free, free_slots
+from doctor_app import stats as appointment_stats
+from datetime import date, time, timedelta
+import pandas as pd
+
+# Opened medical record bodies kept per session
+RECORD_BODY_CACHE = 50
 
 # Page config
 st.set_page_config(page_title="Hospital Management System", page_icon="🏥", layout="wide")
@@ -25,7 +41,104 @@ if 'user_type' not in st.session_state:
     st.session_state.user_type = None
 if 'user_id' not in st.session_state:
     st.session_state.user_id = None
+if 'principal' not in st.session_state:
+    st.session_state.principal = None
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def specialty_directory(version):
+    return refdata.specialty_directory()
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def doctor_directory(version):
+    return refdata.doctor_directory()
+
+def remember_render(stats):
+    st.session_state.perf = stats.as_dict()
+
+def perf_panel():
+    perf = st.session_state.get("perf")
+    if not perf:
+        return
+    with st.sidebar.expander("Performance"):
+        st.caption(f"Last render of {perf['page']}")
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Wall ms", f"{perf['wall_ms']:.0f}")
+        col2.metric("Queries", perf["queries"])
+        col3.metric("SQL ms", f"{perf['sql_ms']:.0f}")
+        if perf["slowest"]:
+            st.dataframe(perf["slowest"], hide_index=True)
+
+def start_session(account):
+    st.session_state.logged_in = True
+    st.session_state.user_type = account["role"]
+    st.session_state.user_id = account["id"]
+    st.session_state.principal = account
+    st.rerun()
+
+def end_session():
+    # Drop everything the user left behind (opened records, page cursors,
+    # toggles, login fields); the rerun starts again from the defaults above.
+    for key in list(st.session_state):
+        del st.session_state[key]
+    st.rerun()
+
+def current_principal():
+    """Display data of the signed-in account, loaded at most once per session."""
+    if st.session_state.principal is None:
+        st.session_state.principal = principal(st.session_state.user_type, st.session_state.user_id)
+    return st.session_state.principal
+
+def login_form(role, identifier, password):
+    try:
+        start_session(sign_in(role, identifier, password))
+    except AmbiguousAccount:
+        st.error("Several accounts use this email. Please contact the administrator.")
+    except LoginError:
+        st.error("Invalid credentials")
 
+def _set_cursor(key, cursors):
+    st.session_state[f"{key}_cursors"] = cursors
+
+def paginated(key, fetch, render):
+    """Render one keyset page of ``fetch`` with ``render(rows)`` and paging controls."""
+    cursors = st.session_state.get(f"{key}_cursors", [None])
+    size = st.selectbox("Rows per page", PAGE_SIZE_OPTIONS,
+                        index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE), key=f"{key}_size",
+                        on_change=_set_cursor, args=(key, [None]))
+    page = fetch(after=cursors[-1], size=size)
+    if page.rows:
+        render(page.rows)
+    else:
+        st.info("Nothing to show")
+    col1, col2, col3 = st.columns([1, 1, 4])
+    col1.button("Previous", key=f"{key}_prev", disabled=len(cursors) == 1,
+                on_click=_set_cursor, args=(key, cursors[:-1]))
+    col2.button("Next", key=f"{key}_next", disabled=not page.has_next,
+                on_click=_set_cursor, args=(key, cursors + [page.next_cursor]))
+    col3.caption(f"Page {len(cursors)}")
+    return page
+
+def paginated_table(key, fetch, format_row):
+    """Render one keyset page of ``fetch`` as a single table with paging controls."""
+    return paginated(key, fetch, lambda rows: st.dataframe([format_row(r) for r in rows], hide_index=True))
+
+def opened_record(patient_id, record):
+    """Diagnosis and treatment of a timeline row, read once and kept in the session's LRU."""
+    if "record_bodies" not in st.session_state:
+        st.session_state.record_bodies = LRUCache(RECORD_BODY_CACHE)
+    return st.session_state.record_bodies.get_or_load(
+        (record["archived"], record["id"]), lambda: record_body(patient_id, record["id"], record["archived"]))
+
+def record_timeline_rows(patient_id, rows):
+    # Toggles rather than expanders: an expander's body runs even while closed.
+    for r in rows:
+        header = f"**{r['date']}** · Dr. {r['doctor_first_name']} {r['doctor_last_name']} · {r['specialty_name']}"
+        if st.toggle(header, key=f"record_open_{r['archived']}_{r['id']}"):
+            body = opened_record(patient_id, r)
+            if body:
+                st.markdown(f"Diagnosis: {body['diagnosis']}  \nTreatment: {body['treatment']}")
+
+@instrumented(on_finish=remember_render)
 def login_page():
     st.title("🏥 Hospital Management System")
     
@@ -36,32 +149,14 @@ def login_page():
         username = st.text_input("Username", key="admin_user")
         password = st.text_input("Password", type="password", key="admin_pass")
         if st.button("Login as Admin"):
-            user = authenticate(username=username, password=password)
-            if user and user.is_superuser:
-                st.session_state.logged_in = True
-                st.session_state.user_type = "admin"
-                st.session_state.user_id = user.id
-                st.rerun()
-            else:
-                st.error("Invalid admin credentials")
+            login_form("admin", username, password)
     
     with tab2:
         st.subheader("Doctor Login")
         email = st.text_input("Email", key="doc_email")
         password = st.text_input("Password", type="password", key="doc_pass")
         if st.button("Login as Doctor"):
-            try:
-                user = User.objects.get(email=email)
-                if user.check_password(password):
-                    doctor = Doctor.objects.get(user=user)
-                    st.session_state.logged_in = True
-                    st.session_state.user_type = "doctor"
-                    st.session_state.user_id = doctor.id
-                    st.rerun()
-                else:
-                    st.error("Invalid credentials")
-            except:
-                st.error("Doctor not found")
+            login_form("doctor", email, password)
     
     with tab3:
         col1, col2 = st.columns(2)
@@ -71,18 +166,7 @@ def login_page():
             email = st.text_input("Email", key="pat_email")
             password = st.text_input("Password", type="password", key="pat_pass")
             if st.button("Login as Patient"):
-                try:
-                    user = User.objects.get(email=email)
-                    if user.check_password(password):
-                        patient = Patient.objects.get(user=user)
-                        st.session_state.logged_in = True
-                        st.session_state.user_type = "patient"
-                        st.session_state.user_id = patient.id
-                        st.rerun()
-                    else:
-                        st.error("Invalid credentials")
-                except:
-                    st.error("Patient not found")
+                login_form("patient", email, password)
         
         with col2:
             st.subheader("Patient Registration")
@@ -118,29 +202,49 @@ def login_page():
                     except:
                         st.error("Registration failed. Email may already exist.")
 
+@instrumented(on_finish=remember_render)
 def admin_dashboard():
     st.title("Admin Dashboard")
     
-    menu = st.sidebar.selectbox("Menu", ["Dashboard", "Patients", "Doctors", "Appointments", "Specialties"])
+    menu = st.sidebar.selectbox("Menu", ["Dashboard", "Patients", "Doctors", "Appointments", "Specialties", "Analytics"])
     
     if menu == "Dashboard":
+        counts = metrics.get_metrics()
         col1, col2, col3, col4 = st.columns(4)
-        col1.metric("Total Patients", Patient.objects.count())
-        col2.metric("Total Doctors", Doctor.objects.count())
-        col3.metric("Total Appointments", Appointment.objects.count())
-        col4.metric("Specialties", Specialty.objects.count())
+        col1.metric("Total Patients", counts["patients"])
+        col2.metric("Total Doctors", counts["doctors"])
+        col3.metric("Total Appointments", counts["appointments"])
+        col4.metric("Specialties", counts["specialties"])
+        
+        st.subheader("Appointments by Status")
+        status_cols = st.columns(len(Appointment.STATUS_CHOICES))
+        for col, (status, label) in zip(status_cols, Appointment.STATUS_CHOICES):
+            col.metric(label, counts[metrics.status_counter(status)])
+        
+        logins = login_latency.summary()
+        if logins["count"]:
+            st.subheader("Sign-in Latency")
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Logins", logins["count"])
+            col2.metric("p50 ms", f"{logins['p50']:.0f}")
+            col3.metric("p99 ms", f"{logins['p99']:.0f}")
     
     elif menu == "Patients":
         st.subheader("All Patients")
-        patients = Patient.objects.all()
-        for p in patients:
-            st.write(f"**{p.user.first_name} {p.user.last_name}** - Age: {p.age}, Gender: {p.gender}, Contact: {p.contact}")
+        paginated_table("admin_patients", patient_list, lambda p: {
+            "Name": f"{p['first_name']} {p['last_name']}",
+            "Age": p["age"],
+            "Gender": p["gender"],
+            "Contact": p["contact"],
+        })
     
     elif menu == "Doctors":
         st.subheader("All Doctors")
-        doctors = Doctor.objects.all()
-        for d in doctors:
-            st.write(f"**Dr. {d.user.first_name} {d.user.last_name}** - Specialty: {d.specialty.name}, Contact: {d.contact}")
+        paginated_table("admin_doctors", doctor_list, lambda d: {
+            "Name": f"Dr. {d['first_name']} {d['last_name']}",
+            "Specialty": d["specialty_name"],
+            "Contact": d["contact"],
+        })
         
         st.subheader("Add New Doctor")
         with st.form("add_doctor"):
@@ -148,14 +252,14 @@ def admin_dashboard():
             last_name = st.text_input("Last Name")
             email = st.text_input("Email")
             password = st.text_input("Password", type="password")
-            specialty = st.selectbox("Specialty", [s.name for s in Specialty.objects.all()])
+            specialties = specialty_directory(refdata.version("specialties"))
+            specialty_id = st.selectbox("Specialty", list(specialties), format_func=specialties.get)
             contact = st.text_input("Contact")
             
             if st.form_submit_button("Add Doctor"):
                 try:
                     user = User.objects.create_user(username=email, email=email, password=password, first_name=first_name, last_name=last_name)
-                    spec = Specialty.objects.get(name=specialty)
-                    Doctor.objects.create(user=user, specialty=spec, contact=contact)
+                    Doctor.objects.create(user=user, specialty_id=specialty_id, contact=contact)
                     st.success("Doctor added successfully!")
                     st.rerun()
                 except:
@@ -163,101 +267,183 @@ def admin_dashboard():
     
     elif menu == "Appointments":
         st.subheader("All Appointments")
-        appointments = Appointment.objects.all()
-        for a in appointments:
-            st.write(f"**{a.patient}** with **{a.doctor}** on {a.date} at {a.time} - Status: {a.status}")
+        paginated_table("admin_appointments", appointment_list, lambda a: {
+            "Patient": f"{a['patient_first_name']} {a['patient_last_name']}",
+            "Doctor": f"Dr. {a['doctor_first_name']} {a['doctor_last_name']}",
+            "Date": a["date"],
+            "Time": a["time"],
+            "Status": a["status"],
+        })
     
     elif menu == "Specialties":
         st.subheader("Medical Specialties")
-        specialties = Specialty.objects.all()
-        for s in specialties:
-            st.write(f"- {s.name}")
+        paginated_table("admin_specialties", specialty_list, lambda s: {"Specialty": s["name"]})
+    
+    elif menu == "Analytics":
+        st.subheader("Appointment Trends")
+        days = st.selectbox("Period", [30, 90, 365], format_func=lambda d: f"Last {d} days")
+        end = date.today()
+        start = end - timedelta(days=days - 1)
+        daily = appointment_stats.per_day(start, end)
+        if not daily:
+            st.info("No appointments in this period")
+            return
+        st.line_chart(pd.DataFrame(daily).pivot_table(index="date", columns="status", values="n", fill_value=0))
+        
+        specialties = specialty_directory(refdata.version("specialties"))
+        col1, col2 = st.columns(2)
+        col1.caption("By specialty")
+        by_specialty = pd.DataFrame(appointment_stats.per_specialty(start, end))
+        by_specialty["specialty"] = by_specialty["specialty_id"].map(specialties)
+        col1.bar_chart(by_specialty.pivot_table(index="specialty", columns="status", values="n", fill_value=0))
+        col2.caption("Busiest doctors")
+        doctors = doctor_directory(refdata.version("doctors"))
+        col2.dataframe([{"Doctor": doctors.get(d["doctor_id"]), "Appointments": d["n"]}
+                        for d in appointment_stats.per_doctor(start, end)], hide_index=True)
 
+@instrumented(on_finish=remember_render)
 def doctor_dashboard():
     st.title("Doctor Dashboard")
-    doctor = Doctor.objects.get(id=st.session_state.user_id)
-    st.write(f"Welcome, Dr. {doctor.user.first_name} {doctor.user.last_name}")
+    doctor = current_principal()
+    st.write(f"Welcome, Dr. {doctor['first_name']} {doctor['last_name']}")
     
-    menu = st.sidebar.selectbox("Menu", ["My Appointments", "Add Medical Record"])
+    menu = st.sidebar.selectbox("Menu", ["My Appointments", "Add Medical Record", "Search Records"])
     
     if menu == "My Appointments":
         st.subheader("My Appointments")
-        appointments = Appointment.objects.filter(doctor=doctor)
-        for a in appointments:
-            st.write(f"**{a.patient}** on {a.date} at {a.time} - Status: {a.status}")
+        paginated_table("doctor_appointments",
+                        lambda **page: appointment_list(doctor_id=doctor["id"], **page),
+                        lambda a: {
+                            "Patient": f"{a['patient_first_name']} {a['patient_last_name']}",
+                            "Date": a["date"],
+                            "Time": a["time"],
+                            "Status": a["status"],
+                        })
     
     elif menu == "Add Medical Record":
         st.subheader("Add Medical Record")
-        patients = Patient.objects.all()
-        patient_names = [f"{p.user.first_name} {p.user.last_name}" for p in patients]
+        term = st.text_input("Find patient", placeholder="Name, email or contact number")
+        patients = {p["id"]: f"{p['first_name']} {p['last_name']} ({p['email'] or p['contact']})"
+                    for p in search_patients(term)}
+        if term and not patients:
+            st.info("No matching patients")
         
         with st.form("add_record"):
-            patient_name = st.selectbox("Patient", patient_names)
+            patient_id = st.selectbox("Patient", list(patients), format_func=patients.get)
             diagnosis = st.text_area("Diagnosis")
             treatment = st.text_area("Treatment")
             
-            if st.form_submit_button("Add Record"):
-                patient = patients[patient_names.index(patient_name)]
-                MedicalRecord.objects.create(patient=patient, doctor=doctor, diagnosis=diagnosis, treatment=treatment)
+            if st.form_submit_button("Add Record", disabled=not patients):
+                MedicalRecord.objects.create(patient_id=patient_id, doctor_id=doctor["id"], diagnosis=diagnosis, treatment=treatment)
                 st.success("Medical record added!")
+    
+    elif menu == "Search Records":
+        st.subheader("Search Medical Records")
+        col1, col2 = st.columns([3, 1])
+        term = col1.text_input("Condition or treatment", placeholder="e.g. asthma inhaler")
+        only_mine = col2.checkbox("Only my records")
+        if term:
+            hits = search_records(term, limit=50, doctor_id=doctor["id"] if only_mine else None,
+                                  highlight=("**", "**"))
+            if not hits:
+                st.info("No matching records")
+            else:
+                st.markdown("\n\n".join(
+                    f"**{h['date']}** · {h['patient_first_name']} {h['patient_last_name']} · "
+                    f"Dr. {h['doctor_first_name']} {h['doctor_last_name']}  \n"
+                    f"Diagnosis: {h['diagnosis_snippet']}  \nTreatment: {h['treatment_snippet']}"
+                    for h in hits
+                ))
 
+@instrumented(on_finish=remember_render)
 def patient_dashboard():
     st.title("Patient Dashboard")
-    patient = Patient.objects.get(id=st.session_state.user_id)
-    st.write(f"Welcome, {patient.user.first_name} {patient.user.last_name}")
+    patient = current_principal()
+    st.write(f"Welcome, {patient['first_name']} {patient['last_name']}")
     
     menu = st.sidebar.selectbox("Menu", ["My Appointments", "Book Appointment", "Medical Records"])
     
     if menu == "My Appointments":
         st.subheader("My Appointments")
-        appointments = Appointment.objects.filter(patient=patient)
-        for a in appointments:
+        archived = st.checkbox("Include archived appointments", key="patient_appointments_archived")
+        page = paginated_table("patient_appointments_all" if archived else "patient_appointments",
+                               lambda **page: appointment_list(patient_id=patient["id"], include_archive=archived, **page),
+                               lambda a: {
+                                   "Doctor": f"Dr. {a['doctor_first_name']} {a['doctor_last_name']}",
+                                   "Date": a["date"],
+                                   "Time": a["time"],
+                                   "Status": a["status"],
+                               })
+        booked = {a["id"]: a for a in page.rows if a["status"] == "BOOKED"}
+        if booked:
             col1, col2 = st.columns([3, 1])
-            col1.write(f"**{a.doctor}** on {a.date} at {a.time} - Status: {a.status}")
-            if col2.button("Cancel", key=f"cancel_{a.id}"):
-                a.status = "CANCELLED"
-                a.save()
-                st.rerun()
+            appt_id = col1.selectbox("Appointment", list(booked), format_func=lambda i: (
+                f"Dr. {booked[i]['doctor_first_name']} {booked[i]['doctor_last_name']} "
+                f"on {booked[i]['date']} at {booked[i]['time']}"))
+            if col2.button("Cancel", key=f"cancel_{appt_id}"):
+                if cancel_appointment(appt_id, patient_id=patient["id"]):
+                    st.rerun()
+                else:
+                    st.warning("That appointment is no longer booked.")
     
     elif menu == "Book Appointment":
         st.subheader("Book Appointment")
-        doctors = Doctor.objects.all()
-        doctor_names = [f"Dr. {d.user.first_name} {d.user.last_name} ({d.specialty.name})" for d in doctors]
+        doctors = doctor_directory(refdata.version("doctors"))
+        
+        with st.expander("Earliest available"):
+            specialties = specialty_directory(refdata.version("specialties"))
+            specialty_id = st.selectbox("Specialty", list(specialties), format_func=specialties.get)
+            if st.button("Find earliest"):
+                soonest = earliest_free(date.today(), days=14, specialty_id=specialty_id, limit=5)
+                if soonest:
+                    st.dataframe([{"Doctor": doctors.get(d), "Date": day, "Time": at.strftime("%H:%M")}
+                                  for d, day, at in soonest], hide_index=True)
+                else:
+                    st.info("No free slots in the next two weeks")
+        
+        col1, col2 = st.columns(2)
+        doctor_id = col1.selectbox("Select Doctor", list(doctors), format_func=doctors.get)
+        appt_date = col2.date_input("Date", min_value=date.today())
+        week = free_slots(doctor_id, appt_date, days=7) if doctor_id else {}
+        slots = week.get(appt_date, [])
+        if doctor_id and not slots:
+            later = next(iter(week), None)
+            st.info(f"No free slots that day. Next free day: {later}" if later else "No free slots this week")
         
         with st.form("book_appointment"):
-            doctor_name = st.selectbox("Select Doctor", doctor_names)
-            appt_date = st.date_input("Date")
-            appt_time = st.time_input("Time")
+            appt_time = st.selectbox("Time", slots, format_func=lambda t: t.strftime("%H:%M"))
             
-            if st.form_submit_button("Book Appointment"):
-                doctor = doctors[doctor_names.index(doctor_name)]
-                Appointment.objects.create(patient=patient, doctor=doctor, date=appt_date, time=appt_time)
-                st.success("Appointment booked!")
-                st.rerun()
+            if st.form_submit_button("Book Appointment", disabled=not slots):
+                try:
+                    book_appointment(patient["id"], doctor_id, appt_date, appt_time)
+                    st.success("Appointment booked!")
+                    st.rerun()
+                except SlotUnavailable:
+                    st.error("That slot was just taken. Please pick another time.")
+                except BookingError as e:
+                    st.error(str(e))
     
     elif menu == "Medical Records":
         st.subheader("My Medical Records")
-        records = MedicalRecord.objects.filter(patient=patient)
-        for r in records:
-            st.write(f"**Date:** {r.date}")
-            st.write(f"**Doctor:** {r.doctor}")
-            st.write(f"**Diagnosis:** {r.diagnosis}")
-            st.write(f"**Treatment:** {r.treatment}")
-            st.write("---")
+        archived = st.checkbox("Include archived records", key="patient_records_archived")
+        paginated("patient_records_all" if archived else "patient_records",
+                  lambda **page: record_timeline(patient["id"], include_archive=archived, **page),
+                  lambda rows: record_timeline_rows(patient["id"], rows))
 
-# Main app
-if st.session_state.logged_in:
-    if st.sidebar.button("Logout"):
-        st.session_state.logged_in = False
-        st.session_state.user_type = None
-        st.session_state.user_id = None
-        st.rerun()
+# Main app: reads stay on the primary for a while after this session writes.
+with routing.stickiness(st.session_state):
+    if st.session_state.logged_in:
+        if st.sidebar.button("Logout") or current_principal() is None:
+            end_session()
     
-    if st.session_state.user_type == "admin":
-        admin_dashboard()
-    elif st.session_state.user_type == "doctor":
-        doctor_dashboard()
-    elif st.session_state.user_type == "patient":
-        patient_dashboard()
-else:
-    login_page()
\ No newline at end of file
+        if st.session_state.user_type == "admin":
+            admin_dashboard()
+        elif st.session_state.user_type == "doctor":
+            doctor_dashboard()
+        elif st.session_state.user_type == "patient":
+            patient_dashboard()
+    else:
+        login_page()
+
+if settings.HMS_PERF_PANEL:
+    perf_panel()
@@ -0,0 +1,103 @@
+"""Time the Django admin changelists of the big tables against synthetic data.
+
+Each page is fetched through the test client as a superuser, ``--repeat``
+times per scale; the target is under 100 ms per page at 1M appointments.
+
+    python -m benchmarks.admin_changelist --scales 100000 1000000
+"""
+import argparse
+import time
+
+from benchmarks.common import bench_database, percentile, report, setup
+
+TARGET_MS = 100
+
+
+def pages(context):
+    return {
+        'appointments': ('/admin/doctor_app/appointment/', {}),
+        'appointments_page_20': ('/admin/doctor_app/appointment/', {'p': 20}),
+        'appointments_booked': ('/admin/doctor_app/appointment/', {'status__exact': 'BOOKED'}),
+        'appointments_this_month': ('/admin/doctor_app/appointment/', context['this_month']),
+        'appointments_by_doctor': ('/admin/doctor_app/appointment/', {'doctor_id': context['doctor_id']}),
+        'appointments_by_specialty': ('/admin/doctor_app/appointment/', {'doctor__specialty_id': context['specialty_id']}),
+        'appointments_search': ('/admin/doctor_app/appointment/', {'q': context['surname']}),
+        'records': ('/admin/doctor_app/medicalrecord/', {}),
+        'records_by_specialty': ('/admin/doctor_app/medicalrecord/', {'doctor__specialty_id': context['specialty_id']}),
+        'patients': ('/admin/patient_app/patient/', {}),
+        'patients_age_band': ('/admin/patient_app/patient/', {'age_band': '40-64'}),
+        'doctors': ('/admin/doctor_app/doctor/', {}),
+    }
+
+
+def context():
+    from datetime import date, timedelta
+    from doctor_app.models import Doctor
+    from patient_app.models import Patient
+
+    today = date.today()
+    doctor = Doctor.objects.order_by('id').first()
+    start = today.replace(day=1)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return {
+        'doctor_id': doctor.id,
+        'specialty_id': doctor.specialty_id,
+        'surname': Patient.objects.values_list('user__last_name', flat=True).first(),
+        'this_month': {'date__gte': start.isoformat(), 'date__lt': end.isoformat()},
+    }
+
+
+def measure(client, url, params, repeat):
+    from core.instrumentation import measure as capture
+
+    client.get(url, params)  # warm up connections and the directory caches
+    # The test client resets connection.queries per request, so count through a wrapper.
+    with capture(url) as stats:
+        response = client.get(url, params)
+    assert response.status_code == 200, (url, response.status_code)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get(url, params)
+        timings.append(time.perf_counter() - started)
+    p50 = percentile(timings, 50) * 1000
+    return {
+        'p50 ms': p50,
+        'p95 ms': percentile(timings, 95) * 1000,
+        'queries': stats.queries,
+        'ok': 'yes' if p50 < TARGET_MS else 'SLOW',
+    }
+
+
+def run_scale(scale, repeat, seed):
+    from django.contrib.auth.models import User
+    from django.test import Client
+    from core import synthetic
+
+    with bench_database():
+        started = time.perf_counter()
+        synthetic.Generator(seed=seed).run(**synthetic.scaled(scale))
+        print(f'generated {scale} appointments in {time.perf_counter() - started:.1f}s')
+        client = Client()
+        client.force_login(User.objects.create_superuser('bench-admin', 'bench@example.com', None))
+        return [{'scale': scale, 'page': name, **measure(client, url, params, repeat)}
+                for name, (url, params) in pages(context()).items()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the results as JSON')
+    args = parser.parse_args(argv)
+
+    setup()
+    rows = []
+    for scale in args.scales:
+        rows.extend(run_scale(scale, args.repeat, args.seed))
+    report('admin_changelist', rows, args.output)
+
+
+if __name__ == '__main__':
+    main()
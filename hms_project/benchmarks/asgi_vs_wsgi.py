@@ -0,0 +1,174 @@
+"""Concurrency scaling of the async read endpoints, ASGI against WSGI.
+
+The ASGI side drives ``hms_project.asgi.application`` with raw ASGI calls,
+``--concurrency`` requests in flight on one event loop. The WSGI side pushes
+the same requests through ``hms_project.wsgi.application`` from a pool of as
+many threads, the way a threaded WSGI server would. Both run in-process, so
+the numbers compare the request paths, not network servers.
+
+    python -m benchmarks.asgi_vs_wsgi --requests 2000 --concurrency 1 8 32 128
+"""
+import argparse
+import asyncio
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from benchmarks.common import bench_database, percentile, report, setup
+
+ENDPOINTS = ['schedule', 'upcoming', 'availability']
+
+
+def populate(doctors, patients):
+    from django.contrib.auth.models import User
+    from core.models import Specialty
+    from doctor_app.models import Appointment, Doctor
+    from doctor_app.slots import day_slots
+    from patient_app.models import Patient
+
+    specialty = Specialty.objects.create(name='General')
+    staff = User.objects.create_user('bench-admin', is_staff=True)
+    users = User.objects.bulk_create(
+        [User(username=f'doc{i}') for i in range(doctors)] + [User(username=f'pat{i}') for i in range(patients)]
+    )
+    doctor_ids = [d.pk for d in Doctor.objects.bulk_create(
+        [Doctor(user=u, specialty=specialty, contact='0') for u in users[:doctors]]
+    )]
+    patient_ids = [p.pk for p in Patient.objects.bulk_create([
+        Patient(user=u, age=30, gender='O', contact='0', address='', date_of_birth=date(1990, 1, 1))
+        for u in users[doctors:]
+    ])]
+    today = date.today()
+    slots = day_slots()
+    Appointment.objects.bulk_create([
+        Appointment(doctor_id=doctor_id, patient_id=patient_ids[(i * len(slots) + j) % len(patient_ids)],
+                    date=today, time=slot)
+        for i, doctor_id in enumerate(doctor_ids)
+        for j, slot in enumerate(slots[::2])
+    ])
+    return staff, doctor_ids, patient_ids
+
+
+def session_cookie(user):
+    from django.test import Client
+    client = Client()
+    client.force_login(user)
+    return f'sessionid={client.cookies["sessionid"].value}'
+
+
+def paths(count, doctor_ids, patient_ids):
+    day = date.today().isoformat()
+    for i in range(count):
+        kind = ENDPOINTS[i % len(ENDPOINTS)]
+        if kind == 'upcoming':
+            yield f'/api/patients/{patient_ids[i % len(patient_ids)]}/upcoming/', ''
+        else:
+            yield f'/api/doctors/{doctor_ids[i % len(doctor_ids)]}/{kind}/', f'date={day}'
+
+
+def wsgi_request(application, cookie, path, query):
+    environ = {
+        'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80', 'HTTP_HOST': 'testserver', 'HTTP_COOKIE': cookie,
+        'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+    started = time.perf_counter()
+    status = []
+    body = b''.join(application(environ, lambda s, headers, exc_info=None: status.append(s)))
+    assert status[0].startswith('200'), (status, body[:200])
+    return time.perf_counter() - started
+
+
+def run_wsgi(requests, concurrency, cookie):
+    from django.db import connections
+    from hms_project.wsgi import application
+
+    def call(item):
+        try:
+            return wsgi_request(application, cookie, *item)
+        finally:
+            connections.close_all()  # what request_finished does for a real server thread
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(call, requests))
+    return time.perf_counter() - started, latencies
+
+
+async def asgi_request(application, cookie, path, query):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+    }
+    sent = []
+    done = asyncio.Event()
+    messages = iter([{'type': 'http.request', 'body': b'', 'more_body': False}])
+
+    async def receive():
+        # After the body, Django listens for the client going away.
+        message = next(messages, None)
+        if message is None:
+            await done.wait()
+            return {'type': 'http.disconnect'}
+        return message
+
+    async def send(message):
+        sent.append(message)
+        if message['type'] == 'http.response.body' and not message.get('more_body'):
+            done.set()
+
+    started = time.perf_counter()
+    await application(scope, receive, send)
+    assert sent[0]['status'] == 200, sent
+    return time.perf_counter() - started
+
+
+async def run_asgi(requests, concurrency, cookie):
+    from hms_project.asgi import application
+
+    gate = asyncio.Semaphore(concurrency)
+
+    async def call(item):
+        async with gate:
+            return await asgi_request(application, cookie, *item)
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(call(item) for item in requests))
+    return time.perf_counter() - started, latencies
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=1500)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=500)
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args(argv)
+
+    setup()
+    with bench_database():
+        staff, doctor_ids, patient_ids = populate(args.doctors, args.patients)
+        cookie = session_cookie(staff)
+        requests = list(paths(args.requests, doctor_ids, patient_ids))
+        rows = []
+        for concurrency in args.concurrency:
+            for server, run in (('wsgi', lambda: run_wsgi(requests, concurrency, cookie)),
+                                ('asgi', lambda: asyncio.run(run_asgi(requests, concurrency, cookie)))):
+                elapsed, latencies = run()
+                rows.append({
+                    'server': server,
+                    'concurrency': concurrency,
+                    'requests/s': len(requests) / elapsed,
+                    'p50 ms': percentile(latencies, 50) * 1000,
+                    'p99 ms': percentile(latencies, 99) * 1000,
+                })
+        report('asgi_vs_wsgi', rows, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""Booking throughput under each database profile (see hms_project/database.py).
+
+Every profile runs in its own subprocess, since the profile is read when
+settings load. Worker threads book random future slots through
+doctor_app.booking.book_appointment, as the app does, while every fourth
+operation writes a medical record, the overlap that used to surface as
+"database is locked" on the untuned SQLite setup.
+
+    python -m benchmarks.booking_profiles --profiles sqlite-plain sqlite --threads 8
+    HMS_DB_HOST=localhost python -m benchmarks.booking_profiles --profiles postgres
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.common import bench_database, percentile, report, setup
+
+
+def populate(doctors, patients):
+    from django.contrib.auth.models import User
+    from core.models import Specialty
+    from doctor_app.models import Doctor
+    from patient_app.models import Patient
+
+    specialty = Specialty.objects.create(name='General')
+    users = User.objects.bulk_create(
+        [User(username=f'doc{i}') for i in range(doctors)] + [User(username=f'pat{i}') for i in range(patients)]
+    )
+    Doctor.objects.bulk_create([Doctor(user=u, specialty=specialty, contact='0') for u in users[:doctors]])
+    Patient.objects.bulk_create([
+        Patient(user=u, age=30, gender='O', contact='0', address='', date_of_birth=date(1990, 1, 1))
+        for u in users[doctors:]
+    ])
+    return list(Doctor.objects.values_list('id', flat=True)), list(Patient.objects.values_list('id', flat=True))
+
+
+def operation(doctor_ids, patient_ids, days, seed):
+    from django.db import OperationalError, transaction
+    from doctor_app.booking import SlotUnavailable, book_appointment
+    from doctor_app.models import MedicalRecord
+    from doctor_app.slots import day_slots
+
+    rng = random.Random(seed)
+    doctor_id, patient_id = rng.choice(doctor_ids), rng.choice(patient_ids)
+    started = time.perf_counter()
+    try:
+        if seed % 4 == 3:
+            with transaction.atomic():
+                MedicalRecord.objects.create(doctor_id=doctor_id, patient_id=patient_id,
+                                             diagnosis='Seasonal flu', treatment='Rest and fluids')
+            outcome = 'record'
+        else:
+            # From tomorrow, so no slot has started; book_appointment retries lock timeouts itself.
+            book_appointment(patient_id, doctor_id, date.today() + timedelta(days=1 + rng.randrange(days)),
+                             rng.choice(day_slots()))
+            outcome = 'booked'
+    except SlotUnavailable:
+        outcome = 'clash'
+    except OperationalError:
+        outcome = 'locked'
+    return outcome, time.perf_counter() - started
+
+
+def worker(args):
+    from django.db import connection, connections
+
+    setup()
+    with bench_database():
+        doctor_ids, patient_ids = populate(args.doctors, args.patients)
+        connection.close()
+
+        def run(seed):
+            try:
+                return operation(doctor_ids, patient_ids, args.days, seed)
+            finally:
+                connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            results = list(pool.map(run, range(args.operations)))
+        elapsed = time.perf_counter() - started
+    outcomes = [outcome for outcome, _ in results]
+    latencies = [seconds for _, seconds in results]
+    print(json.dumps({
+        'profile': os.environ.get('HMS_DB_PROFILE', 'sqlite'),
+        'threads': args.threads,
+        'ops/s': len(results) / elapsed,
+        'booked': outcomes.count('booked'),
+        'records': outcomes.count('record'),
+        'clashes': outcomes.count('clash'),
+        'locked': outcomes.count('locked'),
+        'p50 ms': percentile(latencies, 50) * 1000,
+        'p99 ms': percentile(latencies, 99) * 1000,
+    }))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', nargs='+', default=['sqlite-plain', 'sqlite'])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--operations', type=int, default=2000)
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--output', help='write the results as JSON here')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        args.threads = args.threads[0]
+        return worker(args)
+    setup()
+    rows = []
+    for profile in args.profiles:
+        for threads in args.threads:
+            command = [sys.executable, '-m', 'benchmarks.booking_profiles', '--worker', '--threads', str(threads),
+                       '--operations', str(args.operations), '--doctors', str(args.doctors),
+                       '--patients', str(args.patients), '--days', str(args.days)]
+            done = subprocess.run(command, env={**os.environ, 'HMS_DB_PROFILE': profile},
+                                  capture_output=True, text=True)
+            if done.returncode:
+                sys.stderr.write(done.stderr)
+                sys.exit(f'{profile} profile failed')
+            rows.append(json.loads(done.stdout.strip().splitlines()[-1]))
+    report('booking_profiles', rows, args.output)
+
+
+if __name__ == '__main__':
+    main()
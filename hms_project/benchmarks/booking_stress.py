@@ -0,0 +1,91 @@
+"""Concurrency stress test for doctor_app.booking.
+
+Threads race to book a deliberately small pool of slots (``--doctors`` x
+``--days`` x every slot of the day) and cancel one booking in five,
+which frees slots for the others to fight over again. At the end every
+active slot is checked: the run fails if any has more than one BOOKED
+appointment.
+
+    python -m benchmarks.booking_stress --threads 16 --operations 5000
+"""
+import argparse
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from benchmarks.booking_profiles import populate
+from benchmarks.common import bench_database, percentile, report, setup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--operations', type=int, default=3000)
+    parser.add_argument('--doctors', type=int, default=10)
+    parser.add_argument('--patients', type=int, default=200)
+    parser.add_argument('--days', type=int, default=5)
+    parser.add_argument('--output', help='write the results as JSON here')
+    args = parser.parse_args(argv)
+
+    setup()
+    from django.db import OperationalError, connection, connections
+    from django.db.models import Count
+    from doctor_app.booking import SlotUnavailable, book_appointment, cancel_appointment
+    from doctor_app.models import Appointment
+    from doctor_app.slots import day_slots
+
+    rows = []
+    for threads in args.threads:
+        with bench_database():
+            doctor_ids, patient_ids = populate(args.doctors, args.patients)
+            connection.close()
+            slots = day_slots()
+            first_day = date.today() + timedelta(days=1)
+
+            def run(seed):
+                rng = random.Random(seed)
+                patient_id = rng.choice(patient_ids)
+                day = first_day + timedelta(days=rng.randrange(args.days))
+                started = time.perf_counter()
+                try:
+                    appointment = book_appointment(patient_id, rng.choice(doctor_ids), day, rng.choice(slots))
+                    outcome = 'booked'
+                    if rng.random() < 0.2:
+                        cancel_appointment(appointment.id, patient_id=patient_id)
+                        outcome = 'cancelled'
+                except SlotUnavailable:
+                    outcome = 'taken'
+                except OperationalError:
+                    outcome = 'gave up'
+                finally:
+                    connections.close_all()
+                return outcome, time.perf_counter() - started
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(threads) as pool:
+                results = list(pool.map(run, range(args.operations)))
+            elapsed = time.perf_counter() - started
+            doubles = (Appointment.objects.filter(status='BOOKED').values('doctor_id', 'date', 'time')
+                       .annotate(n=Count('id')).filter(n__gt=1).count())
+            outcomes = [outcome for outcome, _ in results]
+            successes = outcomes.count('booked') + outcomes.count('cancelled')
+            rows.append({
+                'threads': threads,
+                'attempts/s': len(results) / elapsed,
+                'bookings/s': successes / elapsed,
+                'booked': successes,
+                'cancelled': outcomes.count('cancelled'),
+                'taken': outcomes.count('taken'),
+                'gave up': outcomes.count('gave up'),
+                'double bookings': doubles,
+                'p99 ms': percentile([seconds for _, seconds in results], 99) * 1000,
+            })
+    report('booking_stress', rows, args.output)
+    if any(row['double bookings'] for row in rows):
+        sys.exit('double bookings found')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""Shared plumbing for the benchmark scripts.
+
+Run them from the project directory, e.g. ``python -m benchmarks.asgi_vs_wsgi``.
+They build a throwaway migrated database (a temporary file under SQLite,
+``test_<name>`` under PostgreSQL) and never touch the real one.
+"""
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+def setup():
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hms_project.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def bench_database():
+    """Point the default connection at a fresh, migrated temporary database."""
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    path = None
+    if connection.vendor == 'sqlite':
+        # A file rather than :memory:, so every thread sees the same database.
+        handle, path = tempfile.mkstemp(prefix='hms-bench-', suffix='.sqlite3')
+        os.close(handle)
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = path
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield connection.settings_dict['NAME']
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        for suffix in ('', '-wal', '-shm'):
+            if path and os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values`` (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))]
+
+
+def environment():
+    """Where a result came from, so saved runs can be compared across commits."""
+    import platform
+    import subprocess
+    from datetime import datetime, timezone
+
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
+
+
+def report(name, rows, output=None):
+    """Print ``rows`` (a list of flat dicts) as a table and optionally save them as JSON."""
+    if rows:
+        headers = list(rows[0])
+        widths = [max(len(h), *(len(_cell(row[h])) for row in rows)) for h in headers]
+        print(name)
+        print('  '.join(h.ljust(w) for h, w in zip(headers, widths)))
+        for row in rows:
+            print('  '.join(_cell(row[h]).ljust(w) for h, w in zip(headers, widths)))
+    if output:
+        with open(output, 'w') as handle:
+            json.dump({'benchmark': name, **environment(), 'results': rows}, handle, indent=2, default=str)
+
+
+def _cell(value):
+    return f'{value:.2f}' if isinstance(value, float) else str(value)
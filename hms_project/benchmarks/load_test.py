@@ -0,0 +1,240 @@
+"""Load test app.py with concurrent admin, doctor and patient sessions.
+
+Every worker signs in as a random user of a synthetic dataset and walks a
+scripted journey through the real Streamlit script with the headless
+AppTest runner: browsing appointments, booking and cancelling as a
+patient, adding medical records as a doctor, paging the admin tables,
+then logging out, over and over for ``--duration`` seconds. Each widget
+interaction is one script run, timed as an action. AppTest keeps its
+runtime in process-wide state, so each worker is a process of its own,
+all sharing one database.
+
+For each ``--workers`` level the table gives per-action latency
+percentiles, throughput, script errors and how many of those were
+database lock errors ("database is locked").
+
+    python -m benchmarks.load_test --scale 20000 --workers 1 8 32 --duration 60
+"""
+import argparse
+import logging
+import os
+import random
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, time as clock_time, timedelta
+
+from benchmarks.common import bench_database, percentile, report, setup
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+ROLES = ['admin', 'doctor', 'patient']
+LOGIN = {
+    'admin': ('admin_user', 'admin_pass', 'Login as Admin'),
+    'doctor': ('doc_email', 'doc_pass', 'Login as Doctor'),
+    'patient': ('pat_email', 'pat_pass', 'Login as Patient'),
+}
+
+
+class JourneyFailed(Exception):
+    pass
+
+
+class Session:
+    """One browser tab: an AppTest of app.py whose actions are timed into ``results``."""
+
+    def __init__(self, results, timeout):
+        from streamlit.testing.v1 import AppTest
+        self.app = AppTest.from_file(APP, default_timeout=timeout)
+        self.results = results
+
+    def act(self, action, *interactions):
+        """Apply ``interactions`` to the current page, rerun the script and time it."""
+        started = time.perf_counter()
+        try:
+            for interaction in interactions:
+                interaction(self.app)
+            self.app.run()
+        except RuntimeError:  # the script run outlived the AppTest timeout
+            outcome = 'timeout'
+        else:
+            errors = [e.value for e in self.app.exception]
+            outcome = 'ok' if not errors else 'locked' if any('locked' in e for e in errors) else 'error'
+        self.results.append((action, outcome, time.perf_counter() - started))
+        if outcome != 'ok':
+            raise JourneyFailed(action)
+
+    def button(self, label):
+        return next((b for b in self.app.button if b.label == label), None)
+
+    def widget(self, kind, label):
+        return next(w for w in getattr(self.app, kind) if w.label == label)
+
+    def menu(self, role, page):
+        self.act(f'{role}.{page}', lambda app: app.sidebar.selectbox[0].select(page))
+
+    def login(self, role, identifier, password):
+        user_key, password_key, label = LOGIN[role]
+        self.act('login_page')
+        self.act(f'{role}.login',
+                 lambda app: app.text_input(key=user_key).input(identifier),
+                 lambda app: app.text_input(key=password_key).input(password),
+                 lambda app: self.button(label).click())
+        if not self.app.session_state['logged_in']:
+            raise JourneyFailed('login rejected')
+
+    def logout(self):
+        self.act('logout', lambda app: app.sidebar.button[0].click())
+
+
+def admin_journey(session, rng, users):
+    session.login('admin', 'admin', users.password)
+    for page in rng.sample(['Appointments', 'Patients', 'Doctors', 'Analytics'], 2):
+        session.menu('admin', page)
+        if session.button('Next') and not session.button('Next').disabled:
+            session.act(f'admin.{page}.next', lambda app: session.button('Next').click())
+    session.menu('admin', 'Dashboard')
+
+
+def doctor_journey(session, rng, users):
+    from core.synthetic import CASES, LAST_NAMES
+
+    session.login('doctor', rng.choice(users.doctors), users.password)
+    session.menu('doctor', 'My Appointments')
+    session.menu('doctor', 'Add Medical Record')
+    session.act('doctor.find_patient',
+                lambda app: session.widget('text_input', 'Find patient').input(rng.choice(LAST_NAMES)))
+    submit = session.button('Add Record')
+    if submit and not submit.disabled:
+        diagnosis, treatment = rng.choice(CASES)
+        session.act('doctor.add_record',
+                    lambda app: session.widget('text_area', 'Diagnosis').input(diagnosis),
+                    lambda app: session.widget('text_area', 'Treatment').input(treatment),
+                    lambda app: submit.click())
+
+
+def patient_journey(session, rng, users):
+    session.login('patient', rng.choice(users.patients), users.password)
+    session.menu('patient', 'Book Appointment')
+    doctor_id = rng.choice(users.doctor_ids)
+    day = date.today() + timedelta(days=rng.randrange(1, 15))
+    session.act('patient.pick_slot',
+                lambda app: session.widget('selectbox', 'Select Doctor').select(doctor_id),
+                lambda app: session.widget('date_input', 'Date').set_value(day))
+    submit = session.button('Book Appointment')
+    if submit and not submit.disabled:
+        # Selectboxes take the app's own values, so map the label back to a time.
+        slot = clock_time.fromisoformat(rng.choice(session.widget('selectbox', 'Time').options))
+        session.act('patient.book', lambda app: session.widget('selectbox', 'Time').select(slot),
+                    lambda app: submit.click())
+    session.menu('patient', 'My Appointments')
+    cancel = next((b for b in session.app.button if b.label == 'Cancel'), None)
+    if cancel and rng.random() < 0.5:
+        session.act('patient.cancel', lambda app: cancel.click())
+    session.menu('patient', 'Medical Records')
+    if len(session.app.toggle):
+        session.act('patient.open_record', lambda app: app.toggle[0].set_value(True))
+
+
+JOURNEYS = {'admin': admin_journey, 'doctor': doctor_journey, 'patient': patient_journey}
+
+
+class Users:
+    """Sign-in identifiers for the synthetic dataset plus an admin account."""
+
+    def __init__(self):
+        from django.contrib.auth.models import User
+        from core.synthetic import PASSWORD
+        from doctor_app.models import Doctor
+        from patient_app.models import Patient
+
+        User.objects.create_superuser('admin', 'admin@example.test', PASSWORD)
+        self.password = PASSWORD
+        self.doctors, self.doctor_ids = map(list, zip(*Doctor.objects.values_list('user__email', 'id')))
+        self.patients = list(Patient.objects.values_list('user__email', flat=True))
+
+
+def start_worker(database):
+    setup()
+    from django.db import connection
+
+    connection.settings_dict['NAME'] = database
+    # Streamlit warns about running outside `streamlit run` on every session.
+    logging.disable(logging.WARNING)
+
+
+def work(seed, users, mix, duration, timeout):
+    """Run journeys for ``duration`` seconds; returns ([(action, outcome, seconds)], journeys finished, seconds)."""
+    rng = random.Random(seed)
+    results, finished = [], 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < duration:
+        role = rng.choices(ROLES, weights=mix)[0]
+        session = Session(results, timeout)
+        try:
+            JOURNEYS[role](session, rng, users)
+            session.logout()
+        except JourneyFailed:
+            continue
+        finished += 1
+    return results, finished, time.perf_counter() - started
+
+
+def summarise(workers, results, journeys, elapsed):
+    by_action = defaultdict(list)
+    for action, outcome, seconds in results:
+        by_action[action].append((outcome, seconds))
+    by_action['all'] = [(outcome, seconds) for _, outcome, seconds in results]
+    rows = []
+    for action in sorted(by_action, key=lambda a: (a == 'all', a)):
+        runs = by_action[action]
+        seconds = [s for _, s in runs]
+        outcomes = [o for o, _ in runs]
+        rows.append({
+            'workers': workers,
+            'action': action,
+            'count': len(runs),
+            'per sec': len(runs) / elapsed,
+            'p50 ms': percentile(seconds, 50) * 1000,
+            'p95 ms': percentile(seconds, 95) * 1000,
+            'p99 ms': percentile(seconds, 99) * 1000,
+            'errors': len(runs) - outcomes.count('ok'),
+            'locked': outcomes.count('locked'),
+            'timeouts': outcomes.count('timeout'),
+            'journeys/s': journeys / elapsed if action == 'all' else '',
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=20000, help='appointments in the synthetic dataset')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run each worker level')
+    parser.add_argument('--mix', type=int, nargs=3, default=[1, 3, 6], metavar=('ADMIN', 'DOCTOR', 'PATIENT'),
+                        help='relative weights of admin, doctor and patient journeys')
+    parser.add_argument('--timeout', type=float, default=60, help='seconds before one script run counts as hung')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the results as JSON')
+    args = parser.parse_args(argv)
+
+    setup()
+    from django.db import connection
+    from core import synthetic
+
+    rows = []
+    with bench_database() as database:
+        synthetic.Generator(seed=args.seed).run(**synthetic.scaled(args.scale))
+        users = Users()
+        connection.close()
+        for workers in args.workers:
+            with ProcessPoolExecutor(workers, initializer=start_worker, initargs=(database,)) as pool:
+                done = list(pool.map(work, [args.seed * 1000 + i for i in range(workers)], [users] * workers,
+                                     [args.mix] * workers, [args.duration] * workers, [args.timeout] * workers))
+            results = [result for worker_results, _, _ in done for result in worker_results]
+            rows += summarise(workers, results, sum(finished for _, finished, _ in done),
+                              max(seconds for _, _, seconds in done))
+    report('load_test', rows, args.output)
+
+
+if __name__ == '__main__':
+    main()
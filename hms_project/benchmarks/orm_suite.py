@@ -0,0 +1,183 @@
+"""Time every dashboard query path against synthetic data at several sizes.
+
+For each scale (number of appointments, see core.synthetic.scaled) a fresh
+database is generated and each path is run ``--repeat`` times. The suite
+records the median and p95 wall time, the number of queries and the peak
+Python memory of one call. Results go to
+benchmarks/results/orm_suite-<commit>.json; pass ``--compare`` an older
+file to see what got slower.
+
+    python -m benchmarks.orm_suite --scales 10000 100000 1000000
+    python -m benchmarks.orm_suite --compare benchmarks/results/orm_suite-abc1234.json
+"""
+import argparse
+import json
+import os
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+from benchmarks.common import bench_database, environment, percentile, report, setup
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+
+def paths(context):
+    """Name -> zero-argument callable for every query path the Streamlit pages run."""
+    from django.core.cache import cache
+    from core import metrics, refdata
+    from core.queries import specialty_list
+    from doctor_app.availability import earliest_free, free_slots, open_masks
+    from doctor_app.booking import book_appointment
+    from doctor_app.queries import appointment_list, doctor_list, record_body, record_timeline
+    from doctor_app.search import search_records
+    from doctor_app.slots import mask_times
+    from patient_app.queries import patient_list
+    from patient_app.search import search_patients
+
+    doctor_id, patient_id = context['doctor_id'], context['patient_id']
+
+    def open_slots():
+        # Fresh slots within the doctor's hours, past the generated booking window.
+        week = open_masks([doctor_id])[doctor_id]
+        day = date.today() + timedelta(days=60)
+        while True:
+            for at in mask_times(week[day.weekday()]):
+                yield day, at
+            day += timedelta(days=1)
+
+    bookings = open_slots()
+
+    def metrics_cold():
+        cache.clear()
+        return metrics.get_metrics()
+
+    def doctor_directory_cold():
+        cache.clear()
+        return refdata.doctor_directory()
+
+    def book():
+        return book_appointment(patient_id, doctor_id, *next(bookings))
+
+    return {
+        'admin.dashboard_metrics_cold': metrics_cold,
+        'admin.dashboard_metrics_warm': metrics.get_metrics,
+        'admin.patients_page': lambda: patient_list(),
+        'admin.patients_deep_page': lambda: patient_list(after=(context['middle_patient_id'],)),
+        'admin.doctors_page': lambda: doctor_list(),
+        'admin.appointments_page': lambda: appointment_list(),
+        'admin.specialties_page': lambda: specialty_list(),
+        'doctor.appointments_page': lambda: appointment_list(doctor_id=doctor_id),
+        'doctor.patient_lookup': lambda: search_patients(context['surname']),
+        'doctor.record_search': lambda: search_records('diabetes', limit=50),
+        'patient.appointments_page': lambda: appointment_list(patient_id=patient_id),
+        'patient.records_timeline': lambda: record_timeline(patient_id),
+        'patient.record_open': lambda: record_body(patient_id, context['record_id']),
+        'patient.doctor_directory_cold': doctor_directory_cold,
+        'patient.free_slots_week': lambda: free_slots(doctor_id, date.today(), days=7),
+        'patient.earliest_in_specialty': lambda: earliest_free(date.today(), days=14,
+                                                               specialty_id=context['specialty_id']),
+        'patient.earliest_any_doctor': lambda: earliest_free(date.today(), days=14),
+        'patient.book_appointment': book,
+    }
+
+
+def context():
+    from django.db.models import Count
+    from doctor_app.models import Appointment, Doctor, MedicalRecord
+    from patient_app.models import Patient
+
+    busiest = Appointment.objects.values('doctor_id').annotate(n=Count('id')).order_by('-n').first()
+    frequent = Appointment.objects.values('patient_id').annotate(n=Count('id')).order_by('-n').first()
+    patient_ids = Patient.objects.order_by('id').values_list('id', flat=True)
+    return {
+        'doctor_id': busiest['doctor_id'],
+        'specialty_id': Doctor.objects.values_list('specialty_id', flat=True).get(pk=busiest['doctor_id']),
+        'patient_id': frequent['patient_id'],
+        'record_id': MedicalRecord.objects.filter(patient_id=frequent['patient_id']).values_list('id', flat=True).first(),
+        'middle_patient_id': patient_ids[patient_ids.count() // 2],
+        'surname': Patient.objects.values_list('user__last_name', flat=True).first(),
+    }
+
+
+def measure(fn, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    fn()  # warm up connections and statement caches
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return {
+        'p50 ms': percentile(timings, 50) * 1000,
+        'p95 ms': percentile(timings, 95) * 1000,
+        'queries': len(queries),
+        'peak KiB': peak / 1024,
+    }
+
+
+def run_scale(scale, repeat, only, seed):
+    from core import synthetic
+
+    with bench_database():
+        started = time.perf_counter()
+        synthetic.Generator(seed=seed).run(**synthetic.scaled(scale))
+        print(f'generated {scale} appointments in {time.perf_counter() - started:.1f}s')
+        rows = []
+        for name, fn in paths(context()).items():
+            if only and not any(name.startswith(prefix) for prefix in only):
+                continue
+            rows.append({'scale': scale, 'path': name, **measure(fn, repeat)})
+        return rows
+
+
+def compare(rows, baseline_path):
+    with open(baseline_path) as handle:
+        baseline = json.load(handle)
+    before = {(row['scale'], row['path']): row for row in baseline['results']}
+    changes = []
+    for row in rows:
+        old = before.get((row['scale'], row['path']))
+        if old:
+            changes.append({
+                'scale': row['scale'],
+                'path': row['path'],
+                'p50 x': row['p50 ms'] / old['p50 ms'] if old['p50 ms'] else float('nan'),
+                'queries': f"{old['queries']} -> {row['queries']}",
+            })
+    report(f"compared with {baseline.get('commit')}", changes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scales', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--only', nargs='+', help='run only paths starting with these prefixes, e.g. admin.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='where to write the JSON results (default: benchmarks/results/)')
+    parser.add_argument('--compare', help='an earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    setup()
+    rows = []
+    for scale in args.scales:
+        rows.extend(run_scale(scale, args.repeat, args.only, args.seed))
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"orm_suite-{environment()['commit'] or 'local'}.json")
+    report('orm_suite', rows, output)
+    print(f'saved {output}')
+    if args.compare:
+        compare(rows, args.compare)
+
+
+if __name__ == '__main__':
+    main()
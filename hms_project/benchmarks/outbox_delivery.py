@@ -0,0 +1,65 @@
+"""Measure reminder scheduling and outbox delivery throughput against a local SMTP stand-in.
+
+Reminders are queued for every upcoming appointment of a synthetic dataset,
+then the outbox is drained once per ``--batch-sizes`` entry over a real
+SMTP connection to core.mailsink.MailSink.
+
+    python -m benchmarks.outbox_delivery --scale 100000 --batch-sizes 50 200 1000
+"""
+import argparse
+import time
+
+from benchmarks.common import bench_database, report, setup
+
+
+def run(scale, batch_sizes, seed):
+    from django.test.utils import override_settings
+    from django.utils import timezone
+    from core import synthetic
+    from core.mailsink import MailSink
+    from doctor_app import notifications
+    from doctor_app.models import OutboxMessage
+
+    rows = []
+    with bench_database(), MailSink() as sink:
+        synthetic.Generator(seed=seed).run(**synthetic.scaled(scale))
+        started = time.perf_counter()
+        queued = notifications.schedule_reminders(hours=24 * (synthetic.FUTURE_DAYS + 1))
+        print(f'queued {queued} reminders in {(time.perf_counter() - started) * 1000:.1f} ms')
+        host, port = sink.address
+        smtp = override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                                 EMAIL_HOST=host, EMAIL_PORT=port)
+        for batch_size in batch_sizes:
+            OutboxMessage.objects.update(status='PENDING', attempts=0, sent_at=None, available_at=timezone.now())
+            received, connections = len(sink.messages), sink.connections
+            with smtp:
+                started = time.perf_counter()
+                batches = list(notifications.deliver(batch_size))
+                elapsed = time.perf_counter() - started
+            sent = sum(batch[0] for batch in batches)
+            assert len(sink.messages) - received == sent
+            rows.append({
+                'scale': scale,
+                'batch size': batch_size,
+                'messages': sent,
+                'seconds': elapsed,
+                'messages/sec': sent / elapsed if elapsed else 0.0,
+                'connections': sink.connections - connections,
+            })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=20000, help='appointments in the synthetic dataset')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the results as JSON')
+    args = parser.parse_args(argv)
+
+    setup()
+    report('outbox_delivery', run(args.scale, args.batch_sizes, args.seed), args.output)
+
+
+if __name__ == '__main__':
+    main()
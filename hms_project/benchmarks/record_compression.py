@@ -0,0 +1,116 @@
+"""Compare medical record storage with text compression off, zlib and zstd.
+
+Each codec gets a fresh SQLite database holding the same ``--records``
+records whose notes run to about ``--note-bytes`` each, and reports the
+record table and file sizes, the insert cost and the read latencies.
+
+    python -m benchmarks.record_compression --records 20000 --note-bytes 4000
+"""
+import argparse
+import random
+import time
+from importlib.util import find_spec
+
+from benchmarks.common import bench_database, percentile, report, setup
+
+BATCH = 1000
+
+
+def notes(rng, size):
+    from core.synthetic import CASES, NOTES
+
+    sentences = [text for case in CASES for text in case] + [note for note in NOTES if note]
+    parts, length = [], 0
+    while length < size:
+        parts.append(rng.choice(sentences))
+        length += len(parts[-1]) + 2
+    return '. '.join(parts)
+
+
+def table_bytes(cursor, table):
+    try:
+        cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [table])
+        return cursor.fetchone()[0] or 0
+    except Exception:  # SQLite built without the dbstat table
+        return None
+
+
+def database_bytes(cursor):
+    cursor.execute('VACUUM')
+    cursor.execute('PRAGMA page_count')
+    pages = cursor.fetchone()[0]
+    cursor.execute('PRAGMA page_size')
+    return pages * cursor.fetchone()[0]
+
+
+def run_codec(codec, records, note_bytes, repeat, seed):
+    from django.db import connection, transaction
+    from django.test.utils import override_settings
+    from core import synthetic
+    from doctor_app.models import MedicalRecord
+    from doctor_app.queries import record_body
+
+    rng = random.Random(seed)
+    with bench_database(), override_settings(HMS_TEXT_COMPRESSION=codec):
+        synthetic.Generator(seed=seed).run(**synthetic.scaled(100))
+        patient_id, doctor_id = MedicalRecord.objects.values_list('patient_id', 'doctor_id').first()
+        MedicalRecord.objects.all().delete()
+        texts = [(notes(rng, note_bytes // 4), notes(rng, note_bytes)) for _ in range(min(records, 500))]
+        started = time.perf_counter()
+        for start in range(0, records, BATCH):
+            with transaction.atomic():
+                MedicalRecord.objects.bulk_create([
+                    MedicalRecord(patient_id=patient_id, doctor_id=doctor_id,
+                                  diagnosis=texts[i % len(texts)][0], treatment=texts[i % len(texts)][1])
+                    for i in range(start, min(start + BATCH, records))
+                ])
+        write_ms = (time.perf_counter() - started) * 1000
+        ids = list(MedicalRecord.objects.values_list('id', flat=True))
+        reads = []
+        for record_id in rng.sample(ids, min(repeat, len(ids))):
+            started = time.perf_counter()
+            record_body(patient_id, record_id)
+            reads.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        for _ in MedicalRecord.objects.values_list('id', 'date', 'doctor_id').iterator(chunk_size=BATCH):
+            pass
+        scan_ms = (time.perf_counter() - started) * 1000
+        started = time.perf_counter()
+        for _ in MedicalRecord.objects.values_list('diagnosis', 'treatment').iterator(chunk_size=BATCH):
+            pass
+        text_scan_ms = (time.perf_counter() - started) * 1000
+        with connection.cursor() as cursor:
+            table = table_bytes(cursor, MedicalRecord._meta.db_table)
+            total = database_bytes(cursor)
+    return {
+        'codec': codec,
+        'table MiB': table / 2 ** 20 if table is not None else 'n/a',
+        'file MiB': total / 2 ** 20,
+        'insert us/row': write_ms * 1000 / records,
+        'open p50 ms': percentile(reads, 50) * 1000,
+        'open p95 ms': percentile(reads, 95) * 1000,
+        'header scan ms': scan_ms,
+        'text scan ms': text_scan_ms,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--note-bytes', type=int, default=4000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='also write the results as JSON')
+    args = parser.parse_args(argv)
+
+    setup()
+    from django.db import connection
+    if connection.vendor != 'sqlite':
+        parser.exit(message='record text is only stored compressed on SQLite\n')
+    codecs = ['off', 'zlib'] + (['zstd'] if find_spec('zstandard') else [])
+    rows = [run_codec(codec, args.records, args.note_bytes, args.repeat, args.seed) for codec in codecs]
+    report('record_compression', rows, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,265 @@
+import hashlib
+import json
+from contextlib import nullcontext
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F
+from django.forms import modelform_factory
+from django.forms.models import model_to_dict
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+
+from .pagination import DEFAULT_PAGE_SIZE, decode_cursor, encode_cursor, keyset_page
+
+
+class ApiError(Exception):
+    def __init__(self, status, message, details=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.details = details
+
+
+class Principal:
+    """Who is calling: staff, or the doctor/patient linked to the session user."""
+
+    def __init__(self, user, doctor_id=None, patient_id=None):
+        self.user = user
+        self.is_staff = user.is_staff
+        self.doctor_id = doctor_id
+        self.patient_id = patient_id
+
+    @staticmethod
+    def _roles(user):
+        # One query resolves both reverse one-to-ones.
+        return User.objects.filter(pk=user.pk).values_list('doctor__id', 'patient__id')
+
+    @classmethod
+    def for_user(cls, user):
+        if user.is_staff:
+            return cls(user)
+        return cls(user, *cls._roles(user).get())
+
+    @classmethod
+    async def afor_user(cls, user):
+        if user.is_staff:
+            return cls(user)
+        return cls(user, *await cls._roles(user).aget())
+
+
+async def aprincipal(request):
+    """Principal for an async view; raises ApiError(401) for anonymous callers."""
+    user = await request.auser()
+    if not user.is_authenticated:
+        raise ApiError(401, 'authentication required')
+    return await Principal.afor_user(user)
+
+
+def json_response(request, payload, status=200):
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    if request.method == 'GET' and status == 200:
+        etag = '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+    else:
+        response = HttpResponse(body, status=status, content_type='application/json')
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def error_response(request, exc):
+    payload = {'error': exc.message}
+    if exc.details:
+        payload['details'] = exc.details
+    return json_response(request, payload, status=exc.status)
+
+
+def _parse_body(request):
+    try:
+        data = json.loads(request.body or b'{}')
+    except ValueError:
+        raise ApiError(400, 'request body must be JSON')
+    if not isinstance(data, dict):
+        raise ApiError(400, 'request body must be a JSON object')
+    # Foreign keys are read back as <name>_id; accept that spelling on writes too.
+    return {key[:-3] if key.endswith('_id') else key: value for key, value in data.items()}
+
+
+class Resource:
+    """A JSON collection/item endpoint pair over one model.
+
+    ``fields`` maps public names to ORM paths and is what ``?fields=`` can
+    select from; ``ordering`` are keyset keys and must be public names with
+    identity paths. ``filters`` maps query parameters to ORM lookups.
+    Subclasses narrow ``scope`` and the ``can_*`` checks per role.
+    """
+    model = None
+    fields = {}
+    ordering = ['id']
+    filters = {}
+    form_fields = []
+    # Off for resources whose create() runs its own transactions, e.g. to retry on lock timeouts.
+    atomic_create = True
+
+    def scope(self, principal, queryset):
+        return queryset if principal.is_staff else queryset.none()
+
+    def can_create(self, principal):
+        return principal.is_staff
+
+    def can_update(self, principal, obj):
+        return principal.is_staff
+
+    def can_delete(self, principal, obj):
+        return principal.is_staff
+
+    def filter_queryset(self, params, queryset):
+        for param, lookup in self.filters.items():
+            if params.get(param):
+                try:
+                    queryset = queryset.filter(**{lookup: params[param]})
+                except (ValueError, ValidationError):
+                    raise ApiError(400, f'invalid {param} {params[param]!r}')
+        return queryset
+
+    def selected(self, params):
+        if not params.get('fields'):
+            return list(self.fields)
+        names = [name.strip() for name in params['fields'].split(',') if name.strip()]
+        unknown = sorted(set(names) - set(self.fields))
+        if unknown:
+            raise ApiError(400, f'unknown fields: {", ".join(unknown)}')
+        return names
+
+    def rows(self, queryset, names):
+        plain = [n for n in names if self.fields[n] == n]
+        aliased = {n: F(self.fields[n]) for n in names if self.fields[n] != n}
+        return queryset.values(*plain, **aliased)
+
+    def queryset(self, principal):
+        return self.scope(principal, self.model.objects.all())
+
+    # Writes
+
+    def form_class(self):
+        return modelform_factory(self.model, fields=self.form_fields)
+
+    def prepare(self, principal, data, obj=None):
+        """Adjust incoming data before validation, e.g. pin the caller's own id."""
+        return data
+
+    def validate(self, principal, data, obj=None):
+        initial = model_to_dict(obj, fields=self.form_fields) if obj else {}
+        form = self.form_class()({**initial, **self.prepare(principal, data, obj)}, instance=obj)
+        if not form.is_valid():
+            raise ApiError(400, 'invalid data', form.errors.get_json_data())
+        return form
+
+    def create(self, principal, data):
+        return self.validate(principal, data).save()
+
+    def update(self, principal, obj, data):
+        return self.validate(principal, data, obj).save()
+
+    # Views
+
+    def _principal(self, request):
+        if not request.user.is_authenticated:
+            raise ApiError(401, 'authentication required')
+        return Principal.for_user(request.user)
+
+    def _detail(self, principal, pk, names=None):
+        names = names or list(self.fields)
+        row = self.rows(self.queryset(principal).filter(pk=pk), names).first()
+        if row is None:
+            raise ApiError(404, 'not found')
+        return row
+
+    def _object(self, principal, pk):
+        obj = self.queryset(principal).filter(pk=pk).first()
+        if obj is None:
+            raise ApiError(404, 'not found')
+        return obj
+
+    def list(self, request, principal):
+        params = request.GET
+        names = self.selected(params)
+        keys = [key.lstrip('-') for key in self.ordering]
+        cursor = None
+        if params.get('cursor'):
+            try:
+                cursor = decode_cursor(params['cursor'], self.model, self.ordering)
+            except ValueError as exc:
+                raise ApiError(400, str(exc))
+        try:
+            size = int(params.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise ApiError(400, 'limit must be an integer')
+        queryset = self.filter_queryset(params, self.queryset(principal))
+        page = keyset_page(self.rows(queryset, list(dict.fromkeys(names + keys))), self.ordering, cursor, size)
+        return {
+            'results': [{name: row[name] for name in names} for row in page.rows],
+            'next': encode_cursor(page.next_cursor) if page.has_next else None,
+        }
+
+    def collection_view(self, request):
+        try:
+            principal = self._principal(request)
+            if request.method == 'GET':
+                return json_response(request, self.list(request, principal))
+            if request.method == 'POST':
+                if not self.can_create(principal):
+                    raise ApiError(403, 'not allowed')
+                with transaction.atomic() if self.atomic_create else nullcontext():
+                    obj = self.create(principal, _parse_body(request))
+                return json_response(request, self._detail(principal, obj.pk), status=201)
+            raise ApiError(405, 'method not allowed')
+        except ApiError as exc:
+            return self.error(request, exc)
+
+    def item_view(self, request, pk):
+        try:
+            principal = self._principal(request)
+            if request.method == 'GET':
+                return json_response(request, self._detail(principal, pk, self.selected(request.GET)))
+            if request.method == 'PATCH':
+                obj = self._object(principal, pk)
+                if not self.can_update(principal, obj):
+                    raise ApiError(403, 'not allowed')
+                with transaction.atomic():
+                    self.update(principal, obj, _parse_body(request))
+                return json_response(request, self._detail(principal, pk))
+            if request.method == 'DELETE':
+                obj = self._object(principal, pk)
+                if not self.can_delete(principal, obj):
+                    raise ApiError(403, 'not allowed')
+                obj.delete()
+                return HttpResponse(status=204)
+            raise ApiError(405, 'method not allowed')
+        except ApiError as exc:
+            return self.error(request, exc)
+
+    def error(self, request, exc):
+        return error_response(request, exc)
+
+
+def create_user(data):
+    """Create the login behind a new patient or doctor from API data."""
+    email = (data.get('email') or '').strip()
+    if not email:
+        raise ApiError(400, 'invalid data', {'email': [{'message': 'This field is required.', 'code': 'required'}]})
+    if User.objects.filter(username=email).exists():
+        raise ApiError(400, 'invalid data', {'email': [{'message': 'Email already registered.', 'code': 'unique'}]})
+    return User.objects.create_user(
+        username=email,
+        email=email,
+        password=data.get('password'),
+        first_name=data.get('first_name', ''),
+        last_name=data.get('last_name', ''),
+    )
@@ -0,0 +1,133 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.models import User
+
+logger = logging.getLogger('hms.perf')
+
+ROLES = ('admin', 'doctor', 'patient')
+# The lookup that yields each role's own id: admins are users, doctors and
+# patients hang off their user by a one-to-one.
+ROLE_ID = {'admin': 'id', 'doctor': 'doctor__id', 'patient': 'patient__id'}
+SAMPLES = 1000
+
+
+class LoginError(ValueError):
+    pass
+
+
+class InvalidCredentials(LoginError):
+    pass
+
+
+class AmbiguousAccount(LoginError):
+    pass
+
+
+class LatencyWindow:
+    """The last ``size`` durations in ms, with nearest-rank percentiles. Per process."""
+
+    def __init__(self, size=SAMPLES):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, ms):
+        with self._lock:
+            self._samples.append(ms)
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self):
+        """{'count', 'p50', 'p99'}; the percentiles are None before the first sample."""
+        with self._lock:
+            samples = sorted(self._samples)
+        ranks = {p: samples[max(math.ceil(p / 100 * len(samples)), 1) - 1] if samples else None for p in (50, 99)}
+        return {'count': len(samples), 'p50': ranks[50], 'p99': ranks[99]}
+
+
+login_latency = LatencyWindow()
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def _hash_slots():
+    """Semaphore bounding how many sign-ins hash a password at once (HMS_AUTH_WORKERS)."""
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(settings.HMS_AUTH_WORKERS)
+        return _slots
+
+
+def _verify(password, encoded):
+    """(matches, rehashed) for ``password``; ``rehashed`` is set when the stored hash is outdated."""
+    if encoded is None:
+        hashers.make_password(password)  # as slow as a real check, so unknown accounts don't stand out
+        return False, None
+    rehashed = []
+    matches = hashers.check_password(password, encoded, setter=lambda raw: rehashed.append(hashers.make_password(raw)))
+    return matches, rehashed[0] if rehashed else None
+
+
+def _principal(role, row):
+    role_id, user_id, first_name, last_name = row
+    return {'role': role, 'id': role_id, 'user_id': user_id, 'first_name': first_name, 'last_name': last_name}
+
+
+def _accounts(role, identifier):
+    users = User.objects.filter(is_active=True)
+    if role == 'admin':
+        users = users.filter(username=identifier, is_superuser=True)
+    else:
+        users = users.filter(email=identifier, **{f'{role}__isnull': False})
+    return users.values_list(ROLE_ID[role], 'id', 'first_name', 'last_name', 'password')[:2]
+
+
+def sign_in(role, identifier, password):
+    """The principal of the ``role`` account matching the credentials, or raise LoginError.
+
+    Admins sign in by username, doctors and patients by email. The account
+    and its doctor or patient row come from one query on the indexed
+    column, and more than one match raises AmbiguousAccount rather than
+    picking one. The password hash runs on the calling thread once one of
+    the HMS_AUTH_WORKERS slots is free, which bounds how many logins hash
+    at once, and every attempt's latency goes to ``login_latency``.
+    """
+    if role not in ROLES:
+        raise ValueError(f'role must be one of {", ".join(ROLES)}')
+    started = time.perf_counter()
+    outcome = 'failed'
+    try:
+        accounts = list(_accounts(role, identifier)) if identifier else []
+        if len(accounts) > 1:
+            outcome = 'ambiguous'
+            raise AmbiguousAccount(f'More than one {role} account uses {identifier}')
+        encoded = accounts[0][-1] if accounts else None
+        with _hash_slots():
+            matches, rehashed = _verify(password, encoded)
+        if not matches:
+            raise InvalidCredentials('Invalid credentials')
+        if rehashed:
+            User.objects.filter(id=accounts[0][1]).update(password=rehashed)
+        outcome = 'ok'
+        return _principal(role, accounts[0][:-1])
+    finally:
+        elapsed = (time.perf_counter() - started) * 1000
+        login_latency.add(elapsed)
+        logger.info('login role=%s outcome=%s ms=%.1f', role, outcome, elapsed)
+
+
+def principal(role, role_id):
+    """The principal of a signed-in ``role`` by its own id, or None if it is gone."""
+    row = User.objects.filter(**{ROLE_ID[role]: role_id}).values_list(
+        ROLE_ID[role], 'id', 'first_name', 'last_name',
+    ).first()
+    return row and _principal(role, row)
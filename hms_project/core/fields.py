@@ -0,0 +1,114 @@
+import time as clock
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, models, transaction
+
+try:
+    import zstandard
+except ImportError:  # zlib covers everything except reading or writing zstd values
+    zstandard = None
+
+# A compressed value is stored as bytes: one marker byte naming the codec, then
+# the compressed UTF-8 text. Anything stored as a string is plain text, which
+# is how legacy rows and short values stay.
+MARKERS = {'zlib': b'z', 'zstd': b's'}
+CODECS = {marker: codec for codec, marker in MARKERS.items()}
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+BATCH_SIZE = 1000
+
+
+def _zstandard():
+    if zstandard is None:
+        raise ImproperlyConfigured('zstd compressed text needs the zstandard package')
+    return zstandard
+
+
+def compress(text, codec=None, threshold=None):
+    """``text`` as it should be stored: marker-prefixed bytes, or the text itself.
+
+    Text shorter than ``threshold`` bytes, or that does not shrink, is kept
+    as is. ``codec`` and ``threshold`` default to HMS_TEXT_COMPRESSION and
+    HMS_TEXT_COMPRESSION_MIN_BYTES; codec 'off' never compresses.
+    """
+    codec = codec or settings.HMS_TEXT_COMPRESSION
+    threshold = settings.HMS_TEXT_COMPRESSION_MIN_BYTES if threshold is None else threshold
+    if codec == 'off':
+        return text
+    if codec not in MARKERS:
+        raise ImproperlyConfigured(f'HMS_TEXT_COMPRESSION must be off or one of {", ".join(MARKERS)}')
+    raw = text.encode()
+    if len(raw) < threshold:
+        return text
+    if codec == 'zstd':
+        packed = _zstandard().ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        packed = zlib.compress(raw, ZLIB_LEVEL)
+    return MARKERS[codec] + packed if len(packed) + 1 < len(raw) else text
+
+
+def decompress(value):
+    """The text of a stored value, whether compressed or plain."""
+    if not isinstance(value, (bytes, memoryview)):
+        return value
+    value = bytes(value)
+    codec = CODECS.get(value[:1])
+    if codec == 'zlib':
+        return zlib.decompress(value[1:]).decode()
+    if codec == 'zstd':
+        return _zstandard().ZstdDecompressor().decompress(value[1:]).decode()
+    raise ValueError(f'unknown compressed text marker {value[:1]!r}')
+
+
+class CompressedTextField(models.TextField):
+    """A TextField whose long values are stored compressed on SQLite when HMS_TEXT_COMPRESSION is set.
+
+    The column stays TEXT; SQLite keeps the compressed bytes in it as a
+    BLOB, and plain strings written before (or below the threshold) read
+    back untouched. PostgreSQL already compresses long text itself (TOAST)
+    and keeps it searchable with ILIKE, so other backends store plain text.
+    Filters on the column only see plain values.
+    """
+
+    def get_db_prep_save(self, value, connection):
+        value = super().get_db_prep_save(value, connection)
+        if isinstance(value, str) and connection.vendor == 'sqlite':
+            return compress(value)
+        return value
+
+    def from_db_value(self, value, expression, connection):
+        return decompress(value)
+
+
+def recompress(model, batch_size=BATCH_SIZE, max_batches=None):
+    """Rewrite ``model``'s compressed text under the current settings, yielding (changed, scanned, seconds) per batch.
+
+    Rows are walked in primary key order, each batch in its own transaction,
+    and only values whose stored form changes are written back, so a rerun
+    is cheap and codec 'off' turns every value back into plain text.
+    """
+    fields = [field for field in model._meta.concrete_fields if isinstance(field, CompressedTextField)]
+    quote = connection.ops.quote_name
+    table, pk = quote(model._meta.db_table), quote(model._meta.pk.column)
+    columns = [quote(field.column) for field in fields]
+    select = f'SELECT {pk}, {", ".join(columns)} FROM {table} WHERE {pk} > %s ORDER BY {pk} LIMIT %s'
+    update = f'UPDATE {table} SET {", ".join(f"{column} = %s" for column in columns)} WHERE {pk} = %s'
+    last, batches = 0, 0
+    while max_batches is None or batches < max_batches:
+        started = clock.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(select, [last, batch_size])
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            changed = []
+            for pk_value, *stored in rows:
+                fresh = [field.get_db_prep_save(decompress(value), connection) for field, value in zip(fields, stored)]
+                if fresh != stored:
+                    changed.append([*fresh, pk_value])
+            cursor.executemany(update, changed)
+        last = rows[-1][0]
+        batches += 1
+        yield len(changed), len(rows), clock.perf_counter() - started
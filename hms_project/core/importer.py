@@ -0,0 +1,308 @@
+import csv
+import gzip
+import io
+import json
+import os
+import time as clock
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, time
+
+import django
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from core import metrics, refdata
+from core.models import Specialty
+from doctor_app import availability, stats
+from doctor_app.models import Doctor, Appointment
+from patient_app.models import Patient
+
+DEFAULT_BATCH_SIZE = 1000
+KINDS = ['patients', 'doctors', 'appointments']
+
+
+class Rejected(ValueError):
+    pass
+
+
+def open_rows(path, fmt=None):
+    """Stream ``path`` (CSV or NDJSON, optionally gzipped) as dicts, one line at a time."""
+    name = path[:-3] if path.endswith('.gz') else path
+    fmt = fmt or ('ndjson' if name.endswith(('.ndjson', '.jsonl')) else 'csv')
+    raw = gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+    with io.TextIOWrapper(raw, encoding='utf-8', newline='') as handle:
+        if fmt == 'csv':
+            yield from csv.DictReader(handle)
+        else:
+            for line in handle:
+                if line.strip():
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        yield line.rstrip('\r\n')  # rejected by the importer, like any other bad row
+
+
+def _required(row, field):
+    # NDJSON values may be numbers or lists; everything is parsed from text.
+    value = '' if row.get(field) is None else str(row[field]).strip()
+    if not value:
+        raise Rejected(f'missing {field}')
+    return value
+
+
+def _optional(row, field):
+    return '' if row.get(field) is None else str(row[field]).strip()
+
+
+def _contact(row, model):
+    contact = _required(row, 'contact')
+    limit = model._meta.get_field('contact').max_length
+    if len(contact) > limit:
+        raise Rejected(f'contact longer than {limit} characters')
+    return contact
+
+
+def _choice(value, choices, field):
+    # Accept either the stored code or its label, case-insensitively.
+    value = str(value).upper()
+    for code, label in choices:
+        if value in (code.upper(), label.upper()):
+            return code
+    raise Rejected(f'{field} must be one of {", ".join(code for code, _ in choices)}')
+
+
+def _parse(parser, value, field):
+    try:
+        return parser(value)
+    except (TypeError, ValueError):
+        raise Rejected(f'invalid {field} {value!r}')
+
+
+def _person(row):
+    email = _required(row, 'email')
+    return {
+        'email': email,
+        'first_name': _optional(row, 'first_name'),
+        'last_name': _optional(row, 'last_name'),
+        'password': _optional(row, 'password') or None,
+    }
+
+
+def clean_patient(row):
+    person = _person(row)
+    age = _parse(int, _required(row, 'age'), 'age')
+    if age < 0:
+        raise Rejected('age must not be negative')
+    person.update({
+        'age': age,
+        'gender': _choice(_required(row, 'gender'), Patient.GENDER_CHOICES, 'gender'),
+        'contact': _contact(row, Patient),
+        'address': _optional(row, 'address'),
+        'date_of_birth': _parse(date.fromisoformat, _required(row, 'date_of_birth'), 'date_of_birth'),
+    })
+    return person
+
+
+def clean_doctor(row):
+    person = _person(row)
+    person.update({
+        'specialty': _required(row, 'specialty'),
+        'contact': _contact(row, Doctor),
+    })
+    return person
+
+
+def clean_appointment(row):
+    return {
+        'patient_email': _required(row, 'patient_email'),
+        'doctor_email': _required(row, 'doctor_email'),
+        'date': _parse(date.fromisoformat, _required(row, 'date'), 'date'),
+        'time': _parse(time.fromisoformat, _required(row, 'time'), 'time'),
+        'status': _choice(row.get('status') or 'BOOKED', Appointment.STATUS_CHOICES, 'status'),
+    }
+
+
+CLEANERS = {'patients': clean_patient, 'doctors': clean_doctor, 'appointments': clean_appointment}
+
+
+def _setup_worker():
+    # Spawned workers start without Django; forked ones already have it.
+    if not apps.ready:
+        django.setup()
+
+
+class Importer:
+    """Validate and bulk insert rows of one kind, reporting throughput and rejects.
+
+    Rows are checked against the model choices, written with ``bulk_create``
+    one transaction per batch, and rejected rows are written to ``rejects``
+    (a text stream) as NDJSON with their line number and reason.
+    """
+
+    def __init__(self, kind, batch_size=DEFAULT_BATCH_SIZE, workers=None, rejects=None,
+                 create_specialties=False, progress=None):
+        self.kind = kind
+        self.clean = CLEANERS[kind]
+        self.batch_size = batch_size
+        self.workers = os.cpu_count() if workers is None else workers
+        self.rejects = rejects
+        self.create_specialties = create_specialties
+        self.progress = progress
+        self.imported = 0
+        self.rejected = 0
+        self.elapsed = 0.0
+        self._pool = None
+        self._specialties = None
+
+    @property
+    def rows_per_second(self):
+        return (self.imported + self.rejected) / self.elapsed if self.elapsed else 0.0
+
+    def run(self, rows):
+        started = clock.perf_counter()
+        if self.kind != 'appointments' and self.workers > 1:
+            self._pool = ProcessPoolExecutor(self.workers, initializer=_setup_worker)
+        try:
+            batch = []
+            for line, row in enumerate(rows, start=1):
+                try:
+                    if not isinstance(row, dict):
+                        raise Rejected('not a JSON object')
+                    batch.append((line, row, self.clean(row)))
+                except Rejected as reason:
+                    self.reject(line, row, reason)
+                if len(batch) == self.batch_size:
+                    self.flush(batch)
+                    batch = []
+                    self.elapsed = clock.perf_counter() - started
+                    if self.progress:
+                        self.progress(self)
+            self.flush(batch)
+        finally:
+            if self._pool:
+                self._pool.shutdown()
+        # bulk_create skips model signals, so recount what they would have maintained.
+        metrics.reconcile()
+        if self.kind == 'doctors':
+            refdata.bump('doctors', 'specialties')
+        if self.kind == 'appointments' and self.imported:
+            availability.rebuild()
+            stats.rebuild()
+        self.elapsed = clock.perf_counter() - started
+        return self
+
+    def reject(self, line, row, reason):
+        self.rejected += 1
+        if self.rejects is not None:
+            self.rejects.write(json.dumps({'line': line, 'reason': str(reason), 'row': row}, default=str) + '\n')
+
+    def flush(self, batch):
+        if batch:
+            getattr(self, f'_flush_{self.kind}')(batch)
+
+    def _hash(self, passwords):
+        if self._pool:
+            chunksize = max(1, len(passwords) // (self.workers * 4))
+            return list(self._pool.map(make_password, passwords, chunksize=chunksize))
+        return [make_password(p) for p in passwords]
+
+    def _new_people(self, batch):
+        """Drop rows whose email is already taken, in the file or the database."""
+        emails = [item[2]['email'] for item in batch]
+        taken = set(User.objects.filter(username__in=emails).values_list('username', flat=True))
+        fresh = []
+        for line, row, clean in batch:
+            if clean['email'] in taken:
+                self.reject(line, row, 'email already registered')
+            else:
+                taken.add(clean['email'])
+                fresh.append((line, row, clean))
+        return fresh
+
+    def _create_users(self, batch, hashes):
+        users = User.objects.bulk_create([
+            User(username=clean['email'], email=clean['email'], first_name=clean['first_name'],
+                 last_name=clean['last_name'], password=password)
+            for (_, _, clean), password in zip(batch, hashes)
+        ], batch_size=self.batch_size)
+        if any(user.pk is None for user in users):
+            # Backends without RETURNING: read the new ids back by username.
+            ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+            for user in users:
+                user.pk = user.id = ids[user.username]
+        return users
+
+    def _flush_patients(self, batch):
+        batch = self._new_people(batch)
+        # Hash before opening the transaction so the write lock is held only for the inserts.
+        hashes = self._hash([clean['password'] for _, _, clean in batch])
+        with transaction.atomic():
+            users = self._create_users(batch, hashes)
+            Patient.objects.bulk_create([
+                Patient(user_id=user.pk, age=clean['age'], gender=clean['gender'], contact=clean['contact'],
+                        address=clean['address'], date_of_birth=clean['date_of_birth'])
+                for user, (_, _, clean) in zip(users, batch)
+            ], batch_size=self.batch_size)
+        self.imported += len(batch)
+
+    def _specialty_id(self, name):
+        if self._specialties is None:
+            self._specialties = {n.lower(): pk for pk, n in Specialty.objects.values_list('id', 'name')}
+        key = name.lower()
+        if key not in self._specialties and self.create_specialties:
+            self._specialties[key] = Specialty.objects.create(name=name).pk
+        return self._specialties.get(key)
+
+    def _flush_doctors(self, batch):
+        resolved = []
+        for line, row, clean in self._new_people(batch):
+            specialty_id = self._specialty_id(clean['specialty'])
+            if specialty_id is None:
+                self.reject(line, row, f'unknown specialty {clean["specialty"]!r}')
+            else:
+                clean['specialty_id'] = specialty_id
+                resolved.append((line, row, clean))
+        hashes = self._hash([clean['password'] for _, _, clean in resolved])
+        with transaction.atomic():
+            users = self._create_users(resolved, hashes)
+            Doctor.objects.bulk_create([
+                Doctor(user_id=user.pk, specialty_id=clean['specialty_id'], contact=clean['contact'])
+                for user, (_, _, clean) in zip(users, resolved)
+            ], batch_size=self.batch_size)
+        self.imported += len(resolved)
+
+    def _flush_appointments(self, batch):
+        # Imported and registered accounts use the email as username, which is indexed.
+        patients = dict(Patient.objects.filter(
+            user__username__in={clean['patient_email'] for _, _, clean in batch}
+        ).values_list('user__username', 'id'))
+        doctors = dict(Doctor.objects.filter(
+            user__username__in={clean['doctor_email'] for _, _, clean in batch}
+        ).values_list('user__username', 'id'))
+        resolved = []
+        for line, row, clean in batch:
+            if clean['patient_email'] not in patients:
+                self.reject(line, row, 'unknown patient')
+            elif clean['doctor_email'] not in doctors:
+                self.reject(line, row, 'unknown doctor')
+            else:
+                resolved.append((line, row, Appointment(
+                    patient_id=patients[clean['patient_email']], doctor_id=doctors[clean['doctor_email']],
+                    date=clean['date'], time=clean['time'], status=clean['status'])))
+        try:
+            with transaction.atomic():
+                Appointment.objects.bulk_create([a for _, _, a in resolved], batch_size=self.batch_size)
+            self.imported += len(resolved)
+        except IntegrityError:
+            # Some slot is already booked: retry row by row to reject just the clashes,
+            # still without the model signals the batch insert skips.
+            for line, row, appointment in resolved:
+                appointment.pk = None
+                try:
+                    with transaction.atomic():
+                        Appointment.objects.bulk_create([appointment])
+                    self.imported += 1
+                except IntegrityError:
+                    self.reject(line, row, 'doctor slot already booked')
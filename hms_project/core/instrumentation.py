@@ -0,0 +1,98 @@
+import functools
+import heapq
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('hms.perf')
+
+SLOWEST = 5
+SQL_PREVIEW = 300
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that counts statements and keeps the slowest few."""
+
+    def __init__(self, keep=SLOWEST):
+        self.keep = keep
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest = []  # min-heap of (seconds, n, sql)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            entry = (elapsed, self.count, sql)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, entry)
+            elif entry > self.slowest[0]:
+                heapq.heapreplace(self.slowest, entry)
+
+
+class PageStats:
+    def __init__(self, name):
+        self.name = name
+        self.wall_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.slowest = []
+
+    def as_dict(self):
+        return {
+            'page': self.name,
+            'wall_ms': round(self.wall_ms, 2),
+            'queries': self.queries,
+            'sql_ms': round(self.sql_ms, 2),
+            'slowest': [{'ms': round(ms, 2), 'sql': sql} for ms, sql in self.slowest],
+        }
+
+
+@contextmanager
+def measure(name, keep=SLOWEST):
+    """Record wall time and every statement run on any connection inside the block.
+
+    Yields a PageStats that is filled in when the block exits, even if it
+    exits by exception (Streamlit's st.rerun() raises to stop a run), and
+    logs it to ``hms.perf``: INFO normally, WARNING past HMS_SLOW_PAGE_MS.
+    """
+    stats = PageStats(name)
+    recorder = QueryRecorder(keep)
+    started = time.perf_counter()
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            yield stats
+    finally:
+        stats.wall_ms = (time.perf_counter() - started) * 1000
+        stats.queries = recorder.count
+        stats.sql_ms = recorder.seconds * 1000
+        stats.slowest = [(seconds * 1000, sql[:SQL_PREVIEW]) for seconds, _, sql in sorted(recorder.slowest, reverse=True)]
+        level = logging.WARNING if stats.wall_ms > settings.HMS_SLOW_PAGE_MS else logging.INFO
+        logger.log(level, 'page=%s wall_ms=%.1f queries=%d sql_ms=%.1f', name, stats.wall_ms, stats.queries,
+                   stats.sql_ms, extra={'perf': stats.as_dict()})
+
+
+def instrumented(func=None, name=None, on_finish=None):
+    """Decorator form of ``measure``; ``on_finish`` receives the PageStats."""
+    if func is None:
+        return functools.partial(instrumented, name=name, on_finish=on_finish)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stats = None
+        try:
+            with measure(name or func.__name__) as stats:
+                return func(*args, **kwargs)
+        finally:
+            if on_finish and stats is not None:
+                on_finish(stats)
+    return wrapper
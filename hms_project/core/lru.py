@@ -0,0 +1,28 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A bounded mapping that drops its least recently used entry when full.
+
+    Plain in-process state, small enough to keep in a Streamlit session.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get_or_load(self, key, load):
+        """The value cached under ``key``, calling ``load()`` to fill it on a miss."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        value = self._entries[key] = load()
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return value
@@ -0,0 +1,122 @@
+import socketserver
+import threading
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class _Session(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        sink = self.server.sink
+        sink.connections += 1
+        self.reply('220 hms mail sink')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            verb, _, argument = line.decode().rstrip('\r\n').partition(' ')
+            verb = verb.upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 hms')
+            elif verb == 'MAIL':
+                sender, recipients = argument.partition(':')[2].strip().strip('<>'), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                address = argument.partition(':')[2].strip().strip('<>')
+                if address in sink.refuse:
+                    self.reply('550 No such mailbox')
+                else:
+                    recipients.append(address)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                if not recipients:
+                    self.reply('503 Need RCPT first')
+                    continue
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = self.read_data()
+                if sink.take_deferral():
+                    self.reply('451 Try again later')
+                else:
+                    sink.received(sender, recipients, data)
+                    self.reply('250 OK')
+                sender, recipients = None, []
+            elif verb == 'RSET':
+                sender, recipients = None, []
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
+
+    def read_data(self):
+        lines = []
+        for line in self.rfile:
+            if line == b'.\r\n':
+                break
+            lines.append(line[1:] if line.startswith(b'..') else line)
+        return b''.join(lines)
+
+
+class MailSink:
+    """A local SMTP stand-in that accepts mail into ``messages`` instead of relaying it.
+
+    For tests, benchmarks and development (``manage.py mail_sink``).
+    Recipients in ``refuse`` are rejected with 550, and the next ``defer``
+    messages get a temporary 451, to exercise retries.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, on_message=None):
+        self.messages = []
+        self.refuse = set()
+        self.defer = 0
+        self.connections = 0
+        self.on_message = on_message
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Session)
+        self._server.sink = self
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._server.server_address[:2]
+
+    def take_deferral(self):
+        with self._lock:
+            if self.defer:
+                self.defer -= 1
+                return True
+            return False
+
+    def received(self, sender, recipients, data):
+        with self._lock:
+            self.messages.append((sender, recipients, data))
+        if self.on_message:
+            self.on_message(sender, recipients, data)
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
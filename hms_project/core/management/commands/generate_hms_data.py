@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import synthetic
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with deterministic synthetic specialties, doctors, patients, appointments and records'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=int, default=10000,
+                            help='Number of appointments; the other counts follow in proportion')
+        for kind in ('specialties', 'doctors', 'patients', 'appointments', 'records'):
+            parser.add_argument(f'--{kind}', type=int, help=f'Override the number of {kind}')
+        parser.add_argument('--seed', type=int, default=synthetic.DEFAULT_SEED)
+        parser.add_argument('--batch-size', type=int, default=synthetic.DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if synthetic.existing():
+            raise CommandError('The database already holds synthetic accounts; generate into a fresh database')
+        counts = synthetic.scaled(options['scale'])
+        for kind in counts:
+            if options[kind] is not None:
+                counts[kind] = options[kind]
+        if counts['appointments'] + counts['records'] and not (counts['doctors'] and counts['patients']):
+            raise CommandError('Appointments and records need at least one doctor and one patient')
+        started = time.perf_counter()
+        generator = synthetic.Generator(
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            progress=self.progress if options['verbosity'] > 1 else None,
+        )
+        created = generator.run(**counts)
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{n} {kind}' for kind, n in created.items())
+        self.stdout.write(f'Created {summary} in {elapsed:.1f}s (password: {synthetic.PASSWORD!r})')
+
+    def progress(self, kind, n):
+        self.stdout.write(f'{kind}: {n}')
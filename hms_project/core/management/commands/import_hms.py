@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.importer import DEFAULT_BATCH_SIZE, KINDS, Importer, open_rows
+
+
+class Command(BaseCommand):
+    help = 'Bulk import patients, doctors or appointments from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=KINDS)
+        parser.add_argument('path', help='CSV or NDJSON file, optionally gzipped')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Override detection by extension')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Password hashing processes (default: one per CPU, 0 or 1 hashes inline)')
+        parser.add_argument('--rejects', help='Where to write rejected rows (default: <path>.rejects.ndjson)')
+        parser.add_argument('--create-specialties', action='store_true',
+                            help='Create specialties that do not exist yet instead of rejecting the doctor')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        rejects_path = options['rejects'] or options['path'] + '.rejects.ndjson'
+        try:
+            rows = open_rows(options['path'], options['format'])
+            with open(rejects_path, 'w', encoding='utf-8') as rejects:
+                importer = Importer(
+                    options['kind'],
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    rejects=rejects,
+                    create_specialties=options['create_specialties'],
+                    progress=self.report if options['verbosity'] > 1 else None,
+                ).run(rows)
+        except (OSError, ValueError) as exc:
+            raise CommandError(exc)
+        self.report(importer)
+        if importer.rejected:
+            self.stderr.write(f'{importer.rejected} rejected rows written to {rejects_path}')
+
+    def report(self, importer):
+        self.stdout.write(
+            f'{importer.kind}: {importer.imported} imported, {importer.rejected} rejected '
+            f'in {importer.elapsed:.1f}s ({importer.rows_per_second:.0f} rows/s)'
+        )
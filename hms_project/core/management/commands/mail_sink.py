@@ -0,0 +1,26 @@
+from email import message_from_bytes
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.mailsink import MailSink
+
+
+class Command(BaseCommand):
+    help = 'Run a local SMTP stand-in that prints the mail it is sent instead of relaying it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=settings.EMAIL_PORT)
+
+    def show(self, sender, recipients, data):
+        message = message_from_bytes(data)
+        self.stdout.write(f'{", ".join(recipients)}: {message["Subject"]}')
+
+    def handle(self, *args, **options):
+        sink = MailSink(options['host'], options['port'], on_message=self.show)
+        self.stdout.write('Listening on %s:%d' % sink.address)
+        try:
+            sink.serve_forever()
+        except KeyboardInterrupt:
+            pass
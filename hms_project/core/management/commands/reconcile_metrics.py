@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import metrics
+
+
+class Command(BaseCommand):
+    help = 'Recount the cached dashboard metrics to correct any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, default=0,
+                            help='Keep running and reconcile every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            counts = metrics.reconcile()
+            self.stdout.write(', '.join(f'{name}={n}' for name, n in counts.items()))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,27 @@
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from core import replication
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto the replica files named in HMS_DB_REPLICAS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--every', type=int, default=0,
+                            help='Keep running and copy every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            try:
+                timings = replication.replicate()
+            except ImproperlyConfigured as exc:
+                raise CommandError(str(exc))
+            if not timings:
+                raise CommandError('No replicas configured; set HMS_DB_REPLICAS')
+            self.stdout.write(', '.join(f'{alias} in {seconds * 1000:.1f} ms' for alias, seconds in timings.items()))
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,66 @@
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+KEY_PREFIX = 'hms:metrics:'
+FRESH_KEY = KEY_PREFIX + 'fresh'
+
+COUNTED_MODELS = {
+    'patients': 'patient_app.Patient',
+    'doctors': 'doctor_app.Doctor',
+    'appointments': 'doctor_app.Appointment',
+    'specialties': 'core.Specialty',
+}
+
+
+def status_counter(status):
+    return f'status:{status}'
+
+
+def counter_names():
+    Appointment = apps.get_model('doctor_app', 'Appointment')
+    return list(COUNTED_MODELS) + [status_counter(s) for s, _ in Appointment.STATUS_CHOICES]
+
+
+def reconcile():
+    """Recount everything from the database and overwrite the cached counters."""
+    counts = {name: apps.get_model(label).objects.count() for name, label in COUNTED_MODELS.items()}
+    Appointment = apps.get_model('doctor_app', 'Appointment')
+    for status, _ in Appointment.STATUS_CHOICES:
+        counts[status_counter(status)] = 0
+    for row in Appointment.objects.values('status').annotate(n=Count('id')).order_by():
+        counts[status_counter(row['status'])] = row['n']
+    cache.set_many({KEY_PREFIX + name: n for name, n in counts.items()}, timeout=None)
+    cache.set(FRESH_KEY, True, timeout=settings.HMS_METRICS_RECONCILE_SECONDS)
+    return counts
+
+
+def get_metrics():
+    """Return the cached counters, recounting if any are missing or the reconcile window lapsed."""
+    names = counter_names()
+    cached = cache.get_many([KEY_PREFIX + name for name in names] + [FRESH_KEY])
+    if not cached.pop(FRESH_KEY, False) or len(cached) < len(names):
+        return reconcile()
+    return {name: cached[KEY_PREFIX + name] for name in names}
+
+
+def _incr(name, delta):
+    try:
+        cache.incr(KEY_PREFIX + name, delta)
+    except ValueError:
+        # Counter evicted or never primed; the next read recounts it.
+        pass
+
+
+def adjust(name, delta):
+    """Shift a counter once the surrounding transaction commits."""
+    if delta:
+        transaction.on_commit(lambda: _incr(name, delta))
+
+
+def status_changed(old, new, n=1):
+    if old != new:
+        adjust(status_counter(old), -n)
+        adjust(status_counter(new), n)
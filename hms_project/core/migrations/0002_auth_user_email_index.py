@@ -0,0 +1,19 @@
+from django.db import migrations
+
+# auth_user.email has no index of its own, and doctors and patients sign in by
+# it. auth.User is Django's model, so the index is added here in plain SQL.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX IF NOT EXISTS auth_user_email_idx ON auth_user (email)',
+            'DROP INDEX IF EXISTS auth_user_email_idx',
+        ),
+    ]
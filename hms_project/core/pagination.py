@@ -0,0 +1,89 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+PAGE_SIZE_OPTIONS = [10, 25, 50, 100]
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 500
+
+
+class Page:
+    def __init__(self, rows, next_cursor):
+        self.rows = rows
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def _after(keys, cursor):
+    # (a, b, c) > (x, y, z)  ==  a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+    condition = Q()
+    for i, key in enumerate(keys):
+        field = key.lstrip('-')
+        lookup = '__lt' if key.startswith('-') else '__gt'
+        clause = Q(**{field + lookup: cursor[i]})
+        for prev, value in zip(keys[:i], cursor):
+            clause &= Q(**{prev.lstrip('-'): value})
+        condition |= clause
+    return condition
+
+
+def keyset_page(rows, keys, after=None, size=DEFAULT_PAGE_SIZE):
+    """Fetch the page of ``rows`` (a values() queryset) that follows ``after``.
+
+    ``keys`` is the ordering, ending with a unique column, and every key must be
+    one of the selected values so the cursor can be read back off the last row.
+    """
+    size = max(1, min(int(size), MAX_PAGE_SIZE))
+    rows = rows.order_by(*keys)
+    if after is not None:
+        rows = rows.filter(_after(keys, after))
+    fetched = list(rows[:size + 1])
+    if len(fetched) <= size:
+        return Page(fetched, None)
+    fetched = fetched[:size]
+    last = fetched[-1]
+    return Page(fetched, tuple(last[key.lstrip('-')] for key in keys))
+
+
+def merged_page(sources, keys, after=None, size=DEFAULT_PAGE_SIZE):
+    """keyset_page over several querysets with the same values and disjoint keys, merged in order.
+
+    Each source contributes at most one page, so the merge costs one query per
+    source. ``keys`` must all sort the same way.
+    """
+    descending = keys[0].startswith('-')
+    if any(key.startswith('-') != descending for key in keys):
+        raise ValueError('merged pages need every key sorted the same way')
+    size = max(1, min(int(size), MAX_PAGE_SIZE))
+    pages = [keyset_page(rows, keys, after, size) for rows in sources]
+    names = [key.lstrip('-') for key in keys]
+    merged = sorted((row for page in pages for row in page.rows),
+                    key=lambda row: tuple(row[name] for name in names), reverse=descending)
+    if len(merged) <= size and not any(page.has_next for page in pages):
+        return Page(merged, None)
+    merged = merged[:size]
+    return Page(merged, tuple(merged[-1][name] for name in names))
+
+
+def encode_cursor(cursor):
+    """Opaque URL-safe token for a cursor tuple."""
+    raw = json.dumps(cursor, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, model, keys):
+    """Inverse of encode_cursor, typed through ``model``'s fields; raises ValueError if malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if not isinstance(values, list) or len(values) != len(keys):
+            raise ValueError('cursor does not match the ordering')
+        return tuple(model._meta.get_field(key.lstrip('-')).to_python(value) for key, value in zip(keys, values))
+    except (binascii.Error, UnicodeDecodeError, ValidationError) as exc:
+        raise ValueError(f'malformed cursor: {exc}')
@@ -0,0 +1,7 @@
+from .models import Specialty
+from .pagination import DEFAULT_PAGE_SIZE, keyset_page
+
+
+def specialty_list(after=None, size=DEFAULT_PAGE_SIZE):
+    rows = Specialty.objects.values('id', 'name')
+    return keyset_page(rows, ['name', 'id'], after, size)
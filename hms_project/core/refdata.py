@@ -0,0 +1,41 @@
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+
+KEY_PREFIX = 'hms:refdata:'
+
+
+def version(name):
+    """Current version token of a directory; changes whenever its source rows do."""
+    key = KEY_PREFIX + name
+    # A fresh timestamp (rather than a counter) cannot collide with a token a
+    # caller cached before the version key was evicted.
+    cache.add(key, time.time_ns(), timeout=None)
+    return cache.get(key)
+
+
+def bump(*names):
+    def _bump():
+        token = time.time_ns()
+        cache.set_many({KEY_PREFIX + name: token for name in names}, timeout=None)
+    transaction.on_commit(_bump)
+
+
+def specialty_directory():
+    Specialty = apps.get_model('core', 'Specialty')
+    return dict(Specialty.objects.order_by('name').values_list('id', 'name'))
+
+
+def doctor_directory():
+    Doctor = apps.get_model('doctor_app', 'Doctor')
+    rows = Doctor.objects.order_by('user__last_name', 'user__first_name', 'id').values_list(
+        'id', F('user__first_name'), F('user__last_name'), F('specialty__name'))
+    return {pk: f"Dr. {first} {last} ({specialty})" for pk, first, last, specialty in rows}
+
+
+def cached(name, build):
+    """``build()``, cached in the shared cache until the ``name`` directory's version changes."""
+    return cache.get_or_set(f'{KEY_PREFIX}{name}:{build.__name__}:{version(name)}', build, timeout=None)
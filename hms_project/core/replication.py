@@ -0,0 +1,36 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .routing import replica_aliases
+
+
+def copy_sqlite(source, path):
+    """Copy the database behind ``source`` (a Django connection) onto ``path`` with SQLite's online backup."""
+    source.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
+
+
+def replicate(aliases=None):
+    """Stand-in for replication between SQLite files: copy the primary onto each replica.
+
+    Returns {alias: seconds taken}. Writers carry on during the copy (the
+    primary is in WAL mode); readers of a replica wait out the copy through
+    their busy timeout.
+    """
+    source = connections[DEFAULT_DB_ALIAS]
+    if source.vendor != 'sqlite':
+        raise ImproperlyConfigured('replicate() copies SQLite files; use the database server\'s replication instead')
+    timings = {}
+    for alias in aliases or replica_aliases():
+        started = time.perf_counter()
+        copy_sqlite(source, settings.DATABASES[alias]['NAME'])
+        timings[alias] = time.perf_counter() - started
+    return timings
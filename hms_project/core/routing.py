@@ -0,0 +1,117 @@
+"""Primary/replica routing.
+
+Reads go to a random replica (see HMS_DB_REPLICAS in hms_project/database.py)
+unless the primary is pinned: inside a transaction, inside ``primary()``,
+or for HMS_REPLICA_STICKY_SECONDS after a write in the same session, so a
+booking followed by a rerun reads its own write. ``stickiness`` carries the
+window across Streamlit renders; StickyPrimaryMiddleware carries it across
+HTTP requests in a cookie.
+"""
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_KEY = 'hms_primary_until'
+
+_primary_until = ContextVar('hms_primary_until', default=0.0)
+_forced = ContextVar('hms_primary_forced', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def pin(seconds=None):
+    """Read from the primary for the next ``seconds`` (default HMS_REPLICA_STICKY_SECONDS)."""
+    if seconds is None:
+        seconds = settings.HMS_REPLICA_STICKY_SECONDS
+    _primary_until.set(max(_primary_until.get(), time.time() + seconds))
+
+
+def pinned():
+    return _forced.get() or time.time() < _primary_until.get()
+
+
+@contextmanager
+def primary():
+    """Send every read in the block to the primary."""
+    token = _forced.set(True)
+    try:
+        yield
+    finally:
+        _forced.reset(token)
+
+
+@contextmanager
+def stickiness(state):
+    """Restore the pinned window from ``state`` (a dict-like session) and store it back on exit."""
+    token = _primary_until.set(state.get(STICKY_KEY, 0.0))
+    try:
+        yield
+    finally:
+        state[STICKY_KEY] = _primary_until.get()
+        _primary_until.reset(token)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or pinned() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        pin()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True  # replicas hold the same rows as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class StickyPrimaryMiddleware:
+    """Keep a client on the primary for a while after its request wrote, through a cookie."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _state(self, request):
+        try:
+            return {STICKY_KEY: float(request.COOKIES.get(STICKY_KEY, 0))}
+        except ValueError:
+            return {STICKY_KEY: 0.0}
+
+    def _remember(self, request, response, state):
+        until = state[STICKY_KEY]
+        if until > time.time() and str(until) != request.COOKIES.get(STICKY_KEY):
+            response.set_cookie(STICKY_KEY, str(until), max_age=settings.HMS_REPLICA_STICKY_SECONDS,
+                                httponly=True, samesite='Lax')
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._state(request)
+        with stickiness(state):
+            response = self.get_response(request)
+        return self._remember(request, response, state)
+
+    async def __acall__(self, request):
+        state = self._state(request)
+        with stickiness(state):
+            response = await self.get_response(request)
+        return self._remember(request, response, state)
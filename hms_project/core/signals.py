@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+
+from . import metrics, refdata
+
+
+def count_created(name):
+    def receiver(sender, instance, created, raw=False, **kwargs):
+        if created and not raw:
+            metrics.adjust(name, 1)
+    return receiver
+
+
+def count_deleted(name):
+    def receiver(sender, instance, **kwargs):
+        metrics.adjust(name, -1)
+    return receiver
+
+
+def remember_status(sender, instance, **kwargs):
+    # Read from __dict__ so deferred loads don't trigger a query per row.
+    instance._loaded_status = instance.__dict__.get('status')
+
+
+def load_deferred_status(sender, instance, raw=False, **kwargs):
+    # A deferred status is unknown, not empty: read the stored one before it is overwritten.
+    if raw or instance._state.adding or instance._loaded_status is not None:
+        return
+    instance._loaded_status = sender._base_manager.filter(pk=instance.pk).values_list('status', flat=True).first()
+
+
+def appointment_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # A status still deferred was not written, so it is unchanged.
+    status = instance.__dict__.get('status') or instance._loaded_status
+    if created:
+        metrics.adjust(metrics.status_counter(status), 1)
+    elif instance._loaded_status is not None:
+        metrics.status_changed(instance._loaded_status, status)
+    instance._loaded_status = status
+
+
+def appointment_deleted(sender, instance, **kwargs):
+    metrics.adjust(metrics.status_counter(instance._loaded_status or instance.status), -1)
+
+
+def specialties_changed(sender, **kwargs):
+    refdata.bump('specialties', 'doctors')
+
+
+def doctors_changed(sender, **kwargs):
+    refdata.bump('doctors')
+
+
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    # Doctor labels embed the user's name; new users cannot be doctors yet.
+    if not created and not raw and sender.objects.filter(pk=instance.pk, doctor__isnull=False).exists():
+        refdata.bump('doctors')
+
+
+def connect():
+    for name, label in metrics.COUNTED_MODELS.items():
+        post_save.connect(count_created(name), sender=label, weak=False, dispatch_uid=f'metrics_{name}_saved')
+        post_delete.connect(count_deleted(name), sender=label, weak=False, dispatch_uid=f'metrics_{name}_deleted')
+    post_init.connect(remember_status, sender='doctor_app.Appointment', dispatch_uid='metrics_status_init')
+    pre_save.connect(load_deferred_status, sender='doctor_app.Appointment', dispatch_uid='metrics_status_pre_save')
+    post_save.connect(appointment_saved, sender='doctor_app.Appointment', dispatch_uid='metrics_status_saved')
+    post_delete.connect(appointment_deleted, sender='doctor_app.Appointment', dispatch_uid='metrics_status_deleted')
+    post_save.connect(specialties_changed, sender='core.Specialty', dispatch_uid='refdata_specialty_saved')
+    post_delete.connect(specialties_changed, sender='core.Specialty', dispatch_uid='refdata_specialty_deleted')
+    post_save.connect(doctors_changed, sender='doctor_app.Doctor', dispatch_uid='refdata_doctor_saved')
+    post_delete.connect(doctors_changed, sender='doctor_app.Doctor', dispatch_uid='refdata_doctor_deleted')
+    post_save.connect(user_saved, sender=settings.AUTH_USER_MODEL, dispatch_uid='refdata_user_saved')
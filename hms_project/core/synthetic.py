@@ -0,0 +1,263 @@
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from core import metrics, refdata
+from core.models import Specialty
+from doctor_app import availability, search as record_search, stats
+from doctor_app.models import Doctor, Appointment, MedicalRecord
+from doctor_app.slots import day_slots
+from patient_app.models import Patient
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_SEED = 0
+USERNAME_PREFIX = 'synthetic-'
+# Every generated account logs in with this password.
+PASSWORD = 'synthetic'
+
+SPECIALTIES = [
+    'General Practice', 'Pediatrics', 'Cardiology', 'Orthopedics', 'Dermatology', 'Gynecology',
+    'Neurology', 'Psychiatry', 'Ophthalmology', 'ENT', 'Gastroenterology', 'Endocrinology',
+    'Pulmonology', 'Urology', 'Nephrology', 'Oncology', 'Rheumatology', 'Radiology',
+    'Anesthesiology', 'Hematology',
+]
+FIRST_NAMES = [
+    'Aarav', 'Ada', 'Amara', 'Ananya', 'Ben', 'Carlos', 'Chen', 'Dev', 'Elena', 'Fatima', 'Grace',
+    'Hiro', 'Isla', 'Ivan', 'Jonas', 'Kavya', 'Leila', 'Liam', 'Maya', 'Mohammed', 'Nia', 'Noah',
+    'Olga', 'Priya', 'Rahul', 'Rosa', 'Sara', 'Tariq', 'Uma', 'Wei', 'Yusuf', 'Zoe',
+]
+LAST_NAMES = [
+    'Ahmed', 'Bauer', 'Costa', 'Das', 'Evans', 'Fischer', 'Garcia', 'Gupta', 'Haddad', 'Iyer',
+    'Johnson', 'Kim', 'Kowalski', 'Krishna', 'Lopez', 'Mensah', 'Nakamura', 'Novak', 'Okafor',
+    'Patel', 'Rossi', 'Sato', 'Silva', 'Singh', 'Smith', 'Tanaka', 'Walker', 'Zhang',
+]
+# (weight, youngest, oldest): clinics see more children and older adults.
+AGE_BANDS = [(18, 0, 12), (8, 13, 17), (30, 18, 44), (24, 45, 64), (20, 65, 95)]
+CASES = [
+    ('Hypertension, stage 1', 'Amlodipine 5mg daily; reduce salt; recheck blood pressure in 4 weeks'),
+    ('Type 2 diabetes mellitus', 'Metformin 500mg twice daily; HbA1c in 3 months; dietary advice'),
+    ('Acute upper respiratory infection', 'Rest, fluids and paracetamol; return if fever persists'),
+    ('Seasonal allergic rhinitis', 'Cetirizine 10mg at night; saline nasal rinse'),
+    ('Lower back strain', 'Ibuprofen 400mg as needed; physiotherapy referral'),
+    ('Migraine without aura', 'Sumatriptan 50mg at onset; headache diary'),
+    ('Atopic dermatitis', 'Emollients twice daily; hydrocortisone 1% cream for flares'),
+    ('Gastroesophageal reflux disease', 'Omeprazole 20mg before breakfast for 8 weeks'),
+    ('Iron deficiency anaemia', 'Ferrous sulfate 200mg daily; repeat blood count in 6 weeks'),
+    ('Asthma, mild persistent', 'Inhaled budesonide twice daily; salbutamol as needed'),
+    ('Urinary tract infection', 'Nitrofurantoin 100mg twice daily for 5 days'),
+    ('Hypothyroidism', 'Levothyroxine 50mcg daily; TSH in 6 weeks'),
+    ('Generalised anxiety disorder', 'Cognitive behavioural therapy referral; sertraline 50mg daily'),
+    ('Osteoarthritis of the knee', 'Paracetamol regularly; weight management; exercise programme'),
+    ('Otitis media', 'Amoxicillin 500mg three times daily for 5 days'),
+    ('Conjunctivitis', 'Chloramphenicol eye drops four times daily'),
+]
+NOTES = [
+    'Follow up in two weeks.', 'Patient counselled on medication.', 'No known drug allergies.',
+    'Symptoms improving since last visit.', 'Referred for further tests.', '',
+]
+PAST_DAYS = 365
+FUTURE_DAYS = 30
+
+
+def scaled(appointments):
+    """Counts for a dataset with ``appointments`` appointments and proportionate everything else."""
+    return {
+        'specialties': len(SPECIALTIES),
+        'doctors': max(5, appointments // 1000),
+        'patients': max(20, appointments // 10),
+        'appointments': appointments,
+        'records': appointments // 2,
+    }
+
+
+def _cumulative(weights):
+    return list(accumulate(weights))
+
+
+class Generator:
+    """Deterministic synthetic hospital data, bulk inserted in batches.
+
+    The same ``seed`` and counts always produce the same rows. Doctors are
+    spread over specialties by a Zipf curve, and a heavy-tailed share of
+    appointments goes to a few busy doctors and frequent patients. Past
+    appointments are mostly completed, the next month is mostly booked.
+    """
+
+    def __init__(self, seed=DEFAULT_SEED, batch_size=DEFAULT_BATCH_SIZE, today=None, progress=None):
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.today = today or date.today()
+        self.progress = progress
+        self.created = {}
+        self._password = None
+
+    def run(self, specialties, doctors, patients, appointments, records):
+        specialty_ids = self.specialties(specialties)
+        doctor_ids = self.doctors(doctors, specialty_ids)
+        patient_ids = self.patients(patients)
+        # Busy doctors and frequent patients: Pareto weights give the long tail.
+        doctor_weights = _cumulative(self.rng.paretovariate(1.2) for _ in doctor_ids)
+        patient_weights = _cumulative(self.rng.paretovariate(2.0) for _ in patient_ids)
+        self.appointments(appointments, doctor_ids, doctor_weights, patient_ids, patient_weights)
+        self.records(records, doctor_ids, doctor_weights, patient_ids, patient_weights)
+        # bulk inserts skip the signals that keep these in step.
+        if settings.HMS_TEXT_COMPRESSION != 'off':
+            record_search.rebuild_index()
+        availability.rebuild()
+        stats.rebuild()
+        metrics.reconcile()
+        refdata.bump('specialties', 'doctors')
+        return self.created
+
+    def _done(self, kind, n):
+        self.created[kind] = self.created.get(kind, 0) + n
+        if self.progress:
+            self.progress(kind, self.created[kind])
+
+    def _name(self):
+        return self.rng.choice(FIRST_NAMES), self.rng.choice(LAST_NAMES)
+
+    def _users(self, kind, start, count):
+        if self._password is None:
+            self._password = make_password(PASSWORD)
+        users = []
+        for i in range(start, start + count):
+            first_name, last_name = self._name()
+            username = f'{USERNAME_PREFIX}{kind}{i}@example.test'
+            users.append(User(username=username, email=username, first_name=first_name,
+                              last_name=last_name, password=self._password))
+        users = User.objects.bulk_create(users)
+        if any(user.pk is None for user in users):
+            ids = dict(User.objects.filter(username__in=[u.username for u in users]).values_list('username', 'id'))
+            for user in users:
+                user.pk = user.id = ids[user.username]
+        return users
+
+    def _contact(self):
+        return '9%09d' % self.rng.randrange(10 ** 9)
+
+    def specialties(self, count):
+        names = SPECIALTIES[:count] + [f'Specialty {i}' for i in range(len(SPECIALTIES), count)]
+        existing = set(Specialty.objects.filter(name__in=names).values_list('name', flat=True))
+        Specialty.objects.bulk_create([Specialty(name=name) for name in names if name not in existing])
+        self._done('specialties', len(names) - len(existing))
+        by_name = dict(Specialty.objects.filter(name__in=names).values_list('name', 'id'))
+        return [by_name[name] for name in names]
+
+    def doctors(self, count, specialty_ids):
+        weights = _cumulative(1 / rank for rank in range(1, len(specialty_ids) + 1))
+        ids = []
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            with transaction.atomic():
+                users = self._users('doctor', start, size)
+                chosen = self.rng.choices(specialty_ids, cum_weights=weights, k=size)
+                doctors = Doctor.objects.bulk_create([
+                    Doctor(user_id=user.pk, specialty_id=specialty_id, contact=self._contact())
+                    for user, specialty_id in zip(users, chosen)
+                ])
+            ids.extend(self._ids(Doctor, doctors, users))
+            self._done('doctors', size)
+        return ids
+
+    def _ids(self, model, objs, users):
+        if all(obj.pk is not None for obj in objs):
+            return [obj.pk for obj in objs]
+        by_user = dict(model.objects.filter(user_id__in=[u.pk for u in users]).values_list('user_id', 'id'))
+        return [by_user[user.pk] for user in users]
+
+    def _age(self):
+        _, youngest, oldest = self.rng.choices(AGE_BANDS, weights=[band[0] for band in AGE_BANDS])[0]
+        return self.rng.randint(youngest, oldest)
+
+    def patients(self, count):
+        ids = []
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            with transaction.atomic():
+                users = self._users('patient', start, size)
+                patients = []
+                for user in users:
+                    age = self._age()
+                    patients.append(Patient(
+                        user_id=user.pk,
+                        age=age,
+                        gender=self.rng.choices('MFO', weights=[49, 49, 2])[0],
+                        contact=self._contact(),
+                        address=f'{self.rng.randint(1, 400)} {self.rng.choice(LAST_NAMES)} Road',
+                        date_of_birth=self.today - timedelta(days=age * 365 + self.rng.randrange(365)),
+                    ))
+                patients = Patient.objects.bulk_create(patients)
+            ids.extend(self._ids(Patient, patients, users))
+            self._done('patients', size)
+        return ids
+
+    def _status(self, day):
+        roll = self.rng.random()
+        if day >= self.today:
+            return 'BOOKED' if roll < 0.9 else 'CANCELLED'
+        if roll < 0.8:
+            return 'COMPLETED'
+        return 'CANCELLED' if roll < 0.95 else 'BOOKED'
+
+    def appointments(self, count, doctor_ids, doctor_weights, patient_ids, patient_weights):
+        slots = day_slots()
+        booked = set()
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            doctors = self.rng.choices(doctor_ids, cum_weights=doctor_weights, k=size)
+            patients = self.rng.choices(patient_ids, cum_weights=patient_weights, k=size)
+            rows = []
+            for doctor_id, patient_id in zip(doctors, patients):
+                day = self.today + timedelta(days=self.rng.randint(-PAST_DAYS, FUTURE_DAYS))
+                slot = self.rng.choice(slots)
+                status = self._status(day)
+                if status == 'BOOKED':
+                    if (doctor_id, day, slot) in booked:
+                        # Only one active booking per slot; the earlier one was given up.
+                        status = 'CANCELLED'
+                    else:
+                        booked.add((doctor_id, day, slot))
+                rows.append(Appointment(patient_id=patient_id, doctor_id=doctor_id, date=day, time=slot, status=status))
+            with transaction.atomic():
+                Appointment.objects.bulk_create(rows)
+            self._done('appointments', size)
+
+    def records(self, count, doctor_ids, doctor_weights, patient_ids, patient_weights):
+        fields = [MedicalRecord._meta.get_field(name) for name in ('patient', 'doctor', 'diagnosis', 'treatment', 'date')]
+        for start in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - start)
+            doctors = self.rng.choices(doctor_ids, cum_weights=doctor_weights, k=size)
+            patients = self.rng.choices(patient_ids, cum_weights=patient_weights, k=size)
+            rows = []
+            for doctor_id, patient_id in zip(doctors, patients):
+                diagnosis, treatment = self.rng.choice(CASES)
+                rows.append((patient_id, doctor_id, diagnosis, f'{treatment}. {self.rng.choice(NOTES)}'.strip(),
+                             self.today - timedelta(days=self.rng.randint(0, PAST_DAYS))))
+            with transaction.atomic():
+                _insert_rows(MedicalRecord, fields, rows)
+            self._done('records', size)
+
+
+def _insert_rows(model, fields, rows):
+    # bulk_create would stamp auto_now_add dates with today; history needs its own dates.
+    quote = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        quote(model._meta.db_table),
+        ', '.join(quote(field.column) for field in fields),
+        ', '.join(['%s'] * len(fields)),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            [field.get_db_prep_save(value, connection) for field, value in zip(fields, row)] for row in rows
+        ])
+
+
+def existing():
+    """How many synthetic accounts are already in the database."""
+    return User.objects.filter(username__startswith=USERNAME_PREFIX).count()
@@ -1,9 +1,29 @@
-from django.test import TestCase, Client
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.http import HttpResponse
+from unittest import mock
+import sqlite3
+import time as clock
+from django.db import connection
+from importlib.util import find_spec
+from unittest import skipUnless
+import logging
+from django.core.exceptions import ImproperlyConfigured
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from io import StringIO
+import json
+import os
+import tempfile
+from core import authentication, metrics, refdata, replication, routing, synthetic
+from core.instrumentation import QueryRecorder, instrumented, measure
+from core.lru import LRUCache
 from core.models import Specialty
 from patient_app.models import Patient
-from doctor_app.models import Doctor, Appointment, MedicalRecord
+from doctor_app.models import Doctor, Appointment, MedicalRecord, OutboxMessage
 from datetime import date, time
+from pathlib import Path
+from hms_project.database import database, replicas
 
 class ModelTests(TestCase):
     
@@ -231,4 +251,678 @@ class IntegrationTests(TestCase):
                 status='BOOKED'
             )
         
-        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 3)
\ No newline at end of file
+        self.assertEqual(Appointment.objects.filter(doctor=self.doctor).count(), 3)
+
+class MetricsTests(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.specialty = Specialty.objects.create(name='Radiology')
+        user = User.objects.create_user(username='metrics_doc', first_name='Meg', last_name='Rics')
+        self.doctor = Doctor.objects.create(user=user, specialty=self.specialty, contact='1')
+        user = User.objects.create_user(username='metrics_pat', first_name='Pat', last_name='Rics')
+        self.patient = Patient.objects.create(
+            user=user,
+            age=50,
+            gender='O',
+            contact='2',
+            address='Somewhere',
+            date_of_birth=date(1974, 4, 4)
+        )
+        metrics.reconcile()
+    
+    def book(self, day):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(
+                patient=self.patient,
+                doctor=self.doctor,
+                date=date(2024, 6, day),
+                time=time(9, 0)
+            )
+    
+    def test_counters_served_from_cache(self):
+        """Test warm metrics need no queries"""
+        with self.assertNumQueries(0):
+            counts = metrics.get_metrics()
+        self.assertEqual(counts['patients'], 1)
+        self.assertEqual(counts['doctors'], 1)
+        self.assertEqual(counts['specialties'], 1)
+        self.assertEqual(counts['appointments'], 0)
+    
+    def test_counters_follow_saves_and_deletes(self):
+        """Test signals keep totals and status counts in step"""
+        first = self.book(1)
+        self.book(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            first.status = 'CANCELLED'
+            first.save()
+        with self.assertNumQueries(0):
+            counts = metrics.get_metrics()
+        self.assertEqual(counts['appointments'], 2)
+        self.assertEqual(counts['status:BOOKED'], 1)
+        self.assertEqual(counts['status:CANCELLED'], 1)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            Specialty.objects.create(name='Urology')
+        counts = metrics.get_metrics()
+        self.assertEqual(counts['appointments'], 1)
+        self.assertEqual(counts['status:CANCELLED'], 0)
+        self.assertEqual(counts['specialties'], 2)
+    
+    def test_saves_with_deferred_status(self):
+        """Test a row loaded without its status moves the stored status counter when saved"""
+        booked = self.book(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = Appointment.objects.only('id').get(pk=booked.pk)
+            appointment.status = 'CANCELLED'
+            appointment.save()
+            appointment = Appointment.objects.defer('status').get(pk=booked.pk)
+            appointment.time = time(10, 0)
+            appointment.save()
+        counts = metrics.get_metrics()
+        self.assertEqual((counts['status:BOOKED'], counts['status:CANCELLED']), (0, 1))
+
+    def test_reconcile_fixes_drift(self):
+        """Test bulk updates that skip signals are corrected by reconcile"""
+        self.book(1)
+        Appointment.objects.update(status='COMPLETED')
+        self.assertEqual(metrics.get_metrics()['status:COMPLETED'], 0)
+        out = StringIO()
+        call_command('reconcile_metrics', stdout=out)
+        self.assertIn('status:COMPLETED=1', out.getvalue())
+        self.assertEqual(metrics.get_metrics()['status:BOOKED'], 0)
+    
+    def test_missing_counters_are_recounted(self):
+        """Test an evicted cache recounts on the next read"""
+        cache.clear()
+        self.assertEqual(metrics.get_metrics()['doctors'], 1)
+
+
+class RefdataTests(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.specialty = Specialty.objects.create(name='Orthopedics')
+        self.user = User.objects.create_user(username='ref_doc', first_name='Bo', last_name='Ne')
+        self.doctor = Doctor.objects.create(user=self.user, specialty=self.specialty, contact='3')
+    
+    def test_directories_keyed_by_id(self):
+        """Test directories map primary keys to labels in one query each"""
+        with self.assertNumQueries(1):
+            specialties = refdata.specialty_directory()
+        with self.assertNumQueries(1):
+            doctors = refdata.doctor_directory()
+        self.assertEqual(specialties, {self.specialty.id: 'Orthopedics'})
+        self.assertEqual(doctors[self.doctor.id], 'Dr. Bo Ne (Orthopedics)')
+    
+    def test_versions_change_with_source_rows(self):
+        """Test model changes bump the matching directory versions"""
+        specialties, doctors = refdata.version('specialties'), refdata.version('doctors')
+        self.assertEqual(refdata.version('doctors'), doctors)
+        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.last_name = 'Setter'
+            self.user.save()
+        self.assertNotEqual(refdata.version('doctors'), doctors)
+        self.assertEqual(refdata.version('specialties'), specialties)
+        
+        doctors = refdata.version('doctors')
+        with self.captureOnCommitCallbacks(execute=True):
+            Specialty.objects.create(name='Pathology')
+        self.assertNotEqual(refdata.version('specialties'), specialties)
+        self.assertNotEqual(refdata.version('doctors'), doctors)
+    
+    def test_new_patient_user_does_not_bump_doctors(self):
+        """Test registering a non-doctor user leaves the doctor directory alone"""
+        doctors = refdata.version('doctors')
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user(username='just_a_patient')
+        self.assertEqual(refdata.version('doctors'), doctors)
+
+
+class ImportTests(TestCase):
+    
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.mkdtemp()
+        Specialty.objects.create(name='Cardiology')
+    
+    def write(self, name, text):
+        path = os.path.join(self.tmp, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+    
+    def run_import(self, kind, path, *args):
+        out = StringIO()
+        call_command('import_hms', kind, path, '--workers', '0', *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+    
+    def rejects(self, path):
+        with open(path + '.rejects.ndjson') as f:
+            return [json.loads(line) for line in f]
+    
+    def test_import_patients_csv(self):
+        """Test CSV patients are validated and bulk created"""
+        path = self.write('patients.csv', (
+            'email,first_name,last_name,age,gender,contact,address,date_of_birth\n'
+            'amy@test.com,Amy,Pond,30,F,111,Leadworth,1994-01-01\n'
+            'rory@test.com,Rory,Williams,31,male,222,Leadworth,1993-01-01\n'
+            'bad@test.com,Bad,Gender,40,X,333,Nowhere,1984-01-01\n'
+            'amy@test.com,Amy,Again,30,F,111,Leadworth,1994-01-01\n'
+            'nodob@test.com,No,Dob,30,F,444,Nowhere,\n'
+        ))
+        output = self.run_import('patients', path, '--batch-size', '2')
+        self.assertIn('2 imported, 3 rejected', output)
+        self.assertEqual(Patient.objects.get(user__email='rory@test.com').gender, 'M')
+        reasons = sorted((r['line'], r['reason']) for r in self.rejects(path))
+        self.assertEqual(reasons, [
+            (3, 'gender must be one of M, F, O'),
+            (4, 'email already registered'),
+            (5, 'missing date_of_birth'),
+        ])
+        self.assertFalse(User.objects.get(username='amy@test.com').has_usable_password())
+        self.assertEqual(metrics.get_metrics()['patients'], 2)
+    
+    def test_import_doctors_and_appointments_ndjson(self):
+        """Test NDJSON doctors resolve specialties, bad lines are rejected and appointments resolve people"""
+        doctors = self.write('doctors.ndjson', '\n'.join([json.dumps(r) for r in [
+            {'email': 'who@test.com', 'first_name': 'The', 'last_name': 'Doctor', 'specialty': 'cardiology', 'contact': '1'},
+            {'email': 'master@test.com', 'first_name': 'The', 'last_name': 'Master', 'specialty': 'Chaos', 'contact': '2'},
+        ]] + ['{"email": "half@test.com", '] + [json.dumps(r) for r in [
+            {'email': 'seven@test.com', 'specialty': 7, 'contact': 12345},
+            {'email': 'long@test.com', 'specialty': 'Cardiology', 'contact': '0' * 16},
+        ]]))
+        self.assertIn('1 imported, 4 rejected', self.run_import('doctors', doctors))
+        self.assertEqual(sorted((r['line'], r['reason']) for r in self.rejects(doctors)), [
+            (2, "unknown specialty 'Chaos'"),
+            (3, 'not a JSON object'),
+            (4, "unknown specialty '7'"),
+            (5, 'contact longer than 15 characters'),
+        ])
+        self.assertIn('2 imported, 3 rejected', self.run_import('doctors', doctors, '--create-specialties'))
+        self.assertTrue(Specialty.objects.filter(name='Chaos').exists())
+        self.assertEqual(Doctor.objects.get(user__email='seven@test.com').contact, '12345')
+        
+        patients = self.write('patients.ndjson', json.dumps({
+            'email': 'clara@test.com', 'first_name': 'Clara', 'last_name': 'Oswald', 'age': 27,
+            'gender': 'Female', 'contact': '9', 'date_of_birth': '1997-11-23'}))
+        self.run_import('patients', patients)
+        
+        appointments = self.write('appointments.ndjson', '\n'.join(json.dumps(r) for r in [
+            {'patient_email': 'clara@test.com', 'doctor_email': 'who@test.com', 'date': '2024-07-01', 'time': '10:00'},
+            {'patient_email': 'clara@test.com', 'doctor_email': 'who@test.com', 'date': '2024-07-01', 'time': '10:00'},
+            {'patient_email': 'clara@test.com', 'doctor_email': 'master@test.com', 'date': '2024-07-02',
+             'time': '11:00', 'status': 'completed'},
+            {'patient_email': 'nobody@test.com', 'doctor_email': 'who@test.com', 'date': '2024-07-01', 'time': '11:00'},
+            {'patient_email': 'clara@test.com', 'doctor_email': 'who@test.com', 'date': '2024-13-01', 'time': '11:00'},
+        ]))
+        self.assertIn('2 imported, 3 rejected', self.run_import('appointments', appointments))
+        self.assertEqual(
+            sorted(r['reason'] for r in self.rejects(appointments)),
+            ["doctor slot already booked", "invalid date '2024-13-01'", 'unknown patient'],
+        )
+        self.assertEqual(Appointment.objects.filter(status='COMPLETED').count(), 1)
+        # The row-by-row retry after the clash skips model signals like the batch insert.
+        self.assertFalse(OutboxMessage.objects.exists())
+        counts = metrics.get_metrics()
+        self.assertEqual((counts['appointments'], counts['status:BOOKED']), (2, 1))
+    
+    def test_passwords_hashed_in_worker_pool(self):
+        """Test passwords hashed by worker processes still authenticate"""
+        path = self.write('doctors.csv', (
+            'email,first_name,last_name,password,specialty,contact\n'
+            'a@test.com,A,A,secret-a,Cardiology,1\n'
+            'b@test.com,B,B,secret-b,Cardiology,2\n'
+        ))
+        call_command('import_hms', 'doctors', path, '--workers', '2', stdout=StringIO())
+        self.assertTrue(User.objects.get(username='b@test.com').check_password('secret-b'))
+
+
+class ApiTests(TestCase):
+    
+    def setUp(self):
+        for name in ['Anesthesiology', 'Cardiology', 'Dermatology', 'Endocrinology', 'Gastroenterology']:
+            Specialty.objects.create(name=name)
+        self.staff = User.objects.create_user(username='api_staff', is_staff=True)
+        self.client.force_login(self.staff)
+    
+    def test_requires_login(self):
+        """Test anonymous API calls get 401"""
+        self.client.logout()
+        response = self.client.get('/api/specialties/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json(), {'error': 'authentication required'})
+    
+    def test_keyset_pages(self):
+        """Test cursors walk the collection without overlap"""
+        names, url = [], '/api/specialties/?limit=2'
+        while url:
+            body = self.client.get(url).json()
+            names += [row['name'] for row in body['results']]
+            url = body['next'] and f'/api/specialties/?limit=2&cursor={body["next"]}'
+        self.assertEqual(len(names), 5)
+        self.assertEqual(names[0], 'Anesthesiology')
+        self.assertEqual(self.client.get('/api/specialties/?cursor=garbage').status_code, 400)
+    
+    def test_sparse_fields_and_filters(self):
+        """Test ?fields= trims rows and filters narrow them"""
+        body = self.client.get('/api/specialties/', {'fields': 'name', 'q': 'derm'}).json()
+        self.assertEqual(body['results'], [{'name': 'Dermatology'}])
+        self.assertEqual(self.client.get('/api/specialties/', {'fields': 'nope'}).status_code, 400)
+    
+    def test_conditional_get(self):
+        """Test ETags short-circuit unchanged reads and change with the data"""
+        response = self.client.get('/api/specialties/')
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/specialties/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Specialty.objects.create(name='Hematology')
+        self.assertEqual(self.client.get('/api/specialties/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+    
+    def test_bounded_queries(self):
+        """Test a list request costs session, user and one list query"""
+        self.client.get('/api/specialties/')
+        with self.assertNumQueries(3):
+            self.client.get('/api/specialties/?limit=100')
+    
+    def test_write_cycle(self):
+        """Test create, update and delete through the API"""
+        response = self.client.post('/api/specialties/', {'name': 'Nephrology'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()['id']
+        response = self.client.patch(f'/api/specialties/{pk}/', {'name': 'Renal'}, content_type='application/json')
+        self.assertEqual(response.json()['name'], 'Renal')
+        response = self.client.post('/api/specialties/', {'name': 'Renal'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.json()['details'])
+        self.assertEqual(self.client.delete(f'/api/specialties/{pk}/').status_code, 204)
+        self.assertEqual(self.client.get(f'/api/specialties/{pk}/').status_code, 404)
+    
+    def test_non_staff_cannot_write(self):
+        """Test reference data is read-only for non-staff users"""
+        self.client.force_login(User.objects.create_user(username='plain'))
+        self.assertEqual(self.client.get('/api/specialties/').status_code, 200)
+        response = self.client.post('/api/specialties/', {'name': 'X'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+
+class DatabaseProfileTests(SimpleTestCase):
+
+    def test_sqlite_profile_pragmas(self):
+        """Test the default profile turns on WAL and the tuning pragmas"""
+        config = database({'HMS_SQLITE_BUSY_TIMEOUT_MS': '2000'}, Path('/srv'))
+        self.assertEqual(config['NAME'], Path('/srv/db.sqlite3'))
+        self.assertIn('PRAGMA journal_mode=WAL', config['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA busy_timeout=2000', config['OPTIONS']['init_command'])
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertNotIn('OPTIONS', database({'HMS_DB_PROFILE': 'sqlite-plain'}, Path('/srv')))
+
+    def test_postgres_persistent_or_pooled(self):
+        """Test postgres uses persistent connections unless a pool size is given"""
+        config = database({'HMS_DB_PROFILE': 'postgres', 'HMS_DB_HOST': 'db'}, Path('/srv'))
+        self.assertEqual((config['HOST'], config['CONN_MAX_AGE']), ('db', 60))
+        self.assertNotIn('pool', config['OPTIONS'])
+        config = database({'HMS_DB_PROFILE': 'postgres', 'HMS_DB_POOL': '20'}, Path('/srv'))
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+        self.assertEqual(config['OPTIONS']['pool']['max_size'], 20)
+
+    def test_replicas(self):
+        """Test HMS_DB_REPLICAS adds read-only replica aliases that mirror the primary in tests"""
+        self.assertEqual(replicas({}, Path('/srv')), {})
+        configs = replicas({'HMS_DB_REPLICAS': 'replica1.sqlite3, /data/r2.sqlite3'}, Path('/srv'))
+        self.assertEqual([c['NAME'] for c in configs.values()], [Path('/srv/replica1.sqlite3'), Path('/data/r2.sqlite3')])
+        self.assertIn('PRAGMA query_only=ON', configs['replica1']['OPTIONS']['init_command'])
+        self.assertNotIn('journal_mode', configs['replica1']['OPTIONS']['init_command'])
+        self.assertEqual(configs['replica2']['TEST'], {'MIRROR': 'default'})
+        configs = replicas({'HMS_DB_PROFILE': 'postgres', 'HMS_DB_REPLICAS': 'r1:6432,r2'}, Path('/srv'))
+        self.assertEqual([(c['HOST'], c['PORT']) for c in configs.values()], [('r1', '6432'), ('r2', '')])
+        self.assertIn('default_transaction_read_only', configs['replica2']['OPTIONS']['options'])
+
+    def test_bad_profile(self):
+        """Test unknown profiles and malformed numbers are configuration errors"""
+        with self.assertRaises(ImproperlyConfigured):
+            database({'HMS_DB_PROFILE': 'oracle'}, Path('/srv'))
+        with self.assertRaises(ImproperlyConfigured):
+            database({'HMS_SQLITE_CACHE_MB': 'lots'}, Path('/srv'))
+
+
+@mock.patch.object(routing, 'replica_aliases', return_value=['replica1', 'replica2'])
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = routing.ReplicaRouter()
+
+    def test_reads_go_to_replicas_until_a_write(self, aliases):
+        """Test reads use a replica until a write pins the primary for the sticky window"""
+        state = {}
+        with routing.stickiness(state):
+            self.assertIn(self.router.db_for_read(Doctor), ['replica1', 'replica2'])
+            self.assertEqual(self.router.db_for_write(Doctor), 'default')
+            self.assertEqual(self.router.db_for_read(Doctor), 'default')
+        self.assertGreater(state[routing.STICKY_KEY], clock.time())
+        with routing.stickiness(state):
+            self.assertEqual(self.router.db_for_read(Doctor), 'default')
+        with routing.stickiness({}):
+            self.assertIn(self.router.db_for_read(Doctor), ['replica1', 'replica2'])
+            with routing.primary():
+                self.assertEqual(self.router.db_for_read(Doctor), 'default')
+        with self.settings(HMS_REPLICA_STICKY_SECONDS=0), routing.stickiness(state):
+            self.router.db_for_write(Doctor)
+        state[routing.STICKY_KEY] = clock.time() - 1
+        with routing.stickiness(state):
+            self.assertIn(self.router.db_for_read(Doctor), ['replica1', 'replica2'])
+
+    def test_migrations_only_on_primary(self, aliases):
+        """Test replicas are never migrated"""
+        self.assertFalse(self.router.allow_migrate('replica1', 'doctor_app'))
+        self.assertIsNone(self.router.allow_migrate('default', 'doctor_app'))
+
+    def test_middleware_keeps_writers_on_primary(self, aliases):
+        """Test a request that writes sets the cookie that pins the client's next requests"""
+        def view(request):
+            if request.method == 'POST':
+                self.router.db_for_write(Doctor)
+            return HttpResponse(self.router.db_for_read(Doctor))
+        middleware = routing.StickyPrimaryMiddleware(view)
+        factory = RequestFactory()
+        self.assertIn(middleware(factory.get('/')).content, [b'replica1', b'replica2'])
+        response = middleware(factory.post('/'))
+        self.assertEqual(response.content, b'default')
+        cookie = response.cookies[routing.STICKY_KEY].value
+        request = factory.get('/')
+        request.COOKIES[routing.STICKY_KEY] = cookie
+        response = middleware(request)
+        self.assertEqual(response.content, b'default')
+        self.assertNotIn(routing.STICKY_KEY, response.cookies)
+
+
+class ReplicationTests(TransactionTestCase):
+
+    def test_copies_primary_onto_replica_file(self):
+        """Test the SQLite stand-in copies the primary's rows into a replica file"""
+        Specialty.objects.create(name='Cardiology')
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'replica.sqlite3')
+            replication.copy_sqlite(connection, path)
+            copy = sqlite3.connect(path)
+            try:
+                names = copy.execute('SELECT name FROM core_specialty').fetchall()
+            finally:
+                copy.close()
+        self.assertEqual(names, [('Cardiology',)])
+
+    def test_command_needs_replicas(self):
+        """Test replicate_sqlite refuses to run without replicas"""
+        with self.assertRaises(CommandError):
+            call_command('replicate_sqlite', stdout=StringIO())
+
+
+class SyntheticDataTests(TestCase):
+
+    def generate(self, seed=0):
+        return synthetic.Generator(seed=seed, batch_size=40, today=date(2025, 6, 1)).run(
+            specialties=4, doctors=6, patients=50, appointments=300, records=120)
+
+    def test_counts_and_invariants(self):
+        """Test the generator creates what was asked within the model rules"""
+        created = self.generate()
+        self.assertEqual(created, {'specialties': 4, 'doctors': 6, 'patients': 50, 'appointments': 300, 'records': 120})
+        self.assertEqual(metrics.get_metrics()['appointments'], 300)
+        future = Appointment.objects.filter(date__gt=date(2025, 6, 1))
+        self.assertFalse(future.filter(status='COMPLETED').exists())
+        self.assertFalse(MedicalRecord.objects.filter(date__gt=date(2025, 6, 1)).exists())
+        self.assertGreater(MedicalRecord.objects.values('date').distinct().count(), 50)
+        self.assertTrue(self.client.login(username='synthetic-patient0@example.test', password=synthetic.PASSWORD))
+
+    def test_deterministic(self):
+        """Test the same seed produces the same rows"""
+        self.generate()
+        first = list(Appointment.objects.order_by('id').values_list('date', 'time', 'status'))
+        Appointment.objects.all().delete()
+        MedicalRecord.objects.all().delete()
+        User.objects.all().delete()
+        Specialty.objects.all().delete()
+        self.generate()
+        self.assertEqual(list(Appointment.objects.order_by('id').values_list('date', 'time', 'status')), first)
+
+    def test_command_refuses_to_append(self):
+        """Test generate_hms_data scales counts and will not run twice"""
+        out = StringIO()
+        call_command('generate_hms_data', '--scale', '200', '--records', '10', stdout=out)
+        self.assertIn('200 appointments', out.getvalue())
+        self.assertEqual(MedicalRecord.objects.count(), 10)
+        with self.assertRaises(CommandError):
+            call_command('generate_hms_data', '--scale', '200')
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AuthenticationTests(TestCase):
+
+    def setUp(self):
+        authentication.login_latency.clear()
+        specialty = Specialty.objects.create(name='Cardiology')
+        doctor_user = User.objects.create_user('doc', 'doc@test.com', 'pw', first_name='Gregory', last_name='House')
+        self.doctor = Doctor.objects.create(user=doctor_user, specialty=specialty, contact='1')
+        patient_user = User.objects.create_user('pat', 'pat@test.com', 'pw', first_name='Jane', last_name='Doe')
+        self.patient = Patient.objects.create(user=patient_user, age=30, gender='F', contact='2', address='x',
+                                              date_of_birth=date(1990, 1, 1))
+        User.objects.create_superuser('root', 'root@test.com', 'pw', first_name='Ada')
+
+    def test_sign_in_is_one_query(self):
+        """Test the account and its role row are resolved in one query"""
+        with self.assertNumQueries(1):
+            doctor = authentication.sign_in('doctor', 'doc@test.com', 'pw')
+        self.assertEqual(doctor, {'role': 'doctor', 'id': self.doctor.id, 'user_id': self.doctor.user_id,
+                                  'first_name': 'Gregory', 'last_name': 'House'})
+        self.assertEqual(authentication.sign_in('patient', 'pat@test.com', 'pw')['id'], self.patient.id)
+        self.assertEqual(authentication.sign_in('admin', 'root', 'pw')['first_name'], 'Ada')
+
+    def test_rejected_credentials(self):
+        """Test wrong passwords, roles and inactive accounts are all rejected alike"""
+        User.objects.filter(username='pat').update(is_active=False)
+        attempts = [('doctor', 'doc@test.com', 'nope'), ('doctor', 'pat@test.com', 'pw'), ('patient', 'pat@test.com', 'pw'),
+                    ('admin', 'doc', 'pw'), ('patient', '', 'pw')]
+        for role, identifier, password in attempts:
+            with self.subTest(role=role, identifier=identifier), self.assertRaises(authentication.InvalidCredentials):
+                authentication.sign_in(role, identifier, password)
+
+    def test_duplicate_email_is_reported(self):
+        """Test two accounts sharing an email raise instead of picking one"""
+        user = User.objects.create_user('pat2', 'pat@test.com', 'pw')
+        Patient.objects.create(user=user, age=40, gender='M', contact='3', address='y', date_of_birth=date(1980, 1, 1))
+        with self.assertRaises(authentication.AmbiguousAccount):
+            authentication.sign_in('patient', 'pat@test.com', 'pw')
+
+    def test_outdated_hash_is_upgraded(self):
+        """Test a password stored with an older hasher is rehashed on sign-in"""
+        hashers = ['django.contrib.auth.hashers.PBKDF2PasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher']
+        with self.settings(PASSWORD_HASHERS=hashers):
+            authentication.sign_in('doctor', 'doc@test.com', 'pw')
+        self.assertTrue(User.objects.get(username='doc').password.startswith('pbkdf2_sha256$'))
+
+    def test_latency_percentiles(self):
+        """Test every attempt is timed and summarized as p50/p99"""
+        window = authentication.LatencyWindow()
+        self.assertEqual(window.summary(), {'count': 0, 'p50': None, 'p99': None})
+        for ms in range(100, 0, -1):
+            window.add(ms)
+        self.assertEqual(window.summary(), {'count': 100, 'p50': 50, 'p99': 99})
+        authentication.sign_in('doctor', 'doc@test.com', 'pw')
+        with self.assertRaises(authentication.LoginError):
+            authentication.sign_in('doctor', 'doc@test.com', 'nope')
+        self.assertEqual(authentication.login_latency.summary()['count'], 2)
+
+    def test_principal_and_email_index(self):
+        """Test sessions reload their principal by id and email lookups are indexed"""
+        self.assertEqual(authentication.principal('patient', self.patient.id)['last_name'], 'Doe')
+        self.assertIsNone(authentication.principal('doctor', 999))
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'auth_user')
+        self.assertIn(['email'], [c['columns'] for c in constraints.values() if c['index']])
+
+
+class LRUCacheTests(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        """Test hits refresh an entry and the oldest one is dropped past capacity"""
+        lru, loads = LRUCache(2), []
+        load = lambda key: lambda: loads.append(key) or key.upper()
+        for key in ['a', 'b', 'a', 'c', 'a', 'b']:
+            self.assertEqual(lru.get_or_load(key, load(key)), key.upper())
+        self.assertEqual(loads, ['a', 'b', 'c', 'b'])
+        self.assertEqual(len(lru), 2)
+        self.assertNotIn('c', lru)
+
+
+class InstrumentationTests(TestCase):
+
+    def test_measure_counts_and_ranks_statements(self):
+        """Test measure records queries, SQL time and the slowest statements"""
+        with self.assertLogs('hms.perf', level='INFO') as logs:
+            with measure('probe', keep=2) as stats:
+                list(User.objects.all())
+                list(Specialty.objects.all())
+                list(Patient.objects.all())
+        self.assertEqual(stats.queries, 3)
+        self.assertEqual(len(stats.slowest), 2)
+        self.assertGreaterEqual(stats.slowest[0][0], stats.slowest[1][0])
+        self.assertGreaterEqual(stats.wall_ms, stats.sql_ms)
+        self.assertIn('page=probe', logs.output[0])
+        self.assertEqual(logs.records[0].perf['queries'], 3)
+
+    def test_decorator_reports_even_when_page_raises(self):
+        """Test instrumented pages hand over stats when they stop early"""
+        seen = []
+
+        @instrumented(on_finish=seen.append)
+        def page():
+            Specialty.objects.count()
+            raise RuntimeError('rerun')
+
+        with self.assertLogs('hms.perf', level='INFO'), self.assertRaises(RuntimeError):
+            page()
+        self.assertEqual((seen[0].name, seen[0].queries), ('page', 1))
+
+    def test_slow_pages_warn(self):
+        """Test renders over HMS_SLOW_PAGE_MS are logged as warnings"""
+        with self.settings(HMS_SLOW_PAGE_MS=-1), self.assertLogs('hms.perf', level='WARNING'):
+            with measure('slow'):
+                pass
+
+    def test_recorder_alone(self):
+        """Test QueryRecorder works as a plain execute wrapper"""
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            Specialty.objects.exists()
+        self.assertEqual(recorder.count, 1)
+
+
+@skipUnless(find_spec('streamlit'), 'needs streamlit')
+class PageQueryBudgetTests(TransactionTestCase):
+    """Render each Streamlit page and hold it to a query budget."""
+
+    APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+    # The dashboard may recount its metrics; role pages read the signed-in
+    # doctor or patient from the session, loaded once on the first run.
+    BUDGETS = {
+        ('admin', 'Dashboard'): 5,
+        ('admin', 'Patients'): 1,
+        ('admin', 'Doctors'): 2,
+        ('admin', 'Appointments'): 1,
+        ('admin', 'Specialties'): 1,
+        ('admin', 'Analytics'): 5,  # three rollup reads + directories
+        ('doctor', 'My Appointments'): 1,
+        ('doctor', 'Add Medical Record'): 0,
+        ('patient', 'My Appointments'): 1,
+        ('patient', 'Book Appointment'): 3,  # + working hours and slot bitmaps
+        ('patient', 'Medical Records'): 1,
+    }
+
+    def setUp(self):
+        from streamlit.testing.v1 import AppTest
+        import streamlit as st
+        self.AppTest = AppTest
+        st.cache_resource.clear()
+        cache.clear()
+        self.admin = User.objects.create_superuser('root', 'root@test.com', None)
+        specialty = Specialty.objects.create(name='Cardiology')
+        doctor_user = User.objects.create_user('doc@test.com', 'doc@test.com', first_name='Gregory', last_name='House')
+        self.doctor = Doctor.objects.create(user=doctor_user, specialty=specialty, contact='1')
+        self.patients = []
+        for i in range(30):
+            user = User.objects.create_user(f'p{i}@test.com', f'p{i}@test.com', first_name='Pat', last_name=f'N{i}')
+            patient = Patient.objects.create(user=user, age=30, gender='F', contact='2', address='x',
+                                             date_of_birth=date(1990, 1, 1))
+            Appointment.objects.create(patient=patient, doctor=self.doctor, date=date(2030, 1, 1), time=time(9, i))
+            MedicalRecord.objects.create(patient=patient, doctor=self.doctor, diagnosis='Flu', treatment='Rest')
+            self.patients.append(patient)
+
+    def render(self, role, user_id, menu):
+        app = self.AppTest.from_file(self.APP, default_timeout=30)
+        app.session_state['logged_in'] = True
+        app.session_state['user_type'] = role
+        app.session_state['user_id'] = user_id
+        logging.disable(logging.WARNING)
+        try:
+            app.run()
+            app.sidebar.selectbox[0].select(menu).run()
+        finally:
+            logging.disable(logging.NOTSET)
+        self.assertFalse(app.exception, [e.value for e in app.exception])
+        return app.session_state['perf']
+
+    def test_pages_stay_within_budget(self):
+        """Test every dashboard page renders within its query budget"""
+        users = {'admin': self.admin.id, 'doctor': self.doctor.id, 'patient': self.patients[0].id}
+        for (role, menu), budget in self.BUDGETS.items():
+            with self.subTest(role=role, menu=menu):
+                perf = self.render(role, users[role], menu)
+                self.assertEqual(perf['page'], f'{role}_dashboard')
+                self.assertLessEqual(perf['queries'], budget, perf['slowest'])
+
+    def test_login_caches_principal(self):
+        """Test signing in stores the principal and later reruns skip the user lookup"""
+        user = self.doctor.user
+        user.set_password('pw')
+        user.save()
+        app = self.AppTest.from_file(self.APP, default_timeout=30)
+        app.run()
+        app.text_input(key='doc_email').input('doc@test.com')
+        app.text_input(key='doc_pass').input('pw')
+        next(b for b in app.button if b.label == 'Login as Doctor').click().run()
+        self.assertFalse(app.exception, [e.value for e in app.exception])
+        self.assertEqual(app.session_state['principal']['id'], self.doctor.id)
+        self.assertIn('Welcome, Dr. Gregory House', [m.value for m in app.markdown])
+        self.assertEqual(app.session_state['perf']['queries'], 1)
+
+    def test_record_bodies_load_when_opened(self):
+        """Test the records timeline reads a body only once it is opened, then from the session"""
+        app = self.AppTest.from_file(self.APP, default_timeout=30)
+        app.session_state['logged_in'] = True
+        app.session_state['user_type'] = 'patient'
+        app.session_state['user_id'] = self.patients[0].id
+        app.run()
+        app.sidebar.selectbox[0].select('Medical Records').run()
+        self.assertNotIn('Flu', ' '.join(m.value for m in app.markdown))
+        app.toggle[0].set_value(True).run()
+        self.assertIn('Diagnosis: Flu', ' '.join(m.value for m in app.markdown))
+        self.assertEqual(app.session_state['perf']['queries'], 2)
+        app.run()
+        self.assertEqual(app.session_state['perf']['queries'], 1)
+
+    def test_logout_drops_session_state(self):
+        """Test logging out forgets the opened records, cursors and toggles of the signed-in user"""
+        app = self.AppTest.from_file(self.APP, default_timeout=30)
+        app.session_state['logged_in'] = True
+        app.session_state['user_type'] = 'patient'
+        app.session_state['user_id'] = self.patients[0].id
+        app.run()
+        app.sidebar.selectbox[0].select('Medical Records').run()
+        app.toggle[0].set_value(True).run()
+        self.assertIn('record_bodies', app.session_state)
+        app.sidebar.button[0].click().run()
+        self.assertFalse(app.exception, [e.value for e in app.exception])
+        self.assertFalse(app.session_state['logged_in'])
+        self.assertNotIn('record_bodies', app.session_state)
+        self.assertFalse([key for key in app.session_state if key.startswith(('record_open_', 'patient_'))])
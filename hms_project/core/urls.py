@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('api/specialties/', views.specialties.collection_view, name='api_specialties'),
+    path('api/specialties/<int:pk>/', views.specialties.item_view, name='api_specialty'),
+]
@@ -1,3 +1,16 @@
-from django.shortcuts import render
+from .api import Resource
+from .models import Specialty
 
-# Create your views here.
+
+class SpecialtyResource(Resource):
+    model = Specialty
+    fields = {'id': 'id', 'name': 'name'}
+    filters = {'q': 'name__istartswith'}
+    form_fields = ['name']
+
+    def scope(self, principal, queryset):
+        # The specialty list is reference data every signed-in user may read.
+        return queryset
+
+
+specialties = SpecialtyResource()
@@ -1,20 +1,57 @@
 from django.contrib import admin
-from .models import Doctor, Appointment, MedicalRecord
+from core.changelists import DoctorFilter, DoctorSpecialtyFilter, LargeTableAdmin, SpecialtyFilter
+from patient_app.models import Patient
+from patient_app.search import filter_patients
+from .models import Doctor, Appointment, MedicalRecord, ArchivedAppointment, ArchivedMedicalRecord, OutboxMessage
 
 @admin.register(Doctor)
 class DoctorAdmin(admin.ModelAdmin):
     list_display = ['user', 'specialty', 'contact']
+    list_select_related = ['user', 'specialty']
     search_fields = ['user__first_name', 'user__last_name', 'specialty__name']
-    list_filter = ['specialty']
+    list_filter = [DoctorSpecialtyFilter]
+
+class PatientSearchMixin:
+    # Name search goes through the patient index instead of LIKE scans over the joins.
+    search_fields = ['patient__user__first_name']
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(patient__in=filter_patients(Patient.objects.all(), search_term)), False
 
 @admin.register(Appointment)
-class AppointmentAdmin(admin.ModelAdmin):
+class AppointmentAdmin(PatientSearchMixin, LargeTableAdmin):
     list_display = ['patient', 'doctor', 'date', 'time', 'status']
-    search_fields = ['patient__user__first_name', 'doctor__user__first_name']
-    list_filter = ['status', 'date', 'doctor__specialty']
+    list_select_related = ['patient__user', 'doctor__user']
+    list_filter = ['status', 'date', SpecialtyFilter, DoctorFilter]
+    # Newest first along the date indexes, so filtered pages stop after one page instead of sorting.
+    ordering = ['-date', '-time', '-id']
+    raw_id_fields = ['patient', 'doctor']
 
 @admin.register(MedicalRecord)
-class MedicalRecordAdmin(admin.ModelAdmin):
+class MedicalRecordAdmin(PatientSearchMixin, LargeTableAdmin):
     list_display = ['patient', 'doctor', 'date']
-    search_fields = ['patient__user__first_name', 'doctor__user__first_name']
-    list_filter = ['date', 'doctor__specialty']
\ No newline at end of file
+    list_select_related = ['patient__user', 'doctor__user']
+    list_filter = ['date', SpecialtyFilter, DoctorFilter]
+    raw_id_fields = ['patient', 'doctor']
+
+@admin.register(ArchivedAppointment)
+class ArchivedAppointmentAdmin(PatientSearchMixin, LargeTableAdmin):
+    list_display = ['patient', 'doctor', 'date', 'time', 'status', 'archived_at']
+    list_select_related = ['patient__user', 'doctor__user']
+    list_filter = ['status', 'date']
+    raw_id_fields = ['patient', 'doctor']
+
+@admin.register(ArchivedMedicalRecord)
+class ArchivedMedicalRecordAdmin(PatientSearchMixin, LargeTableAdmin):
+    list_display = ['patient', 'doctor', 'date', 'archived_at']
+    list_select_related = ['patient__user', 'doctor__user']
+    list_filter = ['date']
+    raw_id_fields = ['patient', 'doctor']
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(LargeTableAdmin):
+    list_display = ['kind', 'appointment_id', 'date', 'time', 'status', 'attempts', 'available_at', 'sent_at']
+    list_filter = ['status', 'kind']
+    ordering = ['-id']
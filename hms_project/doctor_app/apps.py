@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class DoctorAppConfig(AppConfig):
     name = 'doctor_app'
+
+    def ready(self):
+        from . import signals
+        signals.connect()
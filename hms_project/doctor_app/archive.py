@@ -0,0 +1,68 @@
+import time as clock
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core import metrics
+from .models import Appointment, ArchivedAppointment, ArchivedMedicalRecord, MedicalRecord
+
+BATCH_SIZE = 1000
+# Ids per DELETE, well inside SQLite's limit on bound parameters whatever --batch-size is.
+DELETE_CHUNK = 500
+FINISHED = [status for status, _ in Appointment.STATUS_CHOICES if status != 'BOOKED']
+
+
+def horizon(today=None):
+    """Rows dated before this day are old enough to archive."""
+    return (today or timezone.localdate()) - timedelta(days=settings.HMS_ARCHIVE_AFTER_DAYS)
+
+
+def _move(source, target, pending, batch_size, max_batches, moved):
+    fields = [field.attname for field in target._meta.concrete_fields if field.name != 'archived_at']
+    pending = pending.order_by('date', 'id').values(*fields)
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        started = clock.perf_counter()
+        with transaction.atomic():
+            rows = list(pending[:batch_size])
+            if not rows:
+                break
+            target.objects.bulk_create([target(**row) for row in rows])
+            # A plain DELETE: nothing references these rows, and per-row
+            # delete signals are replaced by ``moved`` for the whole batch.
+            table = connection.ops.quote_name(source._meta.db_table)
+            with connection.cursor() as cursor:
+                for start in range(0, len(rows), DELETE_CHUNK):
+                    ids = [row['id'] for row in rows[start:start + DELETE_CHUNK]]
+                    cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+            if moved:
+                moved(rows)
+        batches += 1
+        yield len(rows), clock.perf_counter() - started
+
+
+def _appointments_moved(rows):
+    metrics.adjust('appointments', -len(rows))
+    for status, n in Counter(row['status'] for row in rows).items():
+        metrics.adjust(metrics.status_counter(status), -n)
+
+
+def archive_appointments(before=None, batch_size=BATCH_SIZE, max_batches=None):
+    """Move finished appointments dated before ``before`` to the archive, yielding (rows, seconds) per batch.
+
+    BOOKED rows stay put whatever their date: they still hold a slot. Each
+    batch copies and deletes in one transaction, so a run can stop anywhere
+    and the next one carries on.
+    """
+    pending = Appointment.objects.filter(status__in=FINISHED, date__lt=before or horizon())
+    return _move(Appointment, ArchivedAppointment, pending, batch_size, max_batches, _appointments_moved)
+
+
+def archive_records(before=None, batch_size=BATCH_SIZE, max_batches=None):
+    """Move medical records dated before ``before`` to the archive, as archive_appointments."""
+    pending = MedicalRecord.objects.filter(date__lt=before or horizon())
+    # The search index drops the deleted rows through its triggers.
+    return _move(MedicalRecord, ArchivedMedicalRecord, pending, batch_size, max_batches, None)
@@ -0,0 +1,186 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import routing
+from .models import Appointment, Doctor, DoctorDaySlots, WorkingHours
+from .slots import default_mask, mask_times, slot_index, slot_mask, slot_time, slots_per_day
+
+try:
+    import numpy as np
+except ImportError:  # plain integers answer the same questions, a doctor at a time
+    np = None
+
+
+def _weeks(doctor_ids, hours):
+    masks = {doctor_id: None for doctor_id in doctor_ids}
+    for doctor_id, weekday, start, end in hours:
+        if masks[doctor_id] is None:
+            masks[doctor_id] = [0] * 7
+        masks[doctor_id][weekday] |= slot_mask(start, end)
+    default = [default_mask()] * 7
+    return {doctor_id: week or default for doctor_id, week in masks.items()}
+
+
+def _hours(doctor_ids):
+    rows = WorkingHours.objects.filter(doctor_id__in=doctor_ids).order_by()
+    return rows.values_list('doctor_id', 'weekday', 'start', 'end')
+
+
+def open_masks(doctor_ids):
+    """{doctor_id: seven weekday masks, Monday first} from each doctor's working hours.
+
+    Doctors with no hours of their own work the default day, every day.
+    """
+    doctor_ids = list(doctor_ids)
+    return _weeks(doctor_ids, _hours(doctor_ids))
+
+
+def _started_mask(day, now):
+    """Slots on ``day`` that have already begun by ``now``: all of a past day, none of a future one."""
+    if day < now.date():
+        return (1 << slots_per_day()) - 1
+    if day > now.date():
+        return 0
+    return (1 << (now.hour * 60 + now.minute) // settings.HMS_SLOT_MINUTES + 1) - 1
+
+
+class Availability:
+    """Free slots of many doctors over consecutive days, as one bitmap per doctor and day.
+
+    ``free`` is a (doctors x days) matrix of masks: the doctor's working
+    hours for that weekday minus the booked bits minus slots already
+    started. With NumPy it is a uint64 array and every question below is a
+    handful of vectorized operations over all doctors at once.
+    """
+
+    def __init__(self, doctor_ids, start, days=7, now=None):
+        self.doctor_ids = list(doctor_ids)
+        self.start = start
+        self.days = days
+        now = timezone.localtime(now)
+        self.dates = [start + timedelta(days=i) for i in range(days)]
+        week = open_masks(self.doctor_ids)
+        row_of = {doctor_id: row for row, doctor_id in enumerate(self.doctor_ids)}
+        booked = DoctorDaySlots.objects.filter(
+            doctor_id__in=self.doctor_ids, date__gte=start, date__lt=start + timedelta(days=days), booked__gt=0,
+        ).values_list('doctor_id', 'date', 'booked')
+        gone = [_started_mask(day, now) for day in self.dates]
+        if np is not None:
+            templates = np.array([week[d] for d in self.doctor_ids], dtype=np.uint64).reshape(-1, 7)
+            free = templates[:, [day.weekday() for day in self.dates]]
+            taken = np.zeros_like(free)
+            for doctor_id, day, mask in booked:
+                taken[row_of[doctor_id], (day - start).days] = mask
+            free &= ~taken
+            free &= ~np.array(gone, dtype=np.uint64)
+        else:
+            free = [[week[d][day.weekday()] & ~gone[i] for i, day in enumerate(self.dates)] for d in self.doctor_ids]
+            for doctor_id, day, mask in booked:
+                free[row_of[doctor_id]][(day - start).days] &= ~mask
+        self.free = free
+        self._row_of = row_of
+
+    def slots(self, doctor_id):
+        """{date: [free start times]} for one doctor, days without free slots left out."""
+        row = self.free[self._row_of[doctor_id]]
+        return {day: mask_times(int(mask)) for day, mask in zip(self.dates, row) if mask}
+
+    def earliest(self, limit=None):
+        """[(doctor_id, date, time)] of each doctor's first free slot, soonest first."""
+        if np is None:
+            found = []
+            for doctor_id, row in zip(self.doctor_ids, self.free):
+                for i, mask in enumerate(row):
+                    if mask:
+                        found.append((i, (mask & -mask).bit_length() - 1, doctor_id))
+                        break
+            found.sort()
+        else:
+            rows = np.flatnonzero((self.free != 0).any(axis=1))
+            first_day = (self.free[rows] != 0).argmax(axis=1)
+            masks = self.free[rows, first_day]
+            lowest = masks & (~masks + np.uint64(1))  # isolate the lowest set bit
+            first_slot = np.log2(lowest.astype(np.float64)).astype(np.int64)  # exact for powers of two
+            order = np.lexsort((first_slot, first_day))
+            found = [(int(first_day[i]), int(first_slot[i]), self.doctor_ids[rows[i]]) for i in order]
+        found = found[:limit] if limit else found
+        return [(doctor_id, self.dates[day], slot_time(bit)) for day, bit, doctor_id in found]
+
+
+def free_slots(doctor_id, start, days=7, now=None):
+    """{date: [free start times]} for ``doctor_id`` over ``days`` days from ``start``."""
+    return Availability([doctor_id], start, days, now).slots(doctor_id)
+
+
+def earliest_free(start, days=7, specialty_id=None, limit=10, now=None):
+    """Soonest free slot per doctor, optionally within one specialty, soonest first."""
+    doctors = Doctor.objects.all()
+    if specialty_id is not None:
+        doctors = doctors.filter(specialty_id=specialty_id)
+    return Availability(doctors.values_list('id', flat=True), start, days, now).earliest(limit)
+
+
+async def afree_day(doctor_id, day, now=None):
+    """Free start times of one doctor's day, through the async ORM."""
+    week = _weeks([doctor_id], [row async for row in _hours([doctor_id])])[doctor_id]
+    booked = await DoctorDaySlots.objects.filter(doctor_id=doctor_id, date=day).values_list('booked', flat=True).afirst()
+    return mask_times(week[day.weekday()] & ~(booked or 0) & ~_started_mask(day, timezone.localtime(now)))
+
+
+def is_open(doctor_id, day, at):
+    """Whether ``at`` starts a slot inside the doctor's working hours on ``day``."""
+    try:
+        bit = 1 << slot_index(at)
+    except ValueError:
+        return False
+    return bool(open_masks([doctor_id])[doctor_id][day.weekday()] & bit)
+
+
+def mark_booked(doctor_id, day, at):
+    try:
+        bit = 1 << slot_index(at)
+    except ValueError:
+        return  # off-grid legacy times are guarded by the unique constraint alone
+    bitmap = DoctorDaySlots.objects.filter(doctor_id=doctor_id, date=day)
+    if bitmap.update(booked=F('booked').bitor(bit)):
+        return
+    try:
+        with transaction.atomic():
+            DoctorDaySlots.objects.create(doctor_id=doctor_id, date=day, booked=bit)
+    except IntegrityError:
+        bitmap.update(booked=F('booked').bitor(bit))  # created concurrently
+
+
+def mark_free(doctor_id, day, at):
+    try:
+        bit = 1 << slot_index(at)
+    except ValueError:
+        return
+    DoctorDaySlots.objects.filter(doctor_id=doctor_id, date=day).update(booked=F('booked').bitand(~bit))
+
+
+@routing.primary()
+def rebuild(doctor_ids=None):
+    """Recompute every bitmap from BOOKED appointments, e.g. after bulk loads."""
+    appointments = Appointment.objects.filter(status='BOOKED')
+    bitmaps = DoctorDaySlots.objects.all()
+    if doctor_ids is not None:
+        appointments = appointments.filter(doctor_id__in=doctor_ids)
+        bitmaps = bitmaps.filter(doctor_id__in=doctor_ids)
+    masks = {}
+    for doctor_id, day, at in appointments.values_list('doctor_id', 'date', 'time').iterator():
+        try:
+            masks[doctor_id, day] = masks.get((doctor_id, day), 0) | 1 << slot_index(at)
+        except ValueError:
+            continue
+    with transaction.atomic():
+        bitmaps.delete()
+        DoctorDaySlots.objects.bulk_create(
+            [DoctorDaySlots(doctor_id=doctor_id, date=day, booked=mask) for (doctor_id, day), mask in masks.items()],
+            batch_size=2000,
+        )
+    return len(masks)
@@ -0,0 +1,95 @@
+import random
+import time as clock
+
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+
+from core import metrics, routing
+from . import availability, notifications, stats
+from .models import Appointment
+
+RETRIES = 5
+BACKOFF_SECONDS = 0.01
+ACTIVE_SLOT_CONSTRAINT = 'appt_unique_active_slot'
+
+
+class BookingError(ValueError):
+    pass
+
+
+class SlotUnavailable(BookingError):
+    pass
+
+
+def _check_slot(doctor_id, day, slot_time):
+    now = timezone.localtime()
+    if (day, slot_time) <= (now.date(), now.time()):
+        raise BookingError('Appointments cannot be booked in the past')
+    if not availability.is_open(doctor_id, day, slot_time):
+        raise BookingError(f'{slot_time:%H:%M} is not a bookable slot for this doctor on {day:%A}s')
+
+
+def _slot_taken(exc):
+    """Whether ``exc`` is the active-slot constraint rather than, say, an unknown patient or doctor."""
+    # PostgreSQL names the constraint; SQLite lists its columns.
+    table = Appointment._meta.db_table
+    columns = ', '.join(f'{table}.{column}' for column in ('doctor_id', 'date', 'time'))
+    return ACTIVE_SLOT_CONSTRAINT in str(exc) or columns in str(exc)
+
+
+def book_appointment(patient_id, doctor_id, day, slot_time, retries=RETRIES):
+    """Book ``slot_time`` on ``day`` with a doctor, or raise SlotUnavailable.
+
+    The partial unique constraint on active slots is the arbiter: the insert
+    either wins the slot or fails, so two concurrent bookings can never both
+    succeed and no lock is held while checking. Other integrity errors, such
+    as an unknown patient, propagate. Lock timeouts ("database is
+    locked", serialization failures) are retried with jittered backoff,
+    unless the caller's own transaction would be left broken. The
+    confirmation email is queued by the post_save signal in the same
+    transaction.
+    """
+    _check_slot(doctor_id, day, slot_time)
+    for attempt in range(retries + 1):
+        try:
+            with transaction.atomic():
+                return Appointment.objects.create(
+                    patient_id=patient_id, doctor_id=doctor_id, date=day, time=slot_time, status='BOOKED'
+                )
+        except IntegrityError as exc:
+            if _slot_taken(exc):
+                raise SlotUnavailable('That slot is already booked')
+            raise
+        except OperationalError:
+            if attempt == retries or connection.in_atomic_block:
+                raise
+            clock.sleep(BACKOFF_SECONDS * 2 ** attempt * (1 + random.random()))
+
+
+def cancel_appointment(appointment_id, patient_id=None, doctor_id=None):
+    """Cancel a booked appointment with a conditional UPDATE; False if it was not BOOKED.
+
+    ``patient_id``/``doctor_id`` restrict the cancellation to the caller's
+    own appointments. The update skips model signals, so the status
+    counters, the slot bitmap and the daily stats are adjusted, and the
+    cancellation email queued, here.
+    """
+    appointments = Appointment.objects.filter(id=appointment_id, status='BOOKED')
+    if patient_id is not None:
+        appointments = appointments.filter(patient_id=patient_id)
+    if doctor_id is not None:
+        appointments = appointments.filter(doctor_id=doctor_id)
+    with routing.primary():
+        row = appointments.values_list('doctor_id', 'date', 'time', 'patient_id').first()
+    if row is None:
+        return False
+    slot, owner = row[:3], row[3]
+    with transaction.atomic():
+        # Still conditional: a concurrent cancel between the read and here wins.
+        if not appointments.update(status='CANCELLED'):
+            return False
+        availability.mark_free(*slot)
+        stats.moved(slot[0], slot[1], 'BOOKED', 'CANCELLED')
+        metrics.status_changed('BOOKED', 'CANCELLED')
+        notifications.queue('CANCELLED', appointment_id, owner, *slot)
+    return True
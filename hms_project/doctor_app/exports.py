@@ -0,0 +1,111 @@
+import csv
+import io
+import json
+import zlib
+from datetime import date
+
+from django.db.models import F
+
+from core.pagination import keyset_page
+from .models import Appointment, MedicalRecord
+
+CHUNK_SIZE = 2000
+FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+PEOPLE_COLUMNS = {
+    'patient_first_name': F('patient__user__first_name'),
+    'patient_last_name': F('patient__user__last_name'),
+    'doctor_first_name': F('doctor__user__first_name'),
+    'doctor_last_name': F('doctor__user__last_name'),
+    'specialty': F('doctor__specialty__name'),
+}
+
+EXPORTS = {
+    'appointments': (Appointment, ['id', 'date', 'time', 'status', 'patient_id', 'doctor_id']),
+    'records': (MedicalRecord, ['id', 'date', 'patient_id', 'doctor_id', 'diagnosis', 'treatment']),
+}
+
+
+def _parse_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a YYYY-MM-DD date')
+
+
+def _parse_id(value, name):
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{name} must be a numeric id')
+
+
+def parse_filters(params):
+    """Turn ``from``/``to``/``doctor``/``specialty`` strings into export filters."""
+    filters = {}
+    if params.get('from'):
+        filters['date__gte'] = _parse_date(params['from'], 'from')
+    if params.get('to'):
+        filters['date__lte'] = _parse_date(params['to'], 'to')
+    if params.get('doctor'):
+        filters['doctor_id'] = _parse_id(params['doctor'], 'doctor')
+    if params.get('specialty'):
+        filters['doctor__specialty_id'] = _parse_id(params['specialty'], 'specialty')
+    return filters
+
+
+def columns(kind):
+    return EXPORTS[kind][1] + list(PEOPLE_COLUMNS)
+
+
+def iter_rows(kind, filters, chunk_size=CHUNK_SIZE):
+    """Yield lists of row dicts, one joined keyset query per chunk.
+
+    Each chunk is its own short query, so a long export never pins a read
+    transaction (or the SQLite writer) for its whole duration.
+    """
+    model, fields = EXPORTS[kind]
+    rows = model.objects.filter(**filters).values(*fields, **PEOPLE_COLUMNS)
+    cursor = None
+    while True:
+        page = keyset_page(rows, ['id'], cursor, chunk_size)
+        if page.rows:
+            yield page.rows
+        if not page.has_next:
+            return
+        cursor = page.next_cursor
+
+
+def _csv_chunks(kind, chunks):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns(kind))
+    writer.writeheader()
+    for chunk in chunks:
+        writer.writerows(chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(chunks):
+    for chunk in chunks:
+        yield ''.join(json.dumps(row, default=str) + '\n' for row in chunk)
+
+
+def _gzip(pieces):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for piece in pieces:
+        data = compressor.compress(piece)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream(kind, fmt, filters, gzip=False, chunk_size=CHUNK_SIZE):
+    """Encoded export of ``kind`` as an iterator of bytes, gzipped on the fly if asked."""
+    chunks = iter_rows(kind, filters, chunk_size)
+    text = _csv_chunks(kind, chunks) if fmt == 'csv' else _ndjson_chunks(chunks)
+    pieces = (piece.encode('utf-8') for piece in text)
+    return _gzip(pieces) if gzip else pieces
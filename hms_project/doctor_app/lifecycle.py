@@ -0,0 +1,68 @@
+import time as clock
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from core import metrics
+from . import stats
+from .models import Appointment, DoctorDaySlots, MedicalRecord
+
+BATCH_SIZE = 1000
+OUTCOMES = ('COMPLETED', 'NO_SHOW')
+
+
+def _cutoff(now):
+    """Latest slot start that has finished by ``now``."""
+    return timezone.localtime(now) - timedelta(minutes=settings.HMS_SLOT_MINUTES)
+
+
+def overdue(now=None):
+    """BOOKED appointments whose slot has ended, read through the (status, date) index."""
+    cutoff = _cutoff(now)
+    return Appointment.objects.filter(status='BOOKED', date__lte=cutoff.date()).exclude(
+        date=cutoff.date(), time__gt=cutoff.time(),
+    )
+
+
+def sweep(batch_size=BATCH_SIZE, max_batches=None, now=None):
+    """Resolve finished BOOKED appointments, yielding (completed, no-shows, seconds) per batch.
+
+    A visit is COMPLETED when the doctor wrote a medical record for that
+    patient on the appointment day and NO_SHOW otherwise. Each batch locks
+    the oldest rows and updates them in its own transaction, still
+    conditional on BOOKED. Swept rows leave the BOOKED range, so an
+    interrupted run simply resumes where it stopped. The updates skip model
+    signals: the status counters and daily stats are adjusted here, and the
+    slot bitmaps of finished days, which availability never reads, are
+    dropped at the end.
+    """
+    seen = MedicalRecord.objects.filter(patient=OuterRef('patient'), doctor=OuterRef('doctor'), date=OuterRef('date'))
+    pending = overdue(now).order_by('date', 'id').values_list('id', 'doctor_id', 'date', Exists(seen))
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        started = clock.perf_counter()
+        with transaction.atomic():
+            # Locked where the database can, so the updates below find the rows still BOOKED.
+            batch = list(pending.select_for_update()[:batch_size])
+            if not batch:
+                break
+            groups = defaultdict(list)
+            for pk, doctor_id, day, seen in batch:
+                groups['COMPLETED' if seen else 'NO_SHOW', doctor_id, day].append(pk)
+            moved = dict.fromkeys(OUTCOMES, 0)
+            for (outcome, doctor_id, day), ids in groups.items():
+                # Count what the update moved: a row changed since it was read is left alone.
+                rows = Appointment.objects.filter(id__in=ids, status='BOOKED').update(status=outcome)
+                if rows:
+                    stats.moved(doctor_id, day, 'BOOKED', outcome, rows)
+                    moved[outcome] += rows
+            for outcome, rows in moved.items():
+                if rows:
+                    metrics.status_changed('BOOKED', outcome, rows)
+        batches += 1
+        yield moved['COMPLETED'], moved['NO_SHOW'], clock.perf_counter() - started
+    DoctorDaySlots.objects.filter(date__lt=_cutoff(now).date()).delete()
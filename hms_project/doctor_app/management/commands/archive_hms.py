@@ -0,0 +1,30 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from doctor_app import archive
+
+
+class Command(BaseCommand):
+    help = 'Move finished appointments and medical records past the archive horizon into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', type=date.fromisoformat, default=None,
+                            help='Archive rows dated before this day (default: HMS_ARCHIVE_AFTER_DAYS ago)')
+        parser.add_argument('--only', choices=['appointments', 'records'], default=None)
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches of each kind; the next run carries on')
+
+    def handle(self, *args, **options):
+        before = options['before'] or archive.horizon()
+        movers = {'appointments': archive.archive_appointments, 'records': archive.archive_records}
+        for kind, move in movers.items():
+            if options['only'] not in (None, kind):
+                continue
+            total = seconds = 0
+            for n, (rows, elapsed) in enumerate(move(before, options['batch_size'], options['max_batches']), 1):
+                total += rows
+                seconds += elapsed
+                self.stdout.write(f'{kind} batch {n}: {rows} rows in {elapsed * 1000:.1f} ms')
+            self.stdout.write(f'Archived {total} {kind} dated before {before} in {seconds * 1000:.1f} ms')
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from doctor_app import notifications
+
+
+class Command(BaseCommand):
+    help = 'Email the pending appointment notifications in batches over one SMTP connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=notifications.BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches; the next run carries on')
+        parser.add_argument('--reminders', action='store_true',
+                            help='Queue due reminders before each delivery run')
+        parser.add_argument('--every', type=int, default=0,
+                            help='Keep running and deliver every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            if options['reminders']:
+                self.stdout.write(f'Queued {notifications.schedule_reminders()} reminders')
+            sent = unsent = seconds = 0
+            try:
+                batches = notifications.deliver(options['batch_size'], options['max_batches'])
+                for n, (ok, held, elapsed) in enumerate(batches, 1):
+                    sent += ok
+                    unsent += held
+                    seconds += elapsed
+                    self.stdout.write(f'batch {n}: {ok} sent, {held} not sent in {elapsed * 1000:.1f} ms')
+            except OSError as exc:
+                raise CommandError(f'Cannot reach the mail relay: {exc}')
+            rate = sent / seconds if seconds else 0
+            self.stdout.write(f'Sent {sent} messages ({unsent} not sent) in {seconds * 1000:.1f} ms, '
+                              f'{rate:.0f} messages/sec')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
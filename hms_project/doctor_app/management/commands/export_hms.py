@@ -0,0 +1,37 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from doctor_app import exports
+
+
+class Command(BaseCommand):
+    help = 'Stream appointments or medical records to CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(exports.EXPORTS))
+        parser.add_argument('--format', choices=list(exports.FORMATS), default='csv')
+        parser.add_argument('--output', default='-', help='File to write (default: stdout)')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--from', dest='from', help='First date, YYYY-MM-DD')
+        parser.add_argument('--to', help='Last date, YYYY-MM-DD')
+        parser.add_argument('--doctor', help='Doctor id')
+        parser.add_argument('--specialty', help='Specialty id')
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            filters = exports.parse_filters(options)
+        except ValueError as exc:
+            raise CommandError(exc)
+        pieces = exports.stream(options['kind'], options['format'], filters,
+                                gzip=options['gzip'], chunk_size=options['chunk_size'])
+        if options['output'] == '-':
+            out = getattr(self.stdout, 'buffer', None) or sys.stdout.buffer
+            for piece in pieces:
+                out.write(piece)
+            out.flush()
+        else:
+            with open(options['output'], 'wb') as out:
+                for piece in pieces:
+                    out.write(piece)
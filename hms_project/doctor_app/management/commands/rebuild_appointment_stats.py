@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from doctor_app import stats
+
+
+class Command(BaseCommand):
+    help = 'Recount the daily appointment stats rollup from live and archived appointments'
+
+    def handle(self, *args, **options):
+        rows = stats.rebuild()
+        self.stdout.write(f'Rebuilt {rows} daily appointment counters')
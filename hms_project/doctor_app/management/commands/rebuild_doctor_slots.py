@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from doctor_app import availability
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-doctor, per-day booked slot bitmaps from BOOKED appointments'
+
+    def handle(self, *args, **options):
+        days = availability.rebuild()
+        self.stdout.write(f'Rebuilt slot bitmaps for {days} doctor days')
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from doctor_app.search import REBUILD_BATCH, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the medical record full-text index from the medical record table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        indexed = rebuild_index(options['batch_size'])
+        self.stdout.write(f'Indexed {indexed} medical records in {time.perf_counter() - started:.1f}s')
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import fields
+from doctor_app import search
+from doctor_app.models import ArchivedMedicalRecord, MedicalRecord
+
+
+class Command(BaseCommand):
+    help = ('Rewrite medical record text under the current HMS_TEXT_COMPRESSION settings, in batches; '
+            'with HMS_TEXT_COMPRESSION=off it stores everything as plain text again')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=fields.BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches of each table')
+        parser.add_argument('--vacuum', action='store_true',
+                            help='VACUUM the SQLite database afterwards so the file shrinks')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stdout.write('Medical record text is only stored compressed on SQLite; nothing to do')
+            return
+        for model in (MedicalRecord, ArchivedMedicalRecord):
+            changed = scanned = seconds = 0
+            batches = fields.recompress(model, options['batch_size'], options['max_batches'])
+            for n, (rows, seen, elapsed) in enumerate(batches, 1):
+                changed += rows
+                scanned += seen
+                seconds += elapsed
+                self.stdout.write(f'{model._meta.db_table} batch {n}: {rows} of {seen} rows rewritten '
+                                  f'in {elapsed * 1000:.1f} ms')
+            self.stdout.write(f'Rewrote {changed} of {scanned} {model._meta.verbose_name_plural} '
+                              f'({settings.HMS_TEXT_COMPRESSION}) in {seconds * 1000:.1f} ms')
+            if model is MedicalRecord and changed:
+                # The search triggers index compressed values as empty text.
+                self.stdout.write(f'Reindexed {search.rebuild_index()} medical records for search')
+        if options['vacuum']:
+            with connection.cursor() as cursor:
+                cursor.execute('VACUUM')
+            self.stdout.write('Vacuumed the database')
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from doctor_app import notifications
+
+
+class Command(BaseCommand):
+    help = 'Queue reminder emails for BOOKED appointments starting within the next few hours'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=int, default=settings.HMS_REMINDER_HOURS)
+
+    def handle(self, *args, **options):
+        queued = notifications.schedule_reminders(options['hours'])
+        self.stdout.write(f'Queued {queued} reminders for the next {options["hours"]} hours')
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from doctor_app import lifecycle
+
+
+class Command(BaseCommand):
+    help = ('Move BOOKED appointments whose slot has ended to COMPLETED when the visit has a medical record '
+            'and to NO_SHOW otherwise, in batches')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=lifecycle.BATCH_SIZE)
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches; the next run carries on')
+        parser.add_argument('--every', type=int, default=0,
+                            help='Keep running and sweep every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            completed = no_shows = seconds = 0
+            batches = lifecycle.sweep(options['batch_size'], options['max_batches'])
+            for n, (done, missed, elapsed) in enumerate(batches, 1):
+                completed += done
+                no_shows += missed
+                seconds += elapsed
+                self.stdout.write(f'batch {n}: {done + missed} rows in {elapsed * 1000:.1f} ms')
+            self.stdout.write(f'Marked {completed} appointments COMPLETED and {no_shows} NO_SHOW '
+                              f'in {seconds * 1000:.1f} ms')
+            if not options['every']:
+                return
+            time.sleep(options['every'])
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# FTS5 table over medical record text, keyed by record id. Triggers added in
+# 0011 keep it in step with the plain text the columns store; doctor_app.search
+# indexes compressed values from Python.
+FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS doctor_app_medicalrecord_search USING fts5(
+        diagnosis, treatment, tokenize='porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO doctor_app_medicalrecord_search (rowid, diagnosis, treatment)
+    SELECT id, diagnosis, treatment FROM doctor_app_medicalrecord
+    """,
+]
+
+BACKWARD = [
+    'DROP TABLE IF EXISTS doctor_app_medicalrecord_search',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_app', '0002_appointment_record_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD), run_sqlite(BACKWARD)),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_day_slots(apps, schema_editor):
+    # Off-grid legacy bookings still hold their slot through the unique
+    # constraint; they just never show up as taken grid slots.
+    Appointment = apps.get_model('doctor_app', 'Appointment')
+    DoctorDaySlots = apps.get_model('doctor_app', 'DoctorDaySlots')
+    masks = {}
+    booked = Appointment.objects.filter(status='BOOKED').values_list('doctor_id', 'date', 'time')
+    for doctor_id, day, at in booked.iterator():
+        minutes = at.hour * 60 + at.minute
+        if minutes % settings.HMS_SLOT_MINUTES == 0 and not at.second:
+            masks[doctor_id, day] = masks.get((doctor_id, day), 0) | 1 << minutes // settings.HMS_SLOT_MINUTES
+    DoctorDaySlots.objects.bulk_create(
+        [DoctorDaySlots(doctor_id=doctor_id, date=day, booked=mask) for (doctor_id, day), mask in masks.items()],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_app', '0003_medical_record_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DoctorDaySlots',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('booked', models.BigIntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='doctor_app.doctor')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('doctor', 'date'), name='day_slots_unique_doctor_date')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start', models.TimeField()),
+                ('end', models.TimeField()),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='doctor_app.doctor')),
+            ],
+            options={
+                'verbose_name_plural': 'Working hours',
+                'ordering': ['doctor', 'weekday', 'start'],
+                'constraints': [models.CheckConstraint(condition=models.Q(('start__lt', models.F('end'))), name='working_hours_start_before_end')],
+            },
+        ),
+        migrations.RunPython(fill_day_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_stats(apps, schema_editor):
+    DailyAppointmentStats = apps.get_model('doctor_app', 'DailyAppointmentStats')
+    counts = {}
+    for name in ('Appointment', 'ArchivedAppointment'):
+        grouped = apps.get_model('doctor_app', name).objects.values_list(
+            'date', 'doctor_id', 'doctor__specialty_id', 'status',
+        ).annotate(n=Count('id')).order_by()
+        for date, doctor_id, specialty_id, status, n in grouped.iterator():
+            key = (date, doctor_id, specialty_id, status)
+            counts[key] = counts.get(key, 0) + n
+    DailyAppointmentStats.objects.bulk_create(
+        [DailyAppointmentStats(date=date, doctor_id=doctor_id, specialty_id=specialty_id, status=status, count=n)
+         for (date, doctor_id, specialty_id, status), n in counts.items()],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('doctor_app', '0006_archive_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAppointmentStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('status', models.CharField(choices=[('BOOKED', 'Booked'), ('CANCELLED', 'Cancelled'), ('COMPLETED', 'Completed'), ('NO_SHOW', 'No show')], max_length=10)),
+                ('count', models.IntegerField(default=0)),
+                ('doctor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='doctor_app.doctor')),
+                ('specialty', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.specialty')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily appointment stats',
+                'constraints': [models.UniqueConstraint(fields=('date', 'doctor', 'status'), name='daily_stats_unique_doctor_status')],
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:30
+
+import core.fields
+from django.db import migrations
+
+# The columns stay TEXT, so only the model state changes; an AlterField would
+# make SQLite copy both record tables. Existing rows are compressed by the
+# recompress_records command.
+FIELDS = [
+    (model_name, name)
+    for model_name in ('archivedmedicalrecord', 'medicalrecord')
+    for name in ('diagnosis', 'treatment')
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_app', '0008_date_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(model_name=model_name, name=name, field=core.fields.CompressedTextField())
+                for model_name, name in FIELDS
+            ],
+        ),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+# Triggers keep the record search table in step with every write, including
+# bulk_create, raw SQL, dbshell and the importers, as they do for patient
+# search. They index the text the columns store and need nothing beyond
+# SQLite itself. A compressed value (a BLOB, only ever written by Django with
+# HMS_TEXT_COMPRESSION on) is indexed as empty text here; doctor_app.signals
+# reindexes saved records from their model values, and bulk writes of
+# compressed text are followed by doctor_app.search.rebuild_index.
+PLAIN = "CASE typeof({0}) WHEN 'text' THEN {0} ELSE '' END"
+INDEX_NEW = f"""
+        INSERT INTO doctor_app_medicalrecord_search (rowid, diagnosis, treatment)
+        VALUES (new.id, {PLAIN.format('new.diagnosis')}, {PLAIN.format('new.treatment')});
+"""
+
+FORWARD = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS record_search_insert AFTER INSERT ON doctor_app_medicalrecord BEGIN
+        {INDEX_NEW}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS record_search_update
+    AFTER UPDATE OF id, diagnosis, treatment ON doctor_app_medicalrecord BEGIN
+        DELETE FROM doctor_app_medicalrecord_search WHERE rowid = old.id;
+        {INDEX_NEW}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS record_search_delete AFTER DELETE ON doctor_app_medicalrecord BEGIN
+        DELETE FROM doctor_app_medicalrecord_search WHERE rowid = old.id;
+    END
+    """,
+]
+
+BACKWARD = [
+    'DROP TRIGGER IF EXISTS record_search_delete',
+    'DROP TRIGGER IF EXISTS record_search_update',
+    'DROP TRIGGER IF EXISTS record_search_insert',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+def reindex(apps, schema_editor):
+    # Rows bulk loaded while signals kept the index may be missing from it;
+    # the model's field reads compressed values back as text.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    MedicalRecord = apps.get_model('doctor_app', 'MedicalRecord')
+    rows = MedicalRecord.objects.order_by('id').values_list('id', 'diagnosis', 'treatment')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute('DELETE FROM doctor_app_medicalrecord_search')
+        cursor.executemany(
+            'INSERT INTO doctor_app_medicalrecord_search (rowid, diagnosis, treatment) VALUES (%s, %s, %s)',
+            rows.iterator(chunk_size=2000),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('doctor_app', '0010_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD), run_sqlite(BACKWARD)),
+        migrations.RunPython(reindex, migrations.RunPython.noop),
+    ]
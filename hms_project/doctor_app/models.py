@@ -1,6 +1,8 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 from core.models import Specialty
+from core.fields import CompressedTextField
 
 class Doctor(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
@@ -15,6 +17,7 @@ class Appointment(models.Model):
         ('BOOKED', 'Booked'),
         ('CANCELLED', 'Cancelled'),
         ('COMPLETED', 'Completed'),
+        ('NO_SHOW', 'No show'),
     ]
     
     patient = models.ForeignKey('patient_app.Patient', on_delete=models.CASCADE)
@@ -25,13 +28,161 @@ class Appointment(models.Model):
     
     def __str__(self):
         return f"{self.patient} - {self.doctor} on {self.date}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date', 'time'], name='appt_doctor_date_time_idx'),
+            models.Index(fields=['patient', 'date'], name='appt_patient_date_idx'),
+            models.Index(fields=['status', 'date'], name='appt_status_date_idx'),
+            models.Index(fields=['date'], name='appt_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['doctor', 'date', 'time'],
+                condition=models.Q(status='BOOKED'),
+                name='appt_unique_active_slot',
+            ),
+        ]
 
 class MedicalRecord(models.Model):
     patient = models.ForeignKey('patient_app.Patient', on_delete=models.CASCADE)
     doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
-    diagnosis = models.TextField()
-    treatment = models.TextField()
+    diagnosis = CompressedTextField()
+    treatment = CompressedTextField()
     date = models.DateField(auto_now_add=True)
     
     def __str__(self):
-        return f"{self.patient} - {self.date}"
\ No newline at end of file
+        return f"{self.patient} - {self.date}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'date'], name='record_patient_date_idx'),
+            models.Index(fields=['date'], name='record_date_idx'),
+        ]
+
+class WorkingHours(models.Model):
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE, related_name='working_hours')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start = models.TimeField()
+    end = models.TimeField()
+
+    def __str__(self):
+        return f"{self.doctor} {self.get_weekday_display()} {self.start:%H:%M}-{self.end:%H:%M}"
+
+    class Meta:
+        verbose_name_plural = "Working hours"
+        ordering = ['doctor', 'weekday', 'start']
+        constraints = [
+            models.CheckConstraint(condition=models.Q(start__lt=models.F('end')), name='working_hours_start_before_end'),
+        ]
+
+
+class DoctorDaySlots(models.Model):
+    """Bitmap of a doctor's booked slots on one day (bit i: slot i, see slots.py)."""
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    date = models.DateField()
+    booked = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['doctor', 'date'], name='day_slots_unique_doctor_date'),
+        ]
+
+
+class DailyAppointmentStats(models.Model):
+    """Appointments per doctor, day and status, kept in step by stats.py for analytics."""
+    date = models.DateField()
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    specialty = models.ForeignKey(Specialty, on_delete=models.CASCADE)
+    status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily appointment stats"
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'doctor', 'status'], name='daily_stats_unique_doctor_status'),
+        ]
+
+
+class ArchivedAppointment(models.Model):
+    """Appointment moved out of the hot table by archive.py, under its original id."""
+    id = models.IntegerField(primary_key=True)
+    patient = models.ForeignKey('patient_app.Patient', on_delete=models.CASCADE)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    date = models.DateField()
+    time = models.TimeField()
+    status = models.CharField(max_length=10, choices=Appointment.STATUS_CHOICES)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['doctor', 'date', 'time'], name='archived_appt_doctor_date_idx'),
+            models.Index(fields=['patient', 'date'], name='archived_appt_patient_date_idx'),
+        ]
+
+
+class ArchivedMedicalRecord(models.Model):
+    """MedicalRecord moved out of the hot table by archive.py, under its original id."""
+    id = models.IntegerField(primary_key=True)
+    patient = models.ForeignKey('patient_app.Patient', on_delete=models.CASCADE)
+    doctor = models.ForeignKey(Doctor, on_delete=models.CASCADE)
+    diagnosis = CompressedTextField()
+    treatment = CompressedTextField()
+    date = models.DateField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['patient', 'date'], name='archived_record_patient_idx'),
+        ]
+
+
+class OutboxMessage(models.Model):
+    """An appointment notification waiting for notifications.py to email it.
+
+    Written in the same transaction as the booking change it reports, and
+    keyed by plain ids so it outlives archived appointments.
+    """
+    KIND_CHOICES = [
+        ('BOOKED', 'Booked'),
+        ('CANCELLED', 'Cancelled'),
+        ('REMINDER', 'Reminder'),
+    ]
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENT', 'Sent'),
+        ('SKIPPED', 'Skipped'),
+        ('FAILED', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    appointment_id = models.IntegerField()
+    patient_id = models.IntegerField()
+    doctor_id = models.IntegerField()
+    date = models.DateField()
+    time = models.TimeField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_due_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['appointment_id'], condition=models.Q(kind='REMINDER'),
+                                    name='outbox_one_reminder'),
+        ]
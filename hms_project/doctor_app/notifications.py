@@ -0,0 +1,184 @@
+import smtplib
+import time as clock
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import refdata
+from patient_app.models import Patient
+from .models import Appointment, OutboxMessage
+
+BATCH_SIZE = 100
+MAX_ATTEMPTS = 5
+RETRY_SECONDS = 60
+# A claimed message is retried after this long if its worker never reports back.
+LEASE_SECONDS = 300
+
+SUBJECTS = {
+    'BOOKED': 'Your appointment is booked',
+    'CANCELLED': 'Your appointment was cancelled',
+    'REMINDER': 'Reminder: your upcoming appointment',
+}
+BODIES = {
+    'BOOKED': 'Dear {name},\n\nYour appointment with {doctor} on {date:%A %d %B %Y} at {time:%H:%M} is booked.\n',
+    'CANCELLED': 'Dear {name},\n\nYour appointment with {doctor} on {date:%A %d %B %Y} at {time:%H:%M} '
+                 'has been cancelled.\n',
+    'REMINDER': 'Dear {name},\n\nThis is a reminder of your appointment with {doctor} '
+                'on {date:%A %d %B %Y} at {time:%H:%M}.\n',
+}
+
+
+def queue(kind, appointment_id, patient_id, doctor_id, day, at):
+    """Add a message to the outbox, inside the caller's transaction."""
+    return OutboxMessage.objects.create(kind=kind, appointment_id=appointment_id, patient_id=patient_id,
+                                        doctor_id=doctor_id, date=day, time=at)
+
+
+def status_changed(appointment_id, patient_id, doctor_id, day, at, old, new):
+    """Queue the message, if any, for an appointment moving from status ``old`` (None when new) to ``new``."""
+    if new == 'BOOKED' and old != 'BOOKED':
+        queue('BOOKED', appointment_id, patient_id, doctor_id, day, at)
+    elif old == 'BOOKED' and new == 'CANCELLED':
+        queue('CANCELLED', appointment_id, patient_id, doctor_id, day, at)
+
+
+def due_soon(hours=None, now=None):
+    """BOOKED appointments starting within ``hours``, read through the (status, date) index."""
+    now = timezone.localtime(now)
+    end = now + timedelta(hours=settings.HMS_REMINDER_HOURS if hours is None else hours)
+    return Appointment.objects.filter(status='BOOKED', date__gte=now.date(), date__lte=end.date()).exclude(
+        date=now.date(), time__lte=now.time(),
+    ).exclude(
+        date=end.date(), time__gt=end.time(),
+    )
+
+
+def schedule_reminders(hours=None, now=None, batch_size=BATCH_SIZE * 10):
+    """Queue one reminder per appointment due within ``hours``; returns how many were queued.
+
+    Appointments already reminded are left out by the same query, and the
+    partial unique constraint keeps concurrent runs from doubling up.
+    """
+    reminded = OutboxMessage.objects.filter(kind='REMINDER').values('appointment_id')
+    due = due_soon(hours, now).exclude(id__in=reminded).values_list('id', 'patient_id', 'doctor_id', 'date', 'time')
+    queued, batch = 0, []
+    for row in due.iterator(chunk_size=batch_size):
+        batch.append(OutboxMessage(kind='REMINDER', appointment_id=row[0], patient_id=row[1], doctor_id=row[2],
+                                   date=row[3], time=row[4]))
+        if len(batch) == batch_size:
+            OutboxMessage.objects.bulk_create(batch, ignore_conflicts=True)
+            queued, batch = queued + len(batch), []
+    OutboxMessage.objects.bulk_create(batch, ignore_conflicts=True)
+    return queued + len(batch)
+
+
+def _claim(batch_size, now):
+    with transaction.atomic():
+        rows = list(OutboxMessage.objects.filter(status='PENDING', available_at__lte=now)
+                    .order_by('available_at', 'id').select_for_update(skip_locked=True)
+                    .values('id', 'kind', 'appointment_id', 'patient_id', 'doctor_id', 'date', 'time', 'attempts')
+                    [:batch_size])
+        OutboxMessage.objects.filter(id__in=[row['id'] for row in rows]).update(
+            available_at=now + timedelta(seconds=LEASE_SECONDS), attempts=F('attempts') + 1,
+        )
+    return rows
+
+
+def _compose(rows):
+    """{message id: EmailMessage}, leaving out messages with nobody to send to or nothing left to remind of."""
+    patients = Patient.objects.filter(id__in={row['patient_id'] for row in rows})
+    recipients = {pk: (email, name) for pk, email, name in patients.values_list('id', 'user__email', 'user__first_name')}
+    reminders = [row['appointment_id'] for row in rows if row['kind'] == 'REMINDER']
+    booked = set(Appointment.objects.filter(id__in=reminders, status='BOOKED').values_list('id', flat=True)
+                 if reminders else ())
+    doctors = refdata.cached('doctors', refdata.doctor_directory)
+    messages = {}
+    for row in rows:
+        email, name = recipients.get(row['patient_id'], (None, None))
+        if not email or (row['kind'] == 'REMINDER' and row['appointment_id'] not in booked):
+            continue
+        body = BODIES[row['kind']].format(name=name, doctor=doctors.get(row['doctor_id'], 'your doctor'),
+                                          date=row['date'], time=row['time'])
+        messages[row['id']] = EmailMessage(SUBJECTS[row['kind']], body, to=[email])
+    return messages
+
+
+def _permanent(exc):
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+def _send(mail, rows, messages):
+    """Send over the open ``mail`` connection; returns ({message id: outcome}, connection still usable)."""
+    outcomes = {}
+    for position, row in enumerate(rows):
+        message = messages.get(row['id'])
+        if message is None:
+            outcomes[row['id']] = ('SKIPPED', '')
+            continue
+        try:
+            mail.send_messages([message])
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPResponseException) as exc:
+            outcomes[row['id']] = ('FAILED' if _permanent(exc) else 'RETRY', str(exc))
+        except OSError as exc:
+            # The relay went away: this and every later message wait for the next run.
+            for later in rows[position:]:
+                outcomes[later['id']] = ('RETRY', str(exc))
+            return outcomes, False
+        else:
+            outcomes[row['id']] = ('SENT', '')
+    return outcomes, True
+
+
+def _record(rows, outcomes, now):
+    done = {'SENT': [], 'SKIPPED': []}
+    with transaction.atomic():
+        for row in rows:
+            outcome, error = outcomes[row['id']]
+            if outcome in done:
+                done[outcome].append(row['id'])
+                continue
+            attempts = row['attempts'] + 1
+            if outcome == 'RETRY' and attempts < MAX_ATTEMPTS:
+                retry_at = now + timedelta(seconds=RETRY_SECONDS * 2 ** (attempts - 1))
+                OutboxMessage.objects.filter(id=row['id']).update(available_at=retry_at, last_error=error)
+            else:
+                OutboxMessage.objects.filter(id=row['id']).update(status='FAILED', last_error=error)
+        OutboxMessage.objects.filter(id__in=done['SENT']).update(status='SENT', sent_at=now, last_error='')
+        OutboxMessage.objects.filter(id__in=done['SKIPPED']).update(status='SKIPPED')
+
+
+def deliver(batch_size=BATCH_SIZE, max_batches=None, now=None):
+    """Email due outbox messages over one SMTP connection, yielding (sent, unsent, seconds) per batch.
+
+    Each batch is claimed with a lease, composed with one patient query, sent
+    and recorded. Temporary failures are retried with exponential backoff up
+    to MAX_ATTEMPTS; permanent ones (5xx) fail at once. If the relay drops
+    the connection the run stops and the rest waits for the next one.
+    Finished messages for days already past are cleared at the end.
+    """
+    mail = get_connection()
+    mail.open()
+    try:
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            started = clock.perf_counter()
+            current = now or timezone.now()
+            rows = _claim(batch_size, current)
+            if not rows:
+                break
+            outcomes, usable = _send(mail, rows, _compose(rows))
+            _record(rows, outcomes, current)
+            batches += 1
+            sent = sum(outcome == 'SENT' for outcome, _ in outcomes.values())
+            yield sent, len(rows) - sent, clock.perf_counter() - started
+            if not usable:
+                return
+    finally:
+        mail.close()
+    OutboxMessage.objects.exclude(status='PENDING').filter(date__lt=timezone.localdate(now)).delete()
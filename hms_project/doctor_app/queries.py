@@ -0,0 +1,70 @@
+from django.db.models import BooleanField, F, Value
+
+from core.pagination import DEFAULT_PAGE_SIZE, keyset_page, merged_page
+from .models import Doctor, Appointment, MedicalRecord, ArchivedAppointment, ArchivedMedicalRecord
+
+
+def doctor_list(after=None, size=DEFAULT_PAGE_SIZE):
+    rows = Doctor.objects.values(
+        'id', 'contact',
+        first_name=F('user__first_name'),
+        last_name=F('user__last_name'),
+        specialty_name=F('specialty__name'),
+    )
+    return keyset_page(rows, ['id'], after, size)
+
+
+def _appointment_rows(model, doctor_id, patient_id):
+    rows = model.objects.values(
+        'id', 'date', 'time', 'status',
+        patient_first_name=F('patient__user__first_name'),
+        patient_last_name=F('patient__user__last_name'),
+        doctor_first_name=F('doctor__user__first_name'),
+        doctor_last_name=F('doctor__user__last_name'),
+    )
+    if doctor_id is not None:
+        rows = rows.filter(doctor_id=doctor_id)
+    if patient_id is not None:
+        rows = rows.filter(patient_id=patient_id)
+    return rows
+
+
+def appointment_list(doctor_id=None, patient_id=None, after=None, size=DEFAULT_PAGE_SIZE, include_archive=False):
+    """Keyset page of appointments in date and time order; ``include_archive`` merges in the archived ones.
+
+    The hospital-wide list walks appt_date_idx and only sorts within a day.
+    """
+    keys = ['date', 'time', 'id']
+    rows = _appointment_rows(Appointment, doctor_id, patient_id)
+    if include_archive:
+        return merged_page([rows, _appointment_rows(ArchivedAppointment, doctor_id, patient_id)], keys, after, size)
+    return keyset_page(rows, keys, after, size)
+
+
+def _timeline_rows(model, patient_id, archived):
+    return model.objects.filter(patient_id=patient_id).values(
+        'id', 'date',
+        doctor_first_name=F('doctor__user__first_name'),
+        doctor_last_name=F('doctor__user__last_name'),
+        specialty_name=F('doctor__specialty__name'),
+        archived=Value(archived, output_field=BooleanField()),
+    )
+
+
+def record_timeline(patient_id, after=None, size=DEFAULT_PAGE_SIZE, include_archive=False):
+    """Newest-first page of record headers, without the diagnosis and treatment text.
+
+    Bodies are fetched one record at a time with ``record_body`` when the
+    reader opens one.
+    """
+    keys = ['-date', '-id']
+    rows = _timeline_rows(MedicalRecord, patient_id, False)
+    if include_archive:
+        return merged_page([rows, _timeline_rows(ArchivedMedicalRecord, patient_id, True)], keys, after, size)
+    return keyset_page(rows, keys, after, size)
+
+
+def record_body(patient_id, record_id, archived=False):
+    """{'diagnosis', 'treatment'} of one of the patient's records, or None."""
+    model = ArchivedMedicalRecord if archived else MedicalRecord
+    return model.objects.filter(id=record_id, patient_id=patient_id).values('diagnosis', 'treatment').first()
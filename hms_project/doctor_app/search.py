@@ -0,0 +1,148 @@
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from .models import MedicalRecord
+
+DEFAULT_LIMIT = 20
+SEARCH_TABLE = 'doctor_app_medicalrecord_search'
+# Diagnosis hits weigh twice as much as treatment hits in the BM25 score.
+WEIGHTS = (2.0, 1.0)
+SNIPPET_TOKENS = 12
+REBUILD_BATCH = 2000
+
+
+def _uses_index():
+    return connection.vendor == 'sqlite'
+
+
+def _match_expression(words):
+    # Quote each word so input is never FTS5 syntax, and prefix-match it so
+    # "diabet" finds "diabetes" and "diabetic".
+    return ' '.join('"%s"*' % word.replace('"', '""') for word in words)
+
+
+def index_record(record):
+    """Index ``record`` from its model values.
+
+    The triggers index the text the columns store, which is empty for a
+    compressed value, so saves made while compression is on land here too.
+    """
+    if not _uses_index():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [record.pk])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, diagnosis, treatment) VALUES (%s, %s, %s)',
+            [record.pk, record.diagnosis, record.treatment],
+        )
+
+
+def _ranked_hits(words, limit, doctor_id, patient_id, highlight):
+    start, end = highlight
+    sql = [
+        f'SELECT {SEARCH_TABLE}.rowid, bm25({SEARCH_TABLE}, %s, %s) AS score,',
+        f'snippet({SEARCH_TABLE}, 0, %s, %s, %s, %s),',
+        f'snippet({SEARCH_TABLE}, 1, %s, %s, %s, %s)',
+        f'FROM {SEARCH_TABLE}',
+    ]
+    params = [*WEIGHTS, start, end, '…', SNIPPET_TOKENS, start, end, '…', SNIPPET_TOKENS]
+    if doctor_id is not None or patient_id is not None:
+        sql.append(f'JOIN doctor_app_medicalrecord r ON r.id = {SEARCH_TABLE}.rowid')
+    sql.append(f'WHERE {SEARCH_TABLE} MATCH %s')
+    params.append(_match_expression(words))
+    if doctor_id is not None:
+        sql.append('AND r.doctor_id = %s')
+        params.append(doctor_id)
+    if patient_id is not None:
+        sql.append('AND r.patient_id = %s')
+        params.append(patient_id)
+    sql.append('ORDER BY score LIMIT %s')
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        return [
+            {'id': pk, 'score': -score, 'diagnosis_snippet': diagnosis, 'treatment_snippet': treatment}
+            for pk, score, diagnosis, treatment in cursor.fetchall()
+        ]
+
+
+def _containing(records, words):
+    for word in words:
+        records = records.filter(Q(diagnosis__icontains=word) | Q(treatment__icontains=word))
+    return records
+
+
+def _unranked_hits(words, limit, doctor_id, patient_id):
+    records = _containing(MedicalRecord.objects.all(), words)
+    if doctor_id is not None:
+        records = records.filter(doctor_id=doctor_id)
+    if patient_id is not None:
+        records = records.filter(patient_id=patient_id)
+    rows = records.order_by('-date', '-id').values_list('id', 'diagnosis', 'treatment')[:limit]
+    return [
+        {'id': pk, 'score': None, 'diagnosis_snippet': diagnosis[:120], 'treatment_snippet': treatment[:120]}
+        for pk, diagnosis, treatment in rows
+    ]
+
+
+def search_records(term, limit=DEFAULT_LIMIT, doctor_id=None, patient_id=None, highlight=('[', ']')):
+    """Best matching records for ``term``, ranked by BM25 with highlighted snippets.
+
+    Each hit carries the record id, date, patient and doctor names, its score
+    and one snippet per text field.
+    """
+    words = term.split()
+    if not words:
+        return []
+    if _uses_index():
+        hits = _ranked_hits(words, limit, doctor_id, patient_id, highlight)
+    else:
+        hits = _unranked_hits(words, limit, doctor_id, patient_id)
+    headers = MedicalRecord.objects.filter(id__in=[hit['id'] for hit in hits]).values(
+        'id', 'date', 'patient_id', 'doctor_id',
+        patient_first_name=F('patient__user__first_name'),
+        patient_last_name=F('patient__user__last_name'),
+        doctor_first_name=F('doctor__user__first_name'),
+        doctor_last_name=F('doctor__user__last_name'),
+    )
+    by_id = {row['id']: row for row in headers}
+    return [{**by_id[hit['id']], **hit} for hit in hits if hit['id'] in by_id]
+
+
+def filter_records(records, term):
+    """``records`` narrowed to those matching every word of ``term``, unranked and uncapped.
+
+    For paged lists: the match is a subquery of the caller's own query, so
+    its scope and ordering apply to every match rather than to a top few.
+    """
+    words = term.split()
+    if not words:
+        return records
+    if not _uses_index():
+        return _containing(records, words)
+    matches = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+    return records.filter(id__in=RawSQL(matches, [_match_expression(words)]))
+
+
+def rebuild_index(batch_size=REBUILD_BATCH):
+    """Reindex every medical record, streaming the table in batches.
+
+    Triggers keep plain text in step with every write; run this after bulk
+    writes of compressed text (bulk_create, recompress_records) and for
+    repairs.
+    """
+    if not _uses_index():
+        return 0
+    insert = f'INSERT INTO {SEARCH_TABLE} (rowid, diagnosis, treatment) VALUES (%s, %s, %s)'
+    rows = MedicalRecord.objects.order_by('id').values_list('id', 'diagnosis', 'treatment')
+    indexed, batch = 0, []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) == batch_size:
+                cursor.executemany(insert, batch)
+                indexed, batch = indexed + len(batch), []
+        cursor.executemany(insert, batch)
+    return indexed + len(batch)
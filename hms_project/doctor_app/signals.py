@@ -0,0 +1,67 @@
+from django.conf import settings
+from django.db.models.signals import post_init, pre_save, post_save, post_delete
+
+from . import availability, notifications, search, stats
+
+
+def record_saved(sender, instance, raw=False, **kwargs):
+    # The search triggers cannot read compressed text; give them the model's.
+    if not raw and settings.HMS_TEXT_COMPRESSION != 'off':
+        search.index_record(instance)
+
+
+SLOT_FIELDS = ('doctor_id', 'date', 'time', 'status')
+
+
+def _slot(instance):
+    # Read from __dict__ so deferred loads don't trigger a query per row.
+    return tuple(instance.__dict__.get(name) for name in SLOT_FIELDS)
+
+
+def _fill(slot, other):
+    # None marks a deferred field; none of the slot columns is nullable.
+    return tuple(other if value is None else value for value, other in zip(slot, other))
+
+
+def remember_slot(sender, instance, **kwargs):
+    instance._loaded_slot = _slot(instance)
+
+
+def load_deferred_slot(sender, instance, raw=False, **kwargs):
+    # A deferred slot field is unknown, not empty: read what the row holds
+    # before it is overwritten, so the old slot and status are released.
+    if raw or instance._state.adding or None not in instance._loaded_slot:
+        return
+    stored = sender._base_manager.filter(pk=instance.pk).values_list(*SLOT_FIELDS).first()
+    if stored:
+        instance._loaded_slot = _fill(instance._loaded_slot, stored)
+
+
+def appointment_slot_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._loaded_slot
+    # Fields still deferred were not written, so they keep their old value.
+    new = _fill(_slot(instance), old) if old else _slot(instance)
+    if old != new:
+        if old and old[3] == 'BOOKED' and None not in old:
+            availability.mark_free(*old[:3])
+        if new[3] == 'BOOKED':
+            availability.mark_booked(*new[:3])
+        stats.changed(old and (old[0], old[1], old[3]), (new[0], new[1], new[3]))
+        notifications.status_changed(instance.pk, instance.patient_id, *new[:3], old and old[3], new[3])
+    instance._loaded_slot = new
+
+
+def appointment_slot_deleted(sender, instance, **kwargs):
+    if instance.status == 'BOOKED':
+        availability.mark_free(instance.doctor_id, instance.date, instance.time)
+    stats.changed((instance.doctor_id, instance.date, instance.status), None)
+
+
+def connect():
+    post_save.connect(record_saved, sender='doctor_app.MedicalRecord', dispatch_uid='record_search_saved')
+    post_init.connect(remember_slot, sender='doctor_app.Appointment', dispatch_uid='day_slots_init')
+    pre_save.connect(load_deferred_slot, sender='doctor_app.Appointment', dispatch_uid='day_slots_pre_save')
+    post_save.connect(appointment_slot_saved, sender='doctor_app.Appointment', dispatch_uid='day_slots_saved')
+    post_delete.connect(appointment_slot_deleted, sender='doctor_app.Appointment', dispatch_uid='day_slots_deleted')
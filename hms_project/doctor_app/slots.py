@@ -0,0 +1,50 @@
+from datetime import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Availability is kept as one integer per doctor and day, bit i standing for
+# the slot that starts i * HMS_SLOT_MINUTES after midnight. Masks are stored
+# in signed 64-bit columns, so a day may have at most 63 slots.
+MAX_SLOTS = 63
+
+
+def slots_per_day():
+    count = 24 * 60 // settings.HMS_SLOT_MINUTES
+    if count > MAX_SLOTS:
+        raise ImproperlyConfigured(f'HMS_SLOT_MINUTES must give at most {MAX_SLOTS} slots a day')
+    return count
+
+
+def slot_index(value):
+    """Bit number of the slot starting at ``value``; ValueError if no slot starts then."""
+    minutes = value.hour * 60 + value.minute
+    if value.second or value.microsecond or minutes % settings.HMS_SLOT_MINUTES:
+        raise ValueError(f'{value:%H:%M} is not the start of a bookable slot')
+    return minutes // settings.HMS_SLOT_MINUTES
+
+
+def slot_time(index):
+    minutes = index * settings.HMS_SLOT_MINUTES
+    return time(minutes // 60, minutes % 60)
+
+
+def slot_mask(start, end):
+    """Bits of the whole slots that fit between ``start`` and ``end``."""
+    first = -(-(start.hour * 60 + start.minute) // settings.HMS_SLOT_MINUTES)
+    last = (end.hour * 60 + end.minute) // settings.HMS_SLOT_MINUTES
+    return sum(1 << i for i in range(first, min(last, slots_per_day())))
+
+
+def mask_times(mask):
+    return [slot_time(i) for i in range(slots_per_day()) if mask >> i & 1]
+
+
+def default_mask():
+    """Working day for doctors without their own hours, from HMS_WORKING_HOURS."""
+    return slot_mask(*settings.HMS_WORKING_HOURS)
+
+
+def day_slots():
+    """Start times of the bookable slots in a default working day."""
+    return mask_times(default_mask())
@@ -0,0 +1,81 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from core import routing
+from .models import Appointment, ArchivedAppointment, DailyAppointmentStats, Doctor
+
+
+def bump(doctor_id, day, status, delta):
+    """Add ``delta`` to one doctor-day-status counter.
+
+    The first write for a doctor-day creates a zero counter for every
+    status, so later status changes that day are plain UPDATEs.
+    """
+    if not delta:
+        return
+    counter = DailyAppointmentStats.objects.filter(date=day, doctor_id=doctor_id, status=status)
+    if counter.update(count=F('count') + delta) or delta < 0:
+        return
+    specialty_id = Doctor.objects.filter(id=doctor_id).values_list('specialty_id', flat=True).first()
+    DailyAppointmentStats.objects.bulk_create(
+        [DailyAppointmentStats(date=day, doctor_id=doctor_id, specialty_id=specialty_id, status=choice)
+         for choice, _ in Appointment.STATUS_CHOICES],
+        ignore_conflicts=True,  # or created concurrently
+    )
+    counter.update(count=F('count') + delta)
+
+
+def moved(doctor_id, day, old, new, n=1):
+    """``n`` appointments of one doctor-day went from status ``old`` to ``new``."""
+    if old != new:
+        bump(doctor_id, day, old, -n)
+        bump(doctor_id, day, new, n)
+
+
+def changed(old, new):
+    """Follow one appointment from ``old`` to ``new`` (doctor_id, date, status), either may be None."""
+    old = old if old and None not in old else None
+    new = new if new and None not in new else None
+    if old != new:
+        if old:
+            bump(*old, -1)
+        if new:
+            bump(*new, 1)
+
+
+@routing.primary()
+def rebuild():
+    """Recount every counter from live and archived appointments, e.g. after bulk loads."""
+    counts = Counter()
+    for model in (Appointment, ArchivedAppointment):
+        grouped = model.objects.values_list('date', 'doctor_id', 'doctor__specialty_id', 'status').annotate(n=Count('id'))
+        for date, doctor_id, specialty_id, status, n in grouped.order_by().iterator():
+            counts[date, doctor_id, specialty_id, status] += n
+    with transaction.atomic():
+        DailyAppointmentStats.objects.all().delete()
+        DailyAppointmentStats.objects.bulk_create(
+            [DailyAppointmentStats(date=date, doctor_id=doctor_id, specialty_id=specialty_id, status=status, count=n)
+             for (date, doctor_id, specialty_id, status), n in counts.items()],
+            batch_size=2000,
+        )
+    return len(counts)
+
+
+def _between(start, end):
+    return DailyAppointmentStats.objects.filter(date__gte=start, date__lte=end, count__gt=0).order_by()
+
+
+def per_day(start, end):
+    """[{'date', 'status', 'n'}] across all doctors, from the rollup only."""
+    return list(_between(start, end).values('date', 'status').annotate(n=Sum('count')).order_by('date'))
+
+
+def per_specialty(start, end):
+    return list(_between(start, end).values('specialty_id', 'status').annotate(n=Sum('count')))
+
+
+def per_doctor(start, end, limit=10):
+    """Busiest doctors by appointments of any status, as [{'doctor_id', 'n'}]."""
+    return list(_between(start, end).values('doctor_id').annotate(n=Sum('count')).order_by('-n')[:limit])
@@ -1,3 +1,1122 @@
-from django.test import TestCase
+from unittest import skipUnless
+from importlib.util import find_spec
+from io import StringIO
+import csv
+import gzip
+import json
+import os
+import tempfile
+import threading
+from django.core import mail
+from django.core.management import call_command
+from django.db import connection, connections, IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth.models import User
+from core.models import Specialty
+from patient_app.models import Patient
+from doctor_app.models import Doctor, Appointment, MedicalRecord
+from doctor_app.queries import doctor_list, appointment_list, record_body, record_timeline
+from doctor_app.search import search_records, rebuild_index
+from doctor_app import exports
+from doctor_app.booking import BookingError, SlotUnavailable, book_appointment, cancel_appointment
+from doctor_app import archive, availability, lifecycle, notifications, stats
+from doctor_app.models import ArchivedAppointment, ArchivedMedicalRecord, DailyAppointmentStats, DoctorDaySlots, WorkingHours
+from doctor_app.models import OutboxMessage
+from unittest import mock
+from datetime import datetime, timezone as dt_timezone
+from core import fields, metrics
+from core.mailsink import MailSink
+from core.changelists import EstimatedCountPaginator, estimated_count
+from django.test.utils import CaptureQueriesContext
+from datetime import date, time, timedelta
 
-# Create your tests here.
+
+def make_patient(username, first_name='Pat', last_name='Ient'):
+    user = User.objects.create_user(username=username, first_name=first_name, last_name=last_name)
+    return Patient.objects.create(
+        user=user,
+        age=40,
+        gender='F',
+        contact='1231231234',
+        address='1 Test Road',
+        date_of_birth=date(1984, 3, 3)
+    )
+
+
+def make_doctor(username, specialty, first_name='Doc', last_name='Tor'):
+    user = User.objects.create_user(username=username, first_name=first_name, last_name=last_name)
+    return Doctor.objects.create(user=user, specialty=specialty, contact='5555555555')
+
+
+class ListQueryTests(TestCase):
+
+    def setUp(self):
+        self.specialty = Specialty.objects.create(name='Neurology')
+        self.doctor = make_doctor('doc', self.specialty, 'Gregory', 'House')
+        self.other_doctor = make_doctor('doc2', self.specialty)
+        self.patients = [make_patient(f'pat{i}', last_name=f'Number{i}') for i in range(5)]
+        for i, patient in enumerate(self.patients):
+            for day in range(1, 4):
+                Appointment.objects.create(
+                    patient=patient,
+                    doctor=self.doctor if day != 2 else self.other_doctor,
+                    date=date(2024, 3, day),
+                    time=time(9 + i, 0)
+                )
+
+    def walk(self, fetch, size):
+        rows, cursor, pages = [], None, 0
+        while True:
+            page = fetch(after=cursor, size=size)
+            rows.extend(page.rows)
+            pages += 1
+            if not page.has_next:
+                return rows, pages
+            cursor = page.next_cursor
+
+    def test_appointment_page_is_one_query(self):
+        """Test appointment rows carry names without per-row lookups"""
+        with self.assertNumQueries(1):
+            page = appointment_list(size=100)
+            names = [f"{a['patient_first_name']} {a['doctor_last_name']}" for a in page.rows]
+        self.assertEqual(len(names), 15)
+
+    def test_hospital_wide_list_pages_by_date(self):
+        """Test the unfiltered list walks every appointment in date/time order"""
+        rows, pages = self.walk(appointment_list, size=4)
+        self.assertEqual((len(rows), pages), (15, 4))
+        keys = [(r['date'], r['time'], r['id']) for r in rows]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_doctor_appointments_keyset_walk(self):
+        """Test keyset pages cover a doctor's schedule in date/time order"""
+        rows, pages = self.walk(lambda **p: appointment_list(doctor_id=self.doctor.id, **p), size=4)
+        self.assertEqual(pages, 3)
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(len({r['id'] for r in rows}), 10)
+        keys = [(r['date'], r['time']) for r in rows]
+        self.assertEqual(keys, sorted(keys))
+
+    def test_patient_appointments(self):
+        """Test patient filter only returns that patient's rows"""
+        rows, _ = self.walk(lambda **p: appointment_list(patient_id=self.patients[0].id, **p), size=2)
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(r['patient_last_name'] == 'Number0' for r in rows))
+
+    def test_doctor_list(self):
+        """Test doctor rows include specialty in a single query"""
+        with self.assertNumQueries(1):
+            page = doctor_list()
+        self.assertEqual([r['specialty_name'] for r in page.rows], ['Neurology', 'Neurology'])
+        self.assertEqual(page.rows[0]['last_name'], 'House')
+
+    def test_record_timeline_newest_first(self):
+        """Test medical records page newest first"""
+        patient = self.patients[0]
+        records = [MedicalRecord.objects.create(patient=patient, doctor=self.doctor, diagnosis=diagnosis, treatment='Rest')
+                   for diagnosis in ['Flu', 'Cold', 'Sprain']]
+        rows, pages = self.walk(lambda **p: record_timeline(patient.id, **p), size=2)
+        self.assertEqual(pages, 2)
+        self.assertEqual([r['id'] for r in rows], [r.id for r in reversed(records)])
+
+    def test_record_timeline_defers_bodies(self):
+        """Test the timeline reads headers in one query and bodies only on request"""
+        patient = self.patients[0]
+        record = MedicalRecord.objects.create(patient=patient, doctor=self.doctor, diagnosis='Flu', treatment='Rest')
+        with self.assertNumQueries(1):
+            page = record_timeline(patient.id)
+        self.assertEqual(page.rows, [{'id': record.id, 'date': record.date, 'doctor_first_name': 'Gregory',
+                                      'doctor_last_name': 'House', 'specialty_name': 'Neurology', 'archived': False}])
+        self.assertEqual(record_body(patient.id, record.id), {'diagnosis': 'Flu', 'treatment': 'Rest'})
+        self.assertIsNone(record_body(self.patients[1].id, record.id))
+
+
+def query_plan(queryset, label='plan'):
+    # The label makes the statement text unique so sqlite3's statement cache
+    # cannot hand back a plan prepared against an older schema.
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN /* {label} */ {sql}', params)
+        return ' | '.join(row[-1] for row in cursor.fetchall())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class IndexUsageTests(TestCase):
+
+    def setUp(self):
+        self.specialty = Specialty.objects.create(name='Oncology')
+        self.doctor = make_doctor('doc', self.specialty)
+        self.patient = make_patient('pat')
+
+    def assertPlanSwitches(self, queryset, index, table):
+        """Dropping ``index`` must change the plan, proving the query relied on it"""
+        after = query_plan(queryset, 'with index')
+        self.assertIn(index, after)
+        self.assertNotIn('TEMP B-TREE', after)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP INDEX "{index}"')
+        before = query_plan(queryset, 'without index')
+        self.assertNotIn(index, before)
+        self.assertIn('TEMP B-TREE', before)
+        self.assertIn(table, before)
+
+    def test_doctor_schedule_uses_composite_index(self):
+        """Test doctor appointments by date/time walk (doctor, date, time)"""
+        qs = Appointment.objects.filter(doctor=self.doctor).order_by('date', 'time', 'id')
+        self.assertPlanSwitches(qs, 'appt_doctor_date_time_idx', 'doctor_app_appointment')
+
+    def test_patient_appointments_use_composite_index(self):
+        """Test patient appointments by date walk (patient, date)"""
+        qs = Appointment.objects.filter(patient=self.patient).order_by('date')
+        self.assertPlanSwitches(qs, 'appt_patient_date_idx', 'doctor_app_appointment')
+
+    def test_hospital_wide_list_walks_date_index(self):
+        """Test the unfiltered appointment list pages along the date index, sorting only within a day"""
+        plan = query_plan(Appointment.objects.order_by('date', 'time', 'id'))
+        self.assertIn('appt_date_idx', plan)
+        self.assertNotIn('TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_status_date_index(self):
+        """Test status filtered date ranges walk (status, date)"""
+        qs = Appointment.objects.filter(status='BOOKED', date__lt=date(2024, 1, 1)).order_by('date')
+        self.assertIn('appt_status_date_idx', query_plan(qs))
+
+    def test_patient_records_use_composite_index(self):
+        """Test medical records by patient and date walk (patient, date)"""
+        qs = MedicalRecord.objects.filter(patient=self.patient).order_by('-date')
+        self.assertPlanSwitches(qs, 'record_patient_date_idx', 'doctor_app_medicalrecord')
+
+
+class ActiveSlotConstraintTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor('doc', Specialty.objects.create(name='Dermatology'))
+        self.patient = make_patient('pat')
+        self.other_patient = make_patient('pat2')
+        self.slot = dict(doctor=self.doctor, date=date(2024, 5, 1), time=time(11, 30))
+
+    def test_second_active_booking_rejected(self):
+        """Test one doctor slot cannot be booked twice"""
+        Appointment.objects.create(patient=self.patient, **self.slot)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Appointment.objects.create(patient=self.other_patient, **self.slot)
+
+    def test_cancelled_slot_can_be_rebooked(self):
+        """Test cancelled appointments free the slot"""
+        Appointment.objects.create(patient=self.patient, status='CANCELLED', **self.slot)
+        Appointment.objects.create(patient=self.other_patient, **self.slot)
+        self.assertEqual(Appointment.objects.filter(status='BOOKED').count(), 1)
+
+
+class RecordSearchTests(TestCase):
+
+    def setUp(self):
+        specialty = Specialty.objects.create(name='Internal Medicine')
+        self.doctor = make_doctor('doc', specialty, 'Lisa', 'Cuddy')
+        self.other_doctor = make_doctor('doc2', specialty, 'James', 'Wilson')
+        self.patient = make_patient('pat', 'Peter', 'Piper')
+        self.records = {}
+        for key, doctor, diagnosis, treatment in [
+            ('asthma', self.doctor, 'Chronic asthma with seasonal flare ups', 'Inhaled corticosteroids daily'),
+            ('diabetes', self.doctor, 'Type 2 diabetes mellitus', 'Metformin and diet changes'),
+            ('wheeze', self.other_doctor, 'Viral infection', 'Rest; monitor for asthma symptoms'),
+        ]:
+            self.records[key] = MedicalRecord.objects.create(
+                patient=self.patient, doctor=doctor, diagnosis=diagnosis, treatment=treatment)
+
+    def test_ranked_prefix_search(self):
+        """Test prefix terms match and diagnosis hits outrank treatment hits"""
+        hits = search_records('asth')
+        self.assertEqual([h['id'] for h in hits], [self.records['asthma'].id, self.records['wheeze'].id])
+        self.assertGreater(hits[0]['score'], hits[1]['score'])
+        self.assertIn('[asthma]', hits[0]['diagnosis_snippet'])
+        self.assertEqual(hits[0]['patient_last_name'], 'Piper')
+        self.assertEqual(hits[1]['doctor_last_name'], 'Wilson')
+
+    def test_stemming_and_filters(self):
+        """Test stemmed matching and doctor filtering"""
+        self.assertEqual([h['id'] for h in search_records('diabetic')], [self.records['diabetes'].id])
+        hits = search_records('asthma', doctor_id=self.other_doctor.id)
+        self.assertEqual([h['id'] for h in hits], [self.records['wheeze'].id])
+        self.assertEqual(search_records('asthma', patient_id=self.patient.id + 1), [])
+
+    def test_search_is_two_queries(self):
+        """Test a search costs the index query plus one header query"""
+        with self.assertNumQueries(2):
+            search_records('rest')
+
+    def test_index_follows_saves_and_deletes(self):
+        """Test edits and deletes are reflected immediately"""
+        record = self.records['diabetes']
+        record.diagnosis = 'Gestational hyperglycaemia'
+        record.save()
+        self.assertEqual(search_records('diabetes'), [])
+        self.assertEqual([h['id'] for h in search_records('hyperglyc')], [record.id])
+        record.delete()
+        self.assertEqual(search_records('hyperglyc'), [])
+
+    def test_bulk_and_raw_rows_are_indexed(self):
+        """Test the triggers index bulk inserts and plain SQL writes"""
+        record, = MedicalRecord.objects.bulk_create([MedicalRecord(
+            patient=self.patient, doctor=self.doctor, diagnosis='Pulmonary sarcoidosis', treatment='Prednisolone')])
+        self.assertEqual([h['id'] for h in search_records('sarcoid')], [record.id])
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE doctor_app_medicalrecord SET diagnosis = %s WHERE id = %s', ['Pulmonary fibrosis', record.id])
+        self.assertEqual(search_records('sarcoid'), [])
+        self.assertEqual([h['id'] for h in search_records('fibrosis')], [record.id])
+        MedicalRecord.objects.filter(id=record.id).delete()
+        self.assertEqual(search_records('fibrosis'), [])
+
+    def test_compressed_rows_are_indexed(self):
+        """Test records saved or recompressed with compression on stay searchable"""
+        notes = 'Pulmonary sarcoidosis, stable on review. ' * 5
+        with self.settings(HMS_TEXT_COMPRESSION='zlib', HMS_TEXT_COMPRESSION_MIN_BYTES=10):
+            record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, diagnosis=notes,
+                                                  treatment=notes)
+            call_command('recompress_records', stdout=StringIO())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT typeof(diagnosis) FROM doctor_app_medicalrecord WHERE id = %s', [record.id])
+            self.assertEqual(cursor.fetchone(), ('blob',))
+        self.assertEqual([h['id'] for h in search_records('sarcoid')], [record.id])
+        self.assertEqual(len(search_records('asthma')), 2)
+
+    def test_syntax_in_terms_is_literal(self):
+        """Test FTS operators typed by users do not raise"""
+        self.assertEqual(search_records('asthma NOT "'), [])
+        self.assertEqual(search_records('   '), [])
+
+    def test_rebuild(self):
+        """Test rebuilding reindexes every record"""
+        self.assertEqual(rebuild_index(batch_size=2), 3)
+        self.assertEqual(len(search_records('asthma')), 2)
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.cardiology = Specialty.objects.create(name='Cardiology')
+        self.surgery = Specialty.objects.create(name='Surgery')
+        self.heart = make_doctor('heart', self.cardiology, 'Meredith', 'Grey')
+        self.cutter = make_doctor('cutter', self.surgery, 'Cristina', 'Yang')
+        self.patient = make_patient('pat', 'Izzie', 'Stevens')
+        for day in range(1, 6):
+            Appointment.objects.create(patient=self.patient, doctor=self.heart, date=date(2024, 8, day), time=time(9, 0))
+        Appointment.objects.create(patient=self.patient, doctor=self.cutter, date=date(2024, 8, 3), time=time(9, 0))
+        MedicalRecord.objects.create(patient=self.patient, doctor=self.cutter, diagnosis='Appendicitis', treatment='Surgery, "urgent"')
+        self.staff = User.objects.create_user(username='staff', is_staff=True)
+
+    def get(self, url, **params):
+        self.client.force_login(self.staff)
+        response = self.client.get(url, params)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_requires_staff(self):
+        """Test anonymous users are sent to the admin login"""
+        response = self.client.get('/exports/appointments/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_csv_with_filters(self):
+        """Test CSV export filters by date range and specialty"""
+        response, body = self.get('/exports/appointments/', **{'from': '2024-08-02', 'to': '2024-08-04'})
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(body.decode())))
+        self.assertEqual(len(rows), 4)
+        self.assertEqual(rows[0]['patient_last_name'], 'Stevens')
+
+        _, body = self.get('/exports/appointments/', specialty=self.surgery.id)
+        rows = list(csv.DictReader(StringIO(body.decode())))
+        self.assertEqual([(r['doctor_last_name'], r['specialty']) for r in rows], [('Yang', 'Surgery')])
+
+    def test_ndjson_gzip_records(self):
+        """Test gzipped NDJSON record export round-trips"""
+        response, body = self.get('/exports/records/', format='ndjson', gzip='1', doctor=self.cutter.id)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('records.ndjson.gz', response['Content-Disposition'])
+        rows = [json.loads(line) for line in gzip.decompress(body).decode().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['treatment'], 'Surgery, "urgent"')
+
+    def test_bad_filters(self):
+        """Test malformed filters are rejected"""
+        response = self.get('/exports/appointments/', format='xml')[0]
+        self.assertEqual(response.status_code, 400)
+        response = self.get('/exports/appointments/', **{'from': 'yesterday'})[0]
+        self.assertEqual(response.status_code, 400)
+
+    def test_one_query_per_chunk(self):
+        """Test exports walk the table in bounded keyset chunks"""
+        with self.assertNumQueries(3):
+            pieces = list(exports.stream('appointments', 'csv', {}, chunk_size=2))
+        self.assertEqual(sum(piece.count(b'\n') for piece in pieces), 7)
+
+    def test_command_writes_file(self):
+        """Test the export command streams to a file"""
+        path = os.path.join(tempfile.mkdtemp(), 'appointments.csv.gz')
+        call_command('export_hms', 'appointments', '--gzip', '--doctor', str(self.heart.id), '--output', path)
+        with gzip.open(path, 'rt') as f:
+            self.assertEqual(len(list(csv.DictReader(f))), 5)
+
+
+class AppointmentApiTests(TestCase):
+
+    def setUp(self):
+        specialty = Specialty.objects.create(name='Pediatrics')
+        self.doctor = make_doctor('doc', specialty, 'Doogie', 'Howser')
+        self.patient = make_patient('pat', 'Bart', 'Simpson')
+        self.other = make_patient('pat2', 'Lisa', 'Simpson')
+        for day in range(1, 4):
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2024, 9, day), time=time(9, 0))
+        self.foreign = Appointment.objects.create(patient=self.other, doctor=self.doctor, date=date(2024, 9, 1), time=time(10, 0))
+        MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, diagnosis='Chickenpox', treatment='Calamine')
+
+    def test_patients_see_only_their_own(self):
+        """Test patient callers are scoped to their appointments and records"""
+        self.client.force_login(self.patient.user)
+        body = self.client.get('/api/appointments/').json()
+        self.assertEqual(len(body['results']), 3)
+        self.assertEqual(self.client.get(f'/api/appointments/{self.foreign.id}/').status_code, 404)
+        self.client.force_login(self.other.user)
+        self.assertEqual(self.client.get('/api/records/').json()['results'], [])
+
+    def test_patient_books_and_cancels(self):
+        """Test patients book for themselves through the booking checks, clash with taken slots and may only cancel"""
+        self.client.force_login(self.other.user)
+        day = (date.today() + timedelta(days=1)).isoformat()
+        response = self.client.post('/api/appointments/', {
+            'doctor_id': self.doctor.id, 'patient_id': self.patient.id, 'date': day, 'time': '11:00'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        booked = response.json()
+        self.assertEqual((booked['patient_id'], booked['status']), (self.other.id, 'BOOKED'))
+
+        for slot, status in [((day, '11:00'), 409), (('2024-09-01', '11:00'), 400), ((day, '11:10'), 400),
+                             ((day, '23:00'), 400)]:
+            response = self.client.post('/api/appointments/', {
+                'doctor_id': self.doctor.id, 'date': slot[0], 'time': slot[1]
+            }, content_type='application/json')
+            self.assertEqual(response.status_code, status, slot)
+        self.assertEqual(Appointment.objects.filter(date=day).count(), 1)
+
+        url = f"/api/appointments/{booked['id']}/"
+        self.assertEqual(self.client.patch(url, {'status': 'COMPLETED'}, content_type='application/json').status_code, 403)
+        self.assertEqual(self.client.patch(url, {'date': '2025-01-01'}, content_type='application/json').status_code, 403)
+        response = self.client.patch(url, {'status': 'CANCELLED'}, content_type='application/json')
+        self.assertEqual(response.json()['status'], 'CANCELLED')
+
+    def test_doctor_schedule_pages_in_date_order(self):
+        """Test doctor callers page their schedule by date and time"""
+        self.client.force_login(self.doctor.user)
+        first = self.client.get('/api/appointments/', {'limit': 2, 'fields': 'date,time'}).json()
+        self.assertEqual(first['results'][0], {'date': '2024-09-01', 'time': '09:00:00'})
+        second = self.client.get('/api/appointments/', {'limit': 2, 'cursor': first['next']}).json()
+        self.assertEqual([r['date'] for r in second['results']], ['2024-09-02', '2024-09-03'])
+        self.assertIsNone(second['next'])
+
+    def test_doctor_writes_records_as_self(self):
+        """Test doctors author records under their own id and can search them"""
+        self.client.force_login(self.doctor.user)
+        response = self.client.post('/api/records/', {
+            'patient_id': self.other.id, 'doctor_id': 999, 'diagnosis': 'Sprained wrist', 'treatment': 'Splint'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['doctor_id'], self.doctor.id)
+        body = self.client.get('/api/records/', {'q': 'sprain', 'fields': 'diagnosis'}).json()
+        self.assertEqual(body['results'], [{'diagnosis': 'Sprained wrist'}])
+
+    def test_record_search_keeps_the_callers_scope(self):
+        """Test a patient finds their own records however many other records match better"""
+        MedicalRecord.objects.bulk_create([
+            MedicalRecord(patient=self.other, doctor=self.doctor, diagnosis='Chickenpox chickenpox', treatment='Rest')
+            for _ in range(600)
+        ])
+        self.client.force_login(self.patient.user)
+        body = self.client.get('/api/records/', {'q': 'chickenpox', 'fields': 'patient_id'}).json()
+        self.assertEqual(body['results'], [{'patient_id': self.patient.id}])
+
+    def test_list_query_budget(self):
+        """Test a joined list costs session, user, role and one list query"""
+        self.client.force_login(self.doctor.user)
+        with self.assertNumQueries(4):
+            self.client.get('/api/appointments/')
+        with self.assertNumQueries(4):
+            self.client.get('/api/doctors/')
+
+
+class AsyncReadTests(TestCase):
+
+    def setUp(self):
+        specialty = Specialty.objects.create(name='Neurology')
+        self.doctor = make_doctor('doc', specialty, 'Stephen', 'Strange')
+        self.other_doctor = make_doctor('doc2', specialty)
+        self.patient = make_patient('pat', 'Wanda', 'Maximoff')
+        self.day = date.today() + timedelta(days=1)
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.day, time=time(10, 0))
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.day, time=time(9, 0))
+        Appointment.objects.create(patient=self.patient, doctor=self.other_doctor, date=self.day, time=time(11, 0))
+        Appointment.objects.create(
+            patient=self.patient, doctor=self.doctor, date=self.day, time=time(9, 30), status='CANCELLED'
+        )
+
+    async def test_doctor_schedule(self):
+        """Test a doctor reads their own day in time order but not a colleague's"""
+        await self.async_client.aforce_login(self.doctor.user)
+        response = await self.async_client.get(f'/api/doctors/{self.doctor.id}/schedule/', {'date': self.day.isoformat()})
+        body = response.json()
+        self.assertEqual([r['time'] for r in body['results']], ['09:00:00', '09:30:00', '10:00:00'])
+        self.assertEqual(body['results'][0]['patient_first_name'], 'Wanda')
+        response = await self.async_client.get(f'/api/doctors/{self.other_doctor.id}/schedule/')
+        self.assertEqual(response.status_code, 403)
+        response = await self.async_client.get(f'/api/doctors/{self.doctor.id}/schedule/', {'date': 'soon'})
+        self.assertEqual(response.status_code, 400)
+
+    async def test_patient_upcoming(self):
+        """Test upcoming lists booked slots only, and doctors see just their own"""
+        await self.async_client.aforce_login(self.patient.user)
+        body = (await self.async_client.get(f'/api/patients/{self.patient.id}/upcoming/')).json()
+        self.assertEqual([r['time'] for r in body['results']], ['09:00:00', '10:00:00', '11:00:00'])
+        self.assertEqual(body['results'][0]['specialty_name'], 'Neurology')
+        await self.async_client.aforce_login(self.other_doctor.user)
+        body = (await self.async_client.get(f'/api/patients/{self.patient.id}/upcoming/')).json()
+        self.assertEqual([r['time'] for r in body['results']], ['11:00:00'])
+
+    async def test_availability(self):
+        """Test availability leaves out booked slots but not cancelled ones"""
+        response = await self.async_client.get(f'/api/doctors/{self.doctor.id}/availability/')
+        self.assertEqual(response.status_code, 401)
+        await self.async_client.aforce_login(self.patient.user)
+        body = (await self.async_client.get(f'/api/doctors/{self.doctor.id}/availability/',
+                                            {'date': self.day.isoformat()})).json()
+        self.assertEqual(body['slots'][:3], ['09:30:00', '10:30:00', '11:00:00'])
+        self.assertEqual(len(body['slots']), 14)
+        response = await self.async_client.get('/api/doctors/999/availability/')
+        self.assertEqual(response.status_code, 404)
+
+
+class BookingTests(TestCase):
+
+    def setUp(self):
+        specialty = Specialty.objects.create(name='Dermatology')
+        self.doctor = make_doctor('doc', specialty)
+        self.patient = make_patient('pat')
+        self.other = make_patient('pat2')
+        self.day = date.today() + timedelta(days=1)
+
+    def test_book_and_clash(self):
+        """Test a taken slot raises SlotUnavailable and leaves one booking"""
+        book_appointment(self.patient.id, self.doctor.id, self.day, time(9, 0))
+        with self.assertRaises(SlotUnavailable):
+            book_appointment(self.other.id, self.doctor.id, self.day, time(9, 0))
+        self.assertEqual(Appointment.objects.filter(status='BOOKED').count(), 1)
+
+    def test_rejects_past_and_off_grid(self):
+        """Test bookings must be in the future and on the slot grid"""
+        with self.assertRaises(BookingError):
+            book_appointment(self.patient.id, self.doctor.id, date.today() - timedelta(days=1), time(9, 0))
+        with self.assertRaises(BookingError):
+            book_appointment(self.patient.id, self.doctor.id, self.day, time(9, 10))
+        with self.assertRaises(BookingError):
+            book_appointment(self.patient.id, self.doctor.id, self.day, time(20, 0))
+
+    def test_conditional_cancel(self):
+        """Test cancelling is a conditional UPDATE, only for BOOKED rows of the caller, and keeps metrics right"""
+        appointment = book_appointment(self.patient.id, self.doctor.id, self.day, time(9, 0))
+        metrics.reconcile()
+        self.assertFalse(cancel_appointment(appointment.id, patient_id=self.other.id))
+        # read the slot, savepoint, UPDATE appointment, bitmap and two daily counters, outbox, release
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(8):
+            self.assertTrue(cancel_appointment(appointment.id, patient_id=self.patient.id))
+        self.assertFalse(cancel_appointment(appointment.id))
+        counts = metrics.get_metrics()
+        self.assertEqual((counts['status:BOOKED'], counts['status:CANCELLED']), (0, 1))
+        book_appointment(self.other.id, self.doctor.id, self.day, time(9, 0))
+
+
+class BookingIntegrityTests(TransactionTestCase):
+
+    def test_unknown_patient_is_not_a_clash(self):
+        """Test only the active-slot constraint is reported as SlotUnavailable"""
+        doctor = make_doctor('doc', Specialty.objects.create(name='Oncology'))
+        with self.assertRaises(IntegrityError) as caught:
+            book_appointment(999999, doctor.id, date.today() + timedelta(days=1), time(9, 0))
+        self.assertNotIsInstance(caught.exception, SlotUnavailable)
+        self.assertFalse(Appointment.objects.exists())
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+
+    def test_one_winner_per_slot(self):
+        """Test threads racing for the same slots never double book"""
+        specialty = Specialty.objects.create(name='Oncology')
+        doctor = make_doctor('doc', specialty)
+        patients = [make_patient(f'pat{i}').id for i in range(8)]
+        day = date.today() + timedelta(days=1)
+        slots = [time(9, 0), time(9, 30)]
+        outcomes = []
+
+        def attempt(patient_id):
+            try:
+                for slot in slots:
+                    try:
+                        book_appointment(patient_id, doctor.id, day, slot, retries=20)
+                        outcomes.append('booked')
+                    except SlotUnavailable:
+                        outcomes.append('taken')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attempt, args=(p,)) for p in patients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(outcomes.count('booked'), len(slots))
+        self.assertEqual(outcomes.count('taken'), len(slots) * (len(patients) - 1))
+        self.assertEqual(Appointment.objects.filter(status='BOOKED').count(), len(slots))
+
+
+class AvailabilityTests(TestCase):
+
+    def setUp(self):
+        self.cardiology = Specialty.objects.create(name='Cardiology')
+        self.doctor = make_doctor('doc', self.cardiology)
+        self.colleague = make_doctor('doc2', self.cardiology)
+        self.patient = make_patient('pat')
+        # A Monday, seen from the Sunday before.
+        self.monday = date(2031, 6, 2)
+        self.now = datetime(2031, 6, 1, 12, 0, tzinfo=dt_timezone.utc)
+
+    def bitmap(self, doctor, day):
+        return DoctorDaySlots.objects.filter(doctor=doctor, date=day).values_list('booked', flat=True).first()
+
+    def test_bitmap_follows_appointment_writes(self):
+        """Test saves, status changes, moves and deletes keep the bitmap in step"""
+        appointment = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.monday, time=time(9, 0))
+        self.assertEqual(self.bitmap(self.doctor, self.monday), 1 << 18)
+        appointment.time = time(10, 0)
+        appointment.save()
+        self.assertEqual(self.bitmap(self.doctor, self.monday), 1 << 20)
+        appointment.status = 'COMPLETED'
+        appointment.save()
+        self.assertEqual(self.bitmap(self.doctor, self.monday), 0)
+        booked = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.monday, time=time(11, 0))
+        Appointment.objects.get(pk=booked.pk).delete()
+        self.assertEqual(self.bitmap(self.doctor, self.monday), 0)
+
+    def test_free_slots_use_working_hours(self):
+        """Test doctors with hours only offer those, and booked slots drop out"""
+        WorkingHours.objects.create(doctor=self.doctor, weekday=0, start=time(9, 0), end=time(10, 30))
+        WorkingHours.objects.create(doctor=self.doctor, weekday=0, start=time(14, 0), end=time(15, 0))
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.monday, time=time(9, 30))
+        free = availability.free_slots(self.doctor.id, self.monday, days=2, now=self.now)
+        self.assertEqual(free, {self.monday: [time(9, 0), time(10, 0), time(14, 0), time(14, 30)]})
+        self.assertEqual(len(availability.free_slots(self.colleague.id, self.monday, days=2, now=self.now)[self.monday]), 16)
+
+    def test_started_slots_are_not_free(self):
+        """Test today's slots that have begun are not offered"""
+        now = datetime(2031, 6, 2, 12, 10, tzinfo=dt_timezone.utc)
+        free = availability.free_slots(self.doctor.id, self.monday, days=1, now=now)[self.monday]
+        self.assertEqual(free[0], time(12, 30))
+
+    def test_earliest_free_across_specialty(self):
+        """Test the earliest free doctor is found across the specialty, with and without NumPy"""
+        for at in availability.free_slots(self.doctor.id, self.monday, days=1, now=self.now)[self.monday]:
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.monday, time=at)
+        Appointment.objects.create(patient=self.patient, doctor=self.colleague, date=self.monday, time=time(9, 0))
+        make_doctor('doc3', Specialty.objects.create(name='Oncology'))
+        expected = [
+            (self.colleague.id, self.monday, time(9, 30)),
+            (self.doctor.id, self.monday + timedelta(days=1), time(9, 0)),
+        ]
+        found = availability.earliest_free(self.monday, days=3, specialty_id=self.cardiology.id, now=self.now)
+        self.assertEqual(found, expected)
+        with mock.patch.object(availability, 'np', None):
+            found = availability.earliest_free(self.monday, days=3, specialty_id=self.cardiology.id, now=self.now)
+        self.assertEqual(found, expected)
+
+    def test_booking_respects_hours(self):
+        """Test booking outside a doctor's hours is refused"""
+        WorkingHours.objects.create(doctor=self.doctor, weekday=0, start=time(9, 0), end=time(12, 0))
+        with self.assertRaises(BookingError):
+            book_appointment(self.patient.id, self.doctor.id, self.monday, time(13, 0))
+        with self.assertRaises(BookingError):
+            book_appointment(self.patient.id, self.doctor.id, self.monday + timedelta(days=1), time(9, 0))
+        book_appointment(self.patient.id, self.doctor.id, self.monday, time(11, 30))
+
+    def test_rebuild(self):
+        """Test rebuild recomputes bitmaps written around the signals"""
+        Appointment.objects.bulk_create([
+            Appointment(patient=self.patient, doctor=self.doctor, date=self.monday, time=time(9, 0)),
+            Appointment(patient=self.patient, doctor=self.doctor, date=self.monday, time=time(9, 30)),
+        ])
+        self.assertIsNone(self.bitmap(self.doctor, self.monday))
+        out = StringIO()
+        call_command('rebuild_doctor_slots', stdout=out)
+        self.assertEqual(self.bitmap(self.doctor, self.monday), 3 << 18)
+        self.assertIn('1 doctor days', out.getvalue())
+
+
+class SweepTests(TestCase):
+
+    def setUp(self):
+        specialty = Specialty.objects.create(name='Radiology')
+        self.doctor = make_doctor('doc', specialty)
+        self.patient = make_patient('pat')
+        self.now = datetime(2031, 6, 2, 12, 10, tzinfo=dt_timezone.utc)
+        slots = [
+            (date(2031, 5, 30), time(9, 0), 'BOOKED'),
+            (date(2031, 5, 31), time(9, 0), 'BOOKED'),
+            (date(2031, 5, 31), time(10, 0), 'CANCELLED'),
+            (date(2031, 6, 2), time(11, 30), 'BOOKED'),
+            (date(2031, 6, 2), time(11, 45), 'BOOKED'),  # still running at 12:10
+            (date(2031, 6, 3), time(9, 0), 'BOOKED'),
+        ]
+        for day, at, status in slots:
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=day, time=at, status=status)
+        self.record(self.doctor, date(2031, 5, 31))
+
+    def record(self, doctor, day):
+        record = MedicalRecord.objects.create(patient=self.patient, doctor=doctor, diagnosis='Fracture', treatment='Cast')
+        MedicalRecord.objects.filter(pk=record.pk).update(date=day)
+
+    def outcomes(self):
+        return list(Appointment.objects.exclude(status__in=['BOOKED', 'CANCELLED']).values_list('date', 'status').order_by('date'))
+
+    def test_sweeps_finished_slots_in_batches(self):
+        """Test only finished BOOKED slots move, batch by batch, with metrics and past bitmaps kept right"""
+        metrics.reconcile()
+        with self.captureOnCommitCallbacks(execute=True):
+            batches = list(lifecycle.sweep(batch_size=2, now=self.now))
+        self.assertEqual([(done, missed) for done, missed, _ in batches], [(1, 1), (0, 1)])
+        self.assertEqual(
+            list(Appointment.objects.filter(status='BOOKED').values_list('time', flat=True).order_by('date')),
+            [time(11, 45), time(9, 0)],
+        )
+        counts = metrics.get_metrics()
+        self.assertEqual((counts['status:BOOKED'], counts['status:COMPLETED'], counts['status:NO_SHOW']), (2, 1, 2))
+        self.assertFalse(DoctorDaySlots.objects.filter(date__lt=date(2031, 6, 2)).exists())
+        self.assertEqual(list(lifecycle.sweep(now=self.now)), [])
+
+    def test_counts_follow_the_update(self):
+        """Test a selected row that is no longer BOOKED at update time is neither moved nor counted"""
+        metrics.reconcile()
+        stats.rebuild()
+        # Reads the cancelled 31 May slot too, as if it was cancelled after the select.
+        stale = Appointment.objects.filter(date__lt=date(2031, 6, 1))
+        with mock.patch('doctor_app.lifecycle.overdue', return_value=stale), \
+                self.captureOnCommitCallbacks(execute=True):
+            batches = list(lifecycle.sweep(max_batches=1, now=self.now))
+        self.assertEqual([(done, missed) for done, missed, _ in batches], [(1, 1)])
+        self.assertEqual(metrics.get_metrics(), metrics.reconcile())
+        counters = DailyAppointmentStats.objects.exclude(count=0).values_list('doctor_id', 'date', 'status', 'count')
+        before = set(counters)
+        stats.rebuild()
+        self.assertEqual(set(counters.all()), before)
+
+    def test_max_batches_resumes(self):
+        """Test a bounded run stops early and the next run carries on"""
+        self.assertEqual(len(list(lifecycle.sweep(batch_size=1, max_batches=2, now=self.now))), 2)
+        self.assertEqual(lifecycle.overdue(self.now).count(), 1)
+        self.assertEqual(len(list(lifecycle.sweep(batch_size=1, now=self.now))), 1)
+        self.assertEqual(self.outcomes(), [
+            (date(2031, 5, 30), 'NO_SHOW'), (date(2031, 5, 31), 'COMPLETED'), (date(2031, 6, 2), 'NO_SHOW'),
+        ])
+
+    def test_outcome_needs_a_record_by_that_doctor_that_day(self):
+        """Test a record by another doctor or on another day leaves the visit a no-show"""
+        self.record(make_doctor('doc2', self.doctor.specialty), date(2031, 5, 30))
+        self.record(self.doctor, date(2031, 6, 1))
+        list(lifecycle.sweep(now=self.now))
+        self.assertEqual(self.outcomes(), [
+            (date(2031, 5, 30), 'NO_SHOW'), (date(2031, 5, 31), 'COMPLETED'), (date(2031, 6, 2), 'NO_SHOW'),
+        ])
+
+    def test_command_reports_batches(self):
+        """Test the command reports rows and time per batch"""
+        out = StringIO()
+        with mock.patch('django.utils.timezone.now', return_value=self.now):
+            call_command('sweep_appointments', '--batch-size', '1000', stdout=out)
+        self.assertIn('batch 1: 3 rows', out.getvalue())
+        self.assertIn('Marked 1 appointments COMPLETED and 2 NO_SHOW', out.getvalue())
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        specialty = Specialty.objects.create(name='Geriatrics')
+        self.doctor = make_doctor('doc', specialty)
+        self.patient = make_patient('pat')
+        for day, status in [(1, 'COMPLETED'), (2, 'BOOKED'), (3, 'NO_SHOW'), (10, 'COMPLETED')]:
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2024, 3, day),
+                                       time=time(9, 0), status=status)
+        for day in range(1, 6):
+            record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor,
+                                                  diagnosis=f'Sprain {day}', treatment='Rest')
+            MedicalRecord.objects.filter(pk=record.pk).update(date=date(2024, 3, day * 2))
+        self.before = date(2024, 3, 5)
+
+    def test_moves_finished_appointments_in_batches(self):
+        """Test old finished appointments move in batches, BOOKED ones stay, and metrics follow"""
+        metrics.reconcile()
+        with self.captureOnCommitCallbacks(execute=True):
+            batches = list(archive.archive_appointments(self.before, batch_size=1))
+        self.assertEqual([rows for rows, _ in batches], [1, 1])
+        self.assertEqual(list(Appointment.objects.order_by('date').values_list('status', flat=True)),
+                         ['BOOKED', 'COMPLETED'])
+        self.assertEqual(ArchivedAppointment.objects.count(), 2)
+        counts = metrics.get_metrics()
+        self.assertEqual(counts, metrics.reconcile())
+        page = appointment_list(patient_id=self.patient.id, include_archive=True, size=10)
+        self.assertEqual([row['date'].day for row in page.rows], [1, 2, 3, 10])
+
+    def test_large_batches_delete_in_chunks(self):
+        """Test a batch bigger than one DELETE's id list still moves every row once"""
+        with mock.patch('doctor_app.archive.DELETE_CHUNK', 2), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(sum(rows for rows, _ in archive.archive_records(date(2024, 3, 11), batch_size=100)), 5)
+        deletes = [q['sql'] for q in queries if q['sql'].startswith('DELETE FROM "doctor_app_medicalrecord"')]
+        self.assertEqual(len(deletes), 3)
+        self.assertEqual((MedicalRecord.objects.count(), ArchivedMedicalRecord.objects.count()), (0, 5))
+
+    def test_archived_records_leave_search_and_merge_back(self):
+        """Test archived records drop out of search and merge back into the history in order"""
+        self.assertEqual(sum(rows for rows, _ in archive.archive_records(self.before)), 2)
+        self.assertEqual(MedicalRecord.objects.count(), 3)
+        self.assertEqual(len(search_records('sprain')), 3)
+        self.assertEqual(len(record_timeline(self.patient.id).rows), 3)
+        days, after = [], None
+        while True:
+            page = record_timeline(self.patient.id, after=after, size=2, include_archive=True)
+            days += [row['date'].day for row in page.rows]
+            if not page.has_next:
+                break
+            after = page.next_cursor
+        self.assertEqual(days, [10, 8, 6, 4, 2])
+        timeline = record_timeline(self.patient.id, size=10, include_archive=True).rows
+        self.assertEqual([row['archived'] for row in timeline], [False, False, False, True, True])
+        self.assertEqual(record_body(self.patient.id, timeline[-1]['id'], archived=True)['diagnosis'], 'Sprain 1')
+        self.assertEqual(ArchivedMedicalRecord.objects.get(date=date(2024, 3, 2)).diagnosis, 'Sprain 1')
+
+    def test_command_uses_horizon(self):
+        """Test the command archives both kinds before the configured horizon"""
+        out = StringIO()
+        with self.settings(HMS_ARCHIVE_AFTER_DAYS=1):
+            call_command('archive_hms', stdout=out)
+        self.assertIn('Archived 3 appointments', out.getvalue())
+        self.assertIn('Archived 5 records', out.getvalue())
+        out = StringIO()
+        call_command('archive_hms', '--only', 'records', stdout=out)
+        self.assertNotIn('appointments', out.getvalue())
+
+
+class DailyStatsTests(TestCase):
+
+    def setUp(self):
+        self.specialty = Specialty.objects.create(name='Urology')
+        self.doctor = make_doctor('doc', self.specialty)
+        self.patient = make_patient('pat')
+        self.day = date.today() + timedelta(days=1)
+
+    def counters(self):
+        return dict(((row.doctor_id, row.date, row.status), row.count)
+                    for row in DailyAppointmentStats.objects.exclude(count=0))
+
+    def test_follows_every_write_path(self):
+        """Test booking, cancelling, editing, sweeping, archiving and deleting keep the rollup equal to a recount"""
+        first = book_appointment(self.patient.id, self.doctor.id, self.day, time(9, 0))
+        second = book_appointment(self.patient.id, self.doctor.id, self.day, time(9, 30))
+        cancel_appointment(first.id)
+        second.status = 'COMPLETED'
+        second.save()
+        past = Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=date(2024, 3, 1), time=time(9, 0))
+        list(lifecycle.sweep())
+        list(archive.archive_appointments(date(2024, 4, 1)))
+        Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.day, time=time(10, 0)).delete()
+        expected = {
+            (self.doctor.id, self.day, 'CANCELLED'): 1,
+            (self.doctor.id, self.day, 'COMPLETED'): 1,
+            (self.doctor.id, past.date, 'NO_SHOW'): 1,
+        }
+        self.assertEqual(self.counters(), expected)
+        DailyAppointmentStats.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_appointment_stats', stdout=out)
+        self.assertEqual(self.counters(), expected)
+        self.assertIn('Rebuilt 3 daily appointment counters', out.getvalue())
+
+    def test_saves_with_deferred_status(self):
+        """Test saving a row loaded without its status moves the old counter and slot instead of only adding"""
+        booked = book_appointment(self.patient.id, self.doctor.id, self.day, time(9, 0))
+        appointment = Appointment.objects.defer('status').get(pk=booked.pk)
+        appointment.time = time(9, 30)
+        appointment.save()
+        appointment = Appointment.objects.only('id').get(pk=booked.pk)
+        appointment.status = 'CANCELLED'
+        appointment.save()
+        self.assertEqual(self.counters(), {(self.doctor.id, self.day, 'CANCELLED'): 1})
+        self.assertEqual(DoctorDaySlots.objects.get(doctor=self.doctor, date=self.day).booked, 0)
+
+    def test_reads_use_only_the_rollup(self):
+        """Test the analytics reads group the rollup by day, specialty and doctor in one query each"""
+        other = make_doctor('doc2', Specialty.objects.create(name='Oncology'))
+        for doctor, at in [(self.doctor, time(9, 0)), (self.doctor, time(9, 30)), (other, time(9, 0))]:
+            book_appointment(self.patient.id, doctor.id, self.day, at)
+        with self.assertNumQueries(3):
+            per_day = stats.per_day(self.day, self.day)
+            per_specialty = stats.per_specialty(self.day, self.day)
+            per_doctor = stats.per_doctor(self.day, self.day, limit=1)
+        self.assertEqual(per_day, [{'date': self.day, 'status': 'BOOKED', 'n': 3}])
+        self.assertIn({'specialty_id': self.specialty.id, 'status': 'BOOKED', 'n': 2}, per_specialty)
+        self.assertEqual(per_doctor, [{'doctor_id': self.doctor.id, 'n': 2}])
+
+
+class AdminChangelistTests(TestCase):
+
+    def setUp(self):
+        self.neurology = Specialty.objects.create(name='Neurology')
+        self.doctor = make_doctor('doc', self.neurology, 'Gregory', 'House')
+        self.other = make_doctor('doc2', Specialty.objects.create(name='Oncology'), 'James', 'Wilson')
+        for i in range(12):
+            patient = make_patient(f'pat{i}', last_name=f'Number{i}')
+            Appointment.objects.create(patient=patient, doctor=self.doctor if i % 3 else self.other,
+                                       date=date(2024, 3, 1), time=time(9, i))
+            MedicalRecord.objects.create(patient=patient, doctor=self.doctor, diagnosis='Flu', treatment='Rest')
+        admin = User.objects.create_superuser(username='root', email='root@test.com', password=None)
+        self.client.force_login(admin)
+
+    def changelist_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        """Test changelists join patient, doctor and user up front instead of per row"""
+        urls = ['/admin/doctor_app/appointment/', '/admin/doctor_app/medicalrecord/']
+        before = [self.changelist_queries(url)[1] for url in urls]
+        for i in range(12, 24):
+            patient = make_patient(f'pat{i}')
+            Appointment.objects.create(patient=patient, doctor=self.doctor, date=date(2024, 3, 2), time=time(9, i))
+            MedicalRecord.objects.create(patient=patient, doctor=self.doctor, diagnosis='Flu', treatment='Rest')
+        self.assertEqual([self.changelist_queries(url)[1] for url in urls], before)
+
+    def test_patient_search_is_not_capped(self):
+        """Test searching by patient name keeps every matching patient's rows"""
+        url = '/admin/doctor_app/appointment/'
+        response, _ = self.changelist_queries(url, {'q': 'number'})
+        self.assertEqual(response.context['cl'].result_count, 12)
+        response, _ = self.changelist_queries(url, {'q': 'number1'})
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+    def test_estimated_count_for_big_tables(self):
+        """Test unfiltered pages estimate the count and filtered ones count up to the cap"""
+        with mock.patch('core.changelists.COUNT_CAP', 5):
+            paginator = EstimatedCountPaginator(Appointment.objects.order_by('id'), 50)
+            self.assertEqual(paginator.count, estimated_count(Appointment))
+            filtered = EstimatedCountPaginator(Appointment.objects.filter(doctor=self.doctor), 50)
+            self.assertEqual(filtered.count, 5)
+        self.assertEqual(EstimatedCountPaginator(Appointment.objects.filter(doctor=self.doctor), 50).count, 8)
+
+    def test_cached_directory_filters(self):
+        """Test specialty and doctor filters read cached directories and filter by id"""
+        url = '/admin/doctor_app/appointment/'
+        params = {'doctor__specialty_id': self.other.specialty_id, 'doctor_id': self.other.id}
+        self.client.get(url, params)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertContains(response, 'Dr. James Wilson (Oncology)')
+        self.assertNotContains(response, 'Dr. Gregory House (Neurology)')
+        self.assertEqual(response.context['cl'].result_count, 4)
+        response, _ = self.changelist_queries(url, {'doctor__specialty_id': self.neurology.id})
+        self.assertEqual(response.context['cl'].result_count, 8)
+        directories = [q['sql'] for q in queries if 'FROM "core_specialty"' in q['sql'] or 'FROM "doctor_app_doctor"' in q['sql']]
+        self.assertEqual(directories, [])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'record text is only stored compressed on SQLite')
+@override_settings(HMS_TEXT_COMPRESSION='zlib')
+class CompressedTextTests(TestCase):
+
+    NOTES = 'Patient reports intermittent chest pain on exertion, relieved by rest. ' * 20
+
+    def setUp(self):
+        self.doctor = make_doctor('doc', Specialty.objects.create(name='Cardiology'))
+        self.patient = make_patient('pat')
+
+    def stored(self, model, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT diagnosis, treatment FROM {model._meta.db_table} WHERE id = %s', [pk])
+            return cursor.fetchone()
+
+    def test_long_text_is_stored_compressed(self):
+        """Test long text is stored as marked compressed bytes, short text as is, and both read back"""
+        record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, diagnosis='Angina',
+                                              treatment=self.NOTES)
+        diagnosis, treatment = self.stored(MedicalRecord, record.id)
+        self.assertEqual(diagnosis, 'Angina')
+        self.assertEqual(treatment[:1], b'z')
+        self.assertLess(len(treatment), len(self.NOTES) // 10)
+        self.assertEqual(MedicalRecord.objects.get(id=record.id).treatment, self.NOTES)
+        self.assertEqual(record_body(self.patient.id, record.id)['treatment'], self.NOTES)
+        self.assertEqual([hit['id'] for hit in search_records('exertion')], [record.id])
+
+    def test_recompress_existing_rows(self):
+        """Test the command compresses legacy rows, skips them on a rerun and can undo it"""
+        with self.settings(HMS_TEXT_COMPRESSION='off'):
+            record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, diagnosis='Angina',
+                                                  treatment=self.NOTES)
+        self.assertEqual(self.stored(MedicalRecord, record.id)[1], self.NOTES)
+        self.assertEqual(list(fields.recompress(MedicalRecord))[0][:2], (1, 1))
+        self.assertEqual(self.stored(MedicalRecord, record.id)[1][:1], b'z')
+        self.assertEqual(list(fields.recompress(MedicalRecord))[0][:2], (0, 1))
+        out = StringIO()
+        with self.settings(HMS_TEXT_COMPRESSION='off'):
+            call_command('recompress_records', stdout=out)
+        self.assertIn('Rewrote 1 of 1 medical records (off)', out.getvalue())
+        self.assertEqual(self.stored(MedicalRecord, record.id)[1], self.NOTES)
+
+    def test_archive_keeps_text_readable(self):
+        """Test archived records keep their compressed text"""
+        record = MedicalRecord.objects.create(patient=self.patient, doctor=self.doctor, diagnosis='Angina',
+                                              treatment=self.NOTES)
+        list(archive.archive_records(date.today() + timedelta(days=1)))
+        self.assertEqual(self.stored(ArchivedMedicalRecord, record.id)[1][:1], b'z')
+        self.assertEqual(ArchivedMedicalRecord.objects.get(id=record.id).treatment, self.NOTES)
+
+    def test_codecs(self):
+        """Test the codec setting, the size threshold and unknown markers"""
+        self.assertEqual(fields.compress('x' * 100, 'zlib', threshold=200), 'x' * 100)
+        self.assertEqual(fields.decompress(fields.compress('x' * 300, 'zlib', threshold=200)), 'x' * 300)
+        with self.assertRaises(ValueError):
+            fields.decompress(b'?abc')
+        with self.assertRaises(ImproperlyConfigured):
+            fields.compress(self.NOTES, 'lz4')
+        if find_spec('zstandard'):
+            self.assertEqual(fields.decompress(fields.compress(self.NOTES, 'zstd')), self.NOTES)
+        else:
+            with self.assertRaises(ImproperlyConfigured):
+                fields.compress(self.NOTES, 'zstd')
+
+
+class NotificationTests(TestCase):
+
+    def setUp(self):
+        self.doctor = make_doctor('doc', Specialty.objects.create(name='Cardiology'), 'Gregory', 'House')
+        self.patient = make_patient('pat', 'Jane')
+        User.objects.filter(id=self.patient.user_id).update(email='jane@test.com')
+        self.now = datetime(2030, 1, 7, 8, 0, tzinfo=dt_timezone.utc)
+        self.day = self.now.date()
+
+    def book(self, at, day=None):
+        return Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=day or self.day, time=at)
+
+    def outbox(self):
+        return list(OutboxMessage.objects.order_by('id').values_list('kind', 'status'))
+
+    def test_booking_changes_queue_messages(self):
+        """Test bookings and cancellations queue their messages in the same transaction"""
+        appointment = self.book(time(9, 0))
+        self.assertTrue(cancel_appointment(appointment.id))
+        other = self.book(time(10, 0))
+        other.status = 'CANCELLED'
+        other.save()
+        other.status = 'COMPLETED'
+        other.save()
+        self.assertEqual(self.outbox(), [('BOOKED', 'PENDING'), ('CANCELLED', 'PENDING'),
+                                         ('BOOKED', 'PENDING'), ('CANCELLED', 'PENDING')])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.day, time=time(10, 0))
+            Appointment.objects.create(patient=self.patient, doctor=self.doctor, date=self.day, time=time(10, 0))
+        self.assertEqual(OutboxMessage.objects.count(), 4)
+
+    def test_reminders_for_the_window_once(self):
+        """Test reminders cover exactly the window, in one query, and are queued once"""
+        for at in [time(7, 30), time(8, 0), time(9, 0), time(17, 0)]:
+            self.book(at)
+        self.book(time(8, 0), self.day + timedelta(days=1))
+        self.book(time(8, 30), self.day + timedelta(days=1))
+        OutboxMessage.objects.all().delete()
+        with self.assertNumQueries(2):
+            self.assertEqual(notifications.schedule_reminders(24, now=self.now), 3)
+        self.assertEqual(notifications.schedule_reminders(24, now=self.now), 0)
+        reminded = OutboxMessage.objects.values_list('date', 'time')
+        self.assertEqual(sorted(reminded), [(self.day, time(9, 0)), (self.day, time(17, 0)),
+                                            (self.day + timedelta(days=1), time(8, 0))])
+        self.assertEqual(set(OutboxMessage.objects.values_list('kind', flat=True)), {'REMINDER'})
+
+    def test_delivery_batches_and_skips(self):
+        """Test delivery sends in batches, skips stale reminders and clears old messages"""
+        booked = self.book(time(9, 0))
+        cancelled = self.book(time(10, 0))
+        OutboxMessage.objects.all().delete()
+        for appointment in (booked, cancelled):
+            notifications.queue('REMINDER', appointment.id, self.patient.id, self.doctor.id, self.day, appointment.time)
+        cancel_appointment(cancelled.id)
+        batches = list(notifications.deliver(batch_size=2, now=self.now))
+        self.assertEqual([batch[:2] for batch in batches], [(1, 1), (1, 0)])
+        self.assertEqual(self.outbox(), [('REMINDER', 'SENT'), ('REMINDER', 'SKIPPED'), ('CANCELLED', 'SENT')])
+        self.assertEqual([m.subject for m in mail.outbox], ['Reminder: your upcoming appointment',
+                                                           'Your appointment was cancelled'])
+        self.assertIn('Dear Jane', mail.outbox[0].body)
+        self.assertIn('Dr. Gregory House (Cardiology) on Monday 07 January 2030 at 09:00', mail.outbox[0].body)
+        list(notifications.deliver(now=self.now + timedelta(days=1)))
+        self.assertEqual(OutboxMessage.objects.count(), 0)
+
+
+class SMTPDeliveryTests(TestCase):
+
+    def setUp(self):
+        self.sink = MailSink().start()
+        self.addCleanup(self.sink.stop)
+        host, port = self.sink.address
+        self.enterContext(self.settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                                        EMAIL_HOST=host, EMAIL_PORT=port))
+        doctor = make_doctor('doc', Specialty.objects.create(name='Cardiology'))
+        self.patients = []
+        for i in range(5):
+            patient = make_patient(f'pat{i}')
+            User.objects.filter(id=patient.user_id).update(email=f'pat{i}@test.com')
+            Appointment.objects.create(patient=patient, doctor=doctor, date=date(2030, 1, 7), time=time(9 + i, 0))
+            self.patients.append(patient)
+        self.now = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+
+    def test_one_connection_for_every_batch(self):
+        """Test the worker sends every batch over one SMTP connection"""
+        batches = list(notifications.deliver(batch_size=2, now=self.now))
+        self.assertEqual([sent for sent, _, _ in batches], [2, 2, 1])
+        self.assertEqual(self.sink.connections, 1)
+        self.assertEqual(sorted(to[0] for _, to, _ in self.sink.messages), [f'pat{i}@test.com' for i in range(5)])
+
+    def test_retry_with_backoff(self):
+        """Test temporary failures are retried later, permanent ones fail, and retries give up"""
+        self.sink.defer = 1
+        self.sink.refuse = {'pat1@test.com'}
+        list(notifications.deliver(now=self.now))
+        statuses = dict(OutboxMessage.objects.values_list('patient_id', 'status'))
+        self.assertEqual([statuses[p.id] for p in self.patients], ['PENDING', 'FAILED', 'SENT', 'SENT', 'SENT'])
+        retry = OutboxMessage.objects.get(status='PENDING')
+        self.assertEqual((retry.attempts, retry.available_at), (1, self.now + timedelta(seconds=60)))
+        self.assertIn('451', retry.last_error)
+        list(notifications.deliver(now=self.now))
+        self.assertEqual(OutboxMessage.objects.filter(status='PENDING').count(), 1)
+        self.sink.defer = notifications.MAX_ATTEMPTS
+        later = self.now
+        for _ in range(notifications.MAX_ATTEMPTS):
+            later += timedelta(days=1)
+            list(notifications.deliver(now=later))
+        retry.refresh_from_db()
+        self.assertEqual((retry.status, retry.attempts), ('FAILED', notifications.MAX_ATTEMPTS))
+
+    def test_relay_down(self):
+        """Test an unreachable relay fails the run and leaves the messages pending"""
+        self.sink.stop()
+        with self.assertRaises(OSError):
+            list(notifications.deliver(now=self.now))
+        self.assertEqual(OutboxMessage.objects.filter(status='PENDING').count(), 5)
+
+    def test_command_reports_throughput(self):
+        """Test the command drains the outbox and reports messages per second"""
+        out = StringIO()
+        call_command('deliver_notifications', '--batch-size', '2', stdout=out)
+        self.assertIn('Sent 5 messages (0 not sent)', out.getvalue())
+        self.assertIn('messages/sec', out.getvalue())
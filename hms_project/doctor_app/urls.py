@@ -0,0 +1,17 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('exports/appointments/', views.export_appointments, name='export_appointments'),
+    path('exports/records/', views.export_records, name='export_records'),
+    path('api/doctors/', views.doctors.collection_view, name='api_doctors'),
+    path('api/doctors/<int:pk>/', views.doctors.item_view, name='api_doctor'),
+    path('api/doctors/<int:pk>/schedule/', views.doctor_schedule, name='api_doctor_schedule'),
+    path('api/doctors/<int:pk>/availability/', views.doctor_availability, name='api_doctor_availability'),
+    path('api/patients/<int:pk>/upcoming/', views.patient_upcoming, name='api_patient_upcoming'),
+    path('api/appointments/', views.appointments.collection_view, name='api_appointments'),
+    path('api/appointments/<int:pk>/', views.appointments.item_view, name='api_appointment'),
+    path('api/records/', views.records.collection_view, name='api_records'),
+    path('api/records/<int:pk>/', views.records.item_view, name='api_record'),
+]
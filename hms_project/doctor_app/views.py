@@ -1,3 +1,276 @@
-from django.shortcuts import render
+from datetime import date
 
-# Create your views here.
+from django.contrib.admin.views.decorators import staff_member_required
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.forms import modelform_factory
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from core.api import ApiError, Resource, aprincipal, create_user, error_response, json_response
+from core.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from . import availability, exports
+from .booking import BookingError, SlotUnavailable, book_appointment, cancel_appointment
+from .models import Doctor, Appointment, MedicalRecord
+from .search import filter_records
+
+
+def _export(request, kind):
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in exports.FORMATS:
+        return HttpResponseBadRequest(f'format must be one of {", ".join(exports.FORMATS)}')
+    try:
+        filters = exports.parse_filters(request.GET)
+    except ValueError as exc:
+        return HttpResponseBadRequest(str(exc))
+    gzip = request.GET.get('gzip') in ('1', 'true')
+    filename = f'{kind}.{fmt}' + ('.gz' if gzip else '')
+    response = StreamingHttpResponse(
+        exports.stream(kind, fmt, filters, gzip=gzip),
+        content_type='application/gzip' if gzip else exports.FORMATS[fmt],
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@require_GET
+@staff_member_required
+def export_appointments(request):
+    return _export(request, 'appointments')
+
+
+@require_GET
+@staff_member_required
+def export_records(request):
+    return _export(request, 'records')
+
+
+# Async read endpoints. These are the hot lookups behind the booking and
+# schedule screens; served through asgi.py they wait on the database without
+# holding a worker thread each.
+
+def _day(request):
+    if not request.GET.get('date'):
+        return date.today()
+    try:
+        return date.fromisoformat(request.GET['date'])
+    except ValueError:
+        raise ApiError(400, 'date must be a YYYY-MM-DD date')
+
+
+def _limit(request):
+    try:
+        return max(1, min(int(request.GET.get('limit', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, 'limit must be an integer')
+
+
+@require_GET
+async def doctor_schedule(request, pk):
+    """A doctor's appointments on ``?date=`` (default today), in time order."""
+    try:
+        principal = await aprincipal(request)
+        if not (principal.is_staff or principal.doctor_id == pk):
+            raise ApiError(403, 'not allowed')
+        day = _day(request)
+        rows = Appointment.objects.filter(doctor_id=pk, date=day).order_by('time', 'id').values(
+            'id', 'time', 'status', 'patient_id',
+            patient_first_name=F('patient__user__first_name'),
+            patient_last_name=F('patient__user__last_name'),
+        )
+        return json_response(request, {'date': day, 'results': [row async for row in rows]})
+    except ApiError as exc:
+        return error_response(request, exc)
+
+
+@require_GET
+async def patient_upcoming(request, pk):
+    """A patient's booked appointments from today on; doctors see only their own."""
+    try:
+        principal = await aprincipal(request)
+        rows = Appointment.objects.filter(patient_id=pk, status='BOOKED', date__gte=date.today())
+        if principal.doctor_id:
+            rows = rows.filter(doctor_id=principal.doctor_id)
+        elif not (principal.is_staff or principal.patient_id == pk):
+            raise ApiError(403, 'not allowed')
+        rows = rows.order_by('date', 'time', 'id').values(
+            'id', 'date', 'time', 'doctor_id',
+            doctor_first_name=F('doctor__user__first_name'),
+            doctor_last_name=F('doctor__user__last_name'),
+            specialty_name=F('doctor__specialty__name'),
+        )[:_limit(request)]
+        return json_response(request, {'results': [row async for row in rows]})
+    except ApiError as exc:
+        return error_response(request, exc)
+
+
+@require_GET
+async def doctor_availability(request, pk):
+    """Free slot start times for a doctor on ``?date=`` (default today), from the slot bitmap."""
+    try:
+        await aprincipal(request)
+        day = _day(request)
+        if not await Doctor.objects.filter(pk=pk).aexists():
+            raise ApiError(404, 'not found')
+        free = await availability.afree_day(pk, day)
+        return json_response(request, {'date': day, 'doctor_id': pk, 'slots': free})
+    except ApiError as exc:
+        return error_response(request, exc)
+
+
+class DoctorResource(Resource):
+    model = Doctor
+    fields = {
+        'id': 'id',
+        'user_id': 'user_id',
+        'first_name': 'user__first_name',
+        'last_name': 'user__last_name',
+        'email': 'user__email',
+        'specialty_id': 'specialty_id',
+        'specialty_name': 'specialty__name',
+        'contact': 'contact',
+    }
+    filters = {'specialty': 'specialty_id'}
+    form_fields = ['specialty', 'contact']
+
+    def scope(self, principal, queryset):
+        # Patients pick doctors from this directory, so everyone may read it.
+        return queryset
+
+    def create(self, principal, data):
+        form = self.validate(principal, data)
+        doctor = form.save(commit=False)
+        doctor.user = create_user(data)
+        doctor.save()
+        return doctor
+
+
+class AppointmentResource(Resource):
+    model = Appointment
+    fields = {
+        'id': 'id',
+        'date': 'date',
+        'time': 'time',
+        'status': 'status',
+        'patient_id': 'patient_id',
+        'patient_first_name': 'patient__user__first_name',
+        'patient_last_name': 'patient__user__last_name',
+        'doctor_id': 'doctor_id',
+        'doctor_first_name': 'doctor__user__first_name',
+        'doctor_last_name': 'doctor__user__last_name',
+    }
+    ordering = ['date', 'time', 'id']
+    filters = {
+        'doctor': 'doctor_id',
+        'patient': 'patient_id',
+        'status': 'status',
+        'from': 'date__gte',
+        'to': 'date__lte',
+    }
+    form_fields = ['patient', 'doctor', 'date', 'time', 'status']
+    atomic_create = False
+
+    def scope(self, principal, queryset):
+        if principal.is_staff:
+            return queryset
+        if principal.doctor_id:
+            return queryset.filter(doctor_id=principal.doctor_id)
+        return queryset.filter(patient_id=principal.patient_id)
+
+    def can_create(self, principal):
+        return principal.is_staff or principal.patient_id is not None
+
+    def can_update(self, principal, obj):
+        return True  # scope already limits callers to their own appointments
+
+    def prepare(self, principal, data, obj=None):
+        if principal.is_staff:
+            return data
+        if set(data) - {'status'}:
+            raise ApiError(403, 'only the status of an appointment can be changed')
+        if principal.patient_id and data.get('status') != 'CANCELLED':
+            raise ApiError(403, 'patients may only cancel appointments')
+        return data
+
+    def create(self, principal, data):
+        if not principal.is_staff:
+            return self.book(principal, data)
+        try:
+            with transaction.atomic():
+                return super().create(principal, data)
+        except IntegrityError:
+            raise ApiError(409, 'that slot is already booked')
+
+    def book(self, principal, data):
+        """Patients book through booking.book_appointment, with its slot checks and lock retries."""
+        form = modelform_factory(Appointment, fields=['doctor', 'date', 'time'])(data)
+        if not form.is_valid():
+            raise ApiError(400, 'invalid data', form.errors.get_json_data())
+        slot = form.cleaned_data
+        try:
+            return book_appointment(principal.patient_id, slot['doctor'].id, slot['date'], slot['time'])
+        except SlotUnavailable:
+            raise ApiError(409, 'that slot is already booked')
+        except BookingError as exc:
+            raise ApiError(400, str(exc))
+
+    def update(self, principal, obj, data):
+        if data == {'status': 'CANCELLED'}:
+            if not cancel_appointment(obj.pk):
+                raise ApiError(409, 'appointment is no longer booked')
+            return obj
+        try:
+            with transaction.atomic():
+                return super().update(principal, obj, data)
+        except IntegrityError:
+            raise ApiError(409, 'that slot is already booked')
+
+
+class MedicalRecordResource(Resource):
+    model = MedicalRecord
+    fields = {
+        'id': 'id',
+        'date': 'date',
+        'patient_id': 'patient_id',
+        'patient_first_name': 'patient__user__first_name',
+        'patient_last_name': 'patient__user__last_name',
+        'doctor_id': 'doctor_id',
+        'doctor_first_name': 'doctor__user__first_name',
+        'doctor_last_name': 'doctor__user__last_name',
+        'diagnosis': 'diagnosis',
+        'treatment': 'treatment',
+    }
+    ordering = ['-date', '-id']
+    filters = {'patient': 'patient_id', 'doctor': 'doctor_id'}
+    form_fields = ['patient', 'doctor', 'diagnosis', 'treatment']
+
+    def scope(self, principal, queryset):
+        if principal.is_staff or principal.doctor_id:
+            return queryset
+        return queryset.filter(patient_id=principal.patient_id)
+
+    def filter_queryset(self, params, queryset):
+        queryset = super().filter_queryset(params, queryset)
+        if params.get('q'):
+            queryset = filter_records(queryset, params['q'])
+        return queryset
+
+    def can_create(self, principal):
+        return principal.is_staff or principal.doctor_id is not None
+
+    def can_update(self, principal, obj):
+        return principal.is_staff or obj.doctor_id == principal.doctor_id
+
+    def prepare(self, principal, data, obj=None):
+        if principal.is_staff:
+            return data
+        # Doctors author records under their own name and cannot move them between patients.
+        data = {**data, 'doctor': principal.doctor_id}
+        if obj is not None:
+            data['patient'] = obj.patient_id
+        return data
+
+
+doctors = DoctorResource()
+appointments = AppointmentResource()
+records = MedicalRecordResource()
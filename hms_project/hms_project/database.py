@@ -0,0 +1,110 @@
+"""Database profiles, chosen with the HMS_DB_PROFILE environment variable.
+
+``sqlite`` (the default) is the project's db.sqlite3 tuned for several
+concurrent Streamlit sessions: WAL so readers never block the writer,
+``synchronous=NORMAL`` (safe under WAL), a busy timeout instead of an
+immediate "database is locked", a memory map and a larger page cache.
+Transactions start IMMEDIATE so a booking takes the write lock up front
+rather than failing to upgrade a read lock half way through.
+
+``sqlite-plain`` is the untuned SQLite setup, kept for comparison.
+
+``postgres`` reads HMS_DB_NAME, HMS_DB_USER, HMS_DB_PASSWORD, HMS_DB_HOST
+and HMS_DB_PORT. Connections persist for HMS_DB_CONN_MAX_AGE seconds, or,
+with HMS_DB_POOL set to a max size, come from psycopg's connection pool
+(needs ``psycopg[pool]``).
+
+HMS_DB_REPLICAS adds read replicas as aliases ``replica1``, ``replica2``...:
+a comma-separated list of SQLite files (relative to the project, kept in
+step by the replicate_sqlite command) or, for postgres, of ``host[:port]``.
+core.routing sends reads there.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ['sqlite', 'sqlite-plain', 'postgres']
+
+
+def _int(env, name, default):
+    try:
+        return int(env.get(name, default))
+    except ValueError:
+        raise ImproperlyConfigured(f'{name} must be an integer')
+
+
+def sqlite_pragmas(env, replica=False):
+    cache_mb = _int(env, 'HMS_SQLITE_CACHE_MB', 64)
+    if replica:
+        # Replicas take their journal mode from the copy and refuse writes.
+        mode = ['PRAGMA query_only=ON']
+    else:
+        mode = ['PRAGMA journal_mode=WAL', 'PRAGMA synchronous=NORMAL']
+    return mode + [
+        'PRAGMA busy_timeout=%d' % _int(env, 'HMS_SQLITE_BUSY_TIMEOUT_MS', 5000),
+        'PRAGMA mmap_size=%d' % (_int(env, 'HMS_SQLITE_MMAP_MB', 256) * 1024 * 1024),
+        'PRAGMA cache_size=%d' % (-cache_mb * 1024),  # negative: KiB rather than pages
+    ]
+
+
+def database(env, base_dir):
+    """The ``DATABASES['default']`` entry for the profile named in ``env``."""
+    profile = env.get('HMS_DB_PROFILE', 'sqlite')
+    if profile == 'sqlite-plain':
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env.get('HMS_DB_NAME', base_dir / 'db.sqlite3'),
+        }
+    if profile == 'sqlite':
+        return {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': env.get('HMS_DB_NAME', base_dir / 'db.sqlite3'),
+            'OPTIONS': {
+                'init_command': ';'.join(sqlite_pragmas(env)),
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': _int(env, 'HMS_SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+            },
+        }
+    if profile == 'postgres':
+        config = {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': env.get('HMS_DB_NAME', 'hms'),
+            'USER': env.get('HMS_DB_USER', ''),
+            'PASSWORD': env.get('HMS_DB_PASSWORD', ''),
+            'HOST': env.get('HMS_DB_HOST', ''),
+            'PORT': env.get('HMS_DB_PORT', ''),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
+        pool = _int(env, 'HMS_DB_POOL', 0)
+        if pool:
+            # Pooled connections go back to the pool after each request, so
+            # Django refuses persistent connections alongside them.
+            config['CONN_MAX_AGE'] = 0
+            config['OPTIONS']['pool'] = {'min_size': min(2, pool), 'max_size': pool, 'timeout': 10}
+        else:
+            config['CONN_MAX_AGE'] = _int(env, 'HMS_DB_CONN_MAX_AGE', 60)
+        return config
+    raise ImproperlyConfigured(f'HMS_DB_PROFILE must be one of {", ".join(PROFILES)}, not {profile!r}')
+
+
+def replicas(env, base_dir):
+    """``DATABASES`` entries for the read replicas named in HMS_DB_REPLICAS."""
+    names = [name.strip() for name in env.get('HMS_DB_REPLICAS', '').split(',') if name.strip()]
+    if not names:
+        return {}
+    primary = database(env, base_dir)
+    configs = {}
+    for i, name in enumerate(names, 1):
+        # Tests run against the primary alone.
+        config = dict(primary, OPTIONS=dict(primary.get('OPTIONS', {})), TEST={'MIRROR': 'default'})
+        if primary['ENGINE'] == 'django.db.backends.sqlite3':
+            config['NAME'] = base_dir / name
+            config['OPTIONS'] = {
+                'init_command': ';'.join(sqlite_pragmas(env, replica=True)),
+                'timeout': _int(env, 'HMS_SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+            }
+        else:
+            host, _, port = name.partition(':')
+            config.update(HOST=host, PORT=port or primary['PORT'])
+            config['OPTIONS']['options'] = '-c default_transaction_read_only=on'
+        configs[f'replica{i}'] = config
+    return configs
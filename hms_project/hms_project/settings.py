@@ -10,8 +10,12 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+from datetime import time
 from pathlib import Path
 
+from .database import database, replicas
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -49,6 +53,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routing.StickyPrimaryMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -76,13 +81,92 @@ WSGI_APPLICATION = 'hms_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# Pick a profile with HMS_DB_PROFILE; see hms_project/database.py.
+
 DATABASES = {
+    'default': database(os.environ, BASE_DIR),
+    **replicas(os.environ, BASE_DIR),
+}
+
+# Reads go to a replica when there is one, except within a transaction or
+# for HMS_REPLICA_STICKY_SECONDS after the same session wrote anything.
+DATABASE_ROUTERS = ['core.routing.ReplicaRouter']
+HMS_REPLICA_STICKY_SECONDS = int(os.environ.get('HMS_REPLICA_STICKY_SECONDS', 10))
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# The dashboard counters live here. Local memory is per process, so point this
+# at a shared backend (Redis, Memcached) when reconcile_metrics runs out of
+# process or several Streamlit servers share a database.
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
 
+# Cached metrics are recounted from the database at least this often.
+HMS_METRICS_RECONCILE_SECONDS = 300
+
+
+# Appointment slots
+
+HMS_WORKING_HOURS = (time(9, 0), time(17, 0))
+HMS_SLOT_MINUTES = 30
+
+# Finished appointments and medical records older than this many days are
+# moved to the archive tables by the archive_hms command.
+HMS_ARCHIVE_AFTER_DAYS = int(os.environ.get('HMS_ARCHIVE_AFTER_DAYS', 730))
+
+# Medical record text at least HMS_TEXT_COMPRESSION_MIN_BYTES long can be
+# stored compressed on SQLite: 'zlib' or 'zstd' (needs the zstandard package).
+# Off by default, since full-text scans (search index rebuilds, exports) pay
+# to decompress every body. Existing rows follow a change after the
+# recompress_records command.
+HMS_TEXT_COMPRESSION = os.environ.get('HMS_TEXT_COMPRESSION', 'off')
+HMS_TEXT_COMPRESSION_MIN_BYTES = int(os.environ.get('HMS_TEXT_COMPRESSION_MIN_BYTES', 512))
+
+
+# Notifications
+# Booking, cancellation and reminder emails wait in the outbox table until
+# deliver_notifications sends them through this relay. `manage.py mail_sink`
+# runs a local stand-in on the default port.
+
+EMAIL_HOST = os.environ.get('HMS_EMAIL_HOST', 'localhost')
+EMAIL_PORT = int(os.environ.get('HMS_EMAIL_PORT', 1025))
+EMAIL_HOST_USER = os.environ.get('HMS_EMAIL_USER', '')
+EMAIL_HOST_PASSWORD = os.environ.get('HMS_EMAIL_PASSWORD', '')
+EMAIL_USE_TLS = os.environ.get('HMS_EMAIL_TLS') == '1'
+EMAIL_TIMEOUT = 10
+DEFAULT_FROM_EMAIL = os.environ.get('HMS_FROM_EMAIL', 'appointments@hms.local')
+
+# schedule_reminders queues a reminder for appointments starting within this many hours.
+HMS_REMINDER_HOURS = int(os.environ.get('HMS_REMINDER_HOURS', 24))
+
+
+# Instrumentation
+# Every Streamlit page render is logged to hms.perf: INFO with its timings,
+# WARNING once it takes longer than HMS_SLOW_PAGE_MS. Set HMS_PERF_PANEL=1 to
+# show the numbers in the app's sidebar.
+
+HMS_SLOW_PAGE_MS = 500
+HMS_PERF_PANEL = os.environ.get('HMS_PERF_PANEL') == '1'
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'hms.perf': {
+            'handlers': ['console'],
+            'level': os.environ.get('HMS_PERF_LOG_LEVEL', 'WARNING'),
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -102,6 +186,10 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# At most this many Streamlit sign-ins hash a password at once; the rest wait.
+# The hash releases the GIL, so other sessions keep running while one logs in.
+HMS_AUTH_WORKERS = int(os.environ.get('HMS_AUTH_WORKERS', 2))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
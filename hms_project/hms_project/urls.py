@@ -24,4 +24,7 @@ def home(request):
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', home, name='home'),
+    path('', include('core.urls')),
+    path('', include('patient_app.urls')),
+    path('', include('doctor_app.urls')),
 ]
@@ -1,8 +1,17 @@
 from django.contrib import admin
+from core.changelists import AgeBandFilter, LargeTableAdmin
 from .models import Patient
+from .search import filter_patients
 
 @admin.register(Patient)
-class PatientAdmin(admin.ModelAdmin):
+class PatientAdmin(LargeTableAdmin):
     list_display = ['user', 'age', 'gender', 'contact']
-    search_fields = ['user__first_name', 'user__last_name', 'user__email']
-    list_filter = ['gender', 'age']
\ No newline at end of file
+    list_select_related = ['user']
+    search_fields = ['user__first_name', 'user__last_name', 'user__email', 'contact']
+    list_filter = ['gender', AgeBandFilter]
+    
+    def get_search_results(self, request, queryset, search_term):
+        # search_fields only switches the search box on; matching goes through the index.
+        if not search_term.strip():
+            return queryset, False
+        return filter_patients(queryset, search_term), False
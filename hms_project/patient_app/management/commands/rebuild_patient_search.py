@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from patient_app.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the patient name/email/contact search index from the patient table'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'Indexed {rebuild_index()} patients')
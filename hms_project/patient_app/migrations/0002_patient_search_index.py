@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# An FTS5 trigram table over the searchable patient columns, keyed by patient
+# id and kept in sync by triggers so bulk inserts and raw updates are covered
+# too. Other backends fall back to ORM lookups in patient_app.search.
+FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS patient_app_patient_search USING fts5(
+        first_name, last_name, email, contact, tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS patient_search_insert AFTER INSERT ON patient_app_patient BEGIN
+        INSERT INTO patient_app_patient_search (rowid, first_name, last_name, email, contact)
+        SELECT new.id, u.first_name, u.last_name, u.email, new.contact
+        FROM auth_user u WHERE u.id = new.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS patient_search_update
+    AFTER UPDATE OF user_id, contact ON patient_app_patient BEGIN
+        DELETE FROM patient_app_patient_search WHERE rowid = old.id;
+        INSERT INTO patient_app_patient_search (rowid, first_name, last_name, email, contact)
+        SELECT new.id, u.first_name, u.last_name, u.email, new.contact
+        FROM auth_user u WHERE u.id = new.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS patient_search_delete AFTER DELETE ON patient_app_patient BEGIN
+        DELETE FROM patient_app_patient_search WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS patient_search_user_update
+    AFTER UPDATE OF first_name, last_name, email ON auth_user BEGIN
+        UPDATE patient_app_patient_search
+        SET first_name = new.first_name, last_name = new.last_name, email = new.email
+        WHERE rowid = (SELECT id FROM patient_app_patient WHERE user_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO patient_app_patient_search (rowid, first_name, last_name, email, contact)
+    SELECT p.id, u.first_name, u.last_name, u.email, p.contact
+    FROM patient_app_patient p JOIN auth_user u ON u.id = p.user_id
+    """,
+]
+
+BACKWARD = [
+    'DROP TRIGGER IF EXISTS patient_search_user_update',
+    'DROP TRIGGER IF EXISTS patient_search_delete',
+    'DROP TRIGGER IF EXISTS patient_search_update',
+    'DROP TRIGGER IF EXISTS patient_search_insert',
+    'DROP TABLE IF EXISTS patient_app_patient_search',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_app', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD), run_sqlite(BACKWARD)),
+    ]
@@ -0,0 +1,75 @@
+from django.db import migrations
+
+# The trigram table cannot match words shorter than three characters, so a
+# word-prefix FTS5 table over the same columns serves them ("Jo Smith", the
+# first keystrokes of the picker). Kept in sync by triggers like the trigram
+# table.
+FORWARD = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS patient_app_patient_prefix USING fts5(
+        first_name, last_name, email, contact, tokenize='unicode61', prefix='1 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS patient_prefix_insert AFTER INSERT ON patient_app_patient BEGIN
+        INSERT INTO patient_app_patient_prefix (rowid, first_name, last_name, email, contact)
+        SELECT new.id, u.first_name, u.last_name, u.email, new.contact
+        FROM auth_user u WHERE u.id = new.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS patient_prefix_update
+    AFTER UPDATE OF user_id, contact ON patient_app_patient BEGIN
+        DELETE FROM patient_app_patient_prefix WHERE rowid = old.id;
+        INSERT INTO patient_app_patient_prefix (rowid, first_name, last_name, email, contact)
+        SELECT new.id, u.first_name, u.last_name, u.email, new.contact
+        FROM auth_user u WHERE u.id = new.user_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS patient_prefix_delete AFTER DELETE ON patient_app_patient BEGIN
+        DELETE FROM patient_app_patient_prefix WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS patient_prefix_user_update
+    AFTER UPDATE OF first_name, last_name, email ON auth_user BEGIN
+        UPDATE patient_app_patient_prefix
+        SET first_name = new.first_name, last_name = new.last_name, email = new.email
+        WHERE rowid = (SELECT id FROM patient_app_patient WHERE user_id = new.id);
+    END
+    """,
+    """
+    INSERT INTO patient_app_patient_prefix (rowid, first_name, last_name, email, contact)
+    SELECT p.id, u.first_name, u.last_name, u.email, p.contact
+    FROM patient_app_patient p JOIN auth_user u ON u.id = p.user_id
+    """,
+]
+
+BACKWARD = [
+    'DROP TRIGGER IF EXISTS patient_prefix_user_update',
+    'DROP TRIGGER IF EXISTS patient_prefix_delete',
+    'DROP TRIGGER IF EXISTS patient_prefix_update',
+    'DROP TRIGGER IF EXISTS patient_prefix_insert',
+    'DROP TABLE IF EXISTS patient_app_patient_prefix',
+]
+
+
+def run_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('patient_app', '0002_patient_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite(FORWARD), run_sqlite(BACKWARD)),
+    ]
@@ -0,0 +1,13 @@
+from django.db.models import F
+
+from core.pagination import DEFAULT_PAGE_SIZE, keyset_page
+from .models import Patient
+
+
+def patient_list(after=None, size=DEFAULT_PAGE_SIZE):
+    rows = Patient.objects.values(
+        'id', 'age', 'gender', 'contact',
+        first_name=F('user__first_name'),
+        last_name=F('user__last_name'),
+    )
+    return keyset_page(rows, ['id'], after, size)
@@ -0,0 +1,110 @@
+from django.db import connection
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Patient
+
+DEFAULT_LIMIT = 20
+SEARCH_TABLE = 'patient_app_patient_search'
+# Word-prefix table for the terms too short for the trigram one.
+PREFIX_TABLE = 'patient_app_patient_prefix'
+# The trigram tokenizer cannot match terms shorter than one trigram.
+MIN_TRIGRAM = 3
+
+
+def _uses_index():
+    return connection.vendor == 'sqlite'
+
+
+def _match_expression(words, prefix=False):
+    # Quote every word so user input is never parsed as FTS5 query syntax.
+    return ' '.join('"%s"%s' % (word.replace('"', '""'), '*' if prefix else '') for word in words)
+
+
+def _index_match(words):
+    # Long words match anywhere through the trigram table, short ones the
+    # start of a word through the prefix table; both are index lookups.
+    long = [word for word in words if len(word) >= MIN_TRIGRAM]
+    short = [word for word in words if len(word) < MIN_TRIGRAM]
+    if long:
+        sql = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        params = [_match_expression(long)]
+        if short:
+            sql += f' AND rowid IN (SELECT rowid FROM {PREFIX_TABLE} WHERE {PREFIX_TABLE} MATCH %s)'
+            params.append(_match_expression(short, prefix=True))
+    else:
+        sql = f'SELECT rowid FROM {PREFIX_TABLE} WHERE {PREFIX_TABLE} MATCH %s'
+        params = [_match_expression(short, prefix=True)]
+    return sql, params
+
+
+def _index_search_ids(words, limit):
+    sql, params = _index_match(words)
+    with connection.cursor() as cursor:
+        cursor.execute(sql + ' ORDER BY rank LIMIT %s', params + [limit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _orm_condition(words):
+    condition = Q()
+    for word in words:
+        lookup = 'istartswith' if len(word) < MIN_TRIGRAM else 'icontains'
+        condition &= (
+            Q(**{f'user__first_name__{lookup}': word})
+            | Q(**{f'user__last_name__{lookup}': word})
+            | Q(**{f'user__email__{lookup}': word})
+            | Q(**{f'contact__{lookup}': word})
+        )
+    return condition
+
+
+def _orm_search_ids(words, limit):
+    return list(Patient.objects.filter(_orm_condition(words)).order_by('id').values_list('id', flat=True)[:limit])
+
+
+def search_patient_ids(term, limit=DEFAULT_LIMIT):
+    """Ids of the best ``limit`` patients whose name, email or contact contain every word of ``term``."""
+    words = term.split()
+    if not words:
+        return []
+    if not _uses_index():
+        return _orm_search_ids(words, limit)
+    return _index_search_ids(words, limit)
+
+
+def filter_patients(patients, term):
+    """``patients`` narrowed to those matching every word of ``term``, unranked and uncapped, for paged lists."""
+    words = term.split()
+    if not words:
+        return patients
+    if not _uses_index():
+        return patients.filter(_orm_condition(words))
+    return patients.filter(id__in=RawSQL(*_index_match(words)))
+
+
+def search_patients(term, limit=DEFAULT_LIMIT):
+    """Ranked picker rows for ``term``: id, names, email and contact."""
+    ids = search_patient_ids(term, limit)
+    rows = Patient.objects.filter(id__in=ids).values(
+        'id', 'contact',
+        first_name=F('user__first_name'),
+        last_name=F('user__last_name'),
+        email=F('user__email'),
+    )
+    by_id = {row['id']: row for row in rows}
+    return [by_id[pk] for pk in ids if pk in by_id]
+
+
+def rebuild_index():
+    """Repopulate the search tables from scratch, e.g. after a raw data load."""
+    if not _uses_index():
+        return 0
+    with connection.cursor() as cursor:
+        for table in (SEARCH_TABLE, PREFIX_TABLE):
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(
+                f'INSERT INTO {table} (rowid, first_name, last_name, email, contact) '
+                'SELECT p.id, u.first_name, u.last_name, u.email, p.contact '
+                'FROM patient_app_patient p JOIN auth_user u ON u.id = p.user_id'
+            )
+        return cursor.rowcount
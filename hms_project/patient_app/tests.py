@@ -1,3 +1,129 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth.models import User
+from patient_app.models import Patient
+from patient_app.search import search_patient_ids, search_patients, rebuild_index
+from datetime import date
 
-# Create your tests here.
+
+class PatientSearchTests(TestCase):
+    
+    def setUp(self):
+        self.patients = {}
+        for username, first, last, email, contact in [
+            ('ada', 'Ada', 'Lovelace', 'ada@analytical.org', '5550001111'),
+            ('alan', 'Alan', 'Turing', 'alan@bletchley.uk', '5550002222'),
+            ('grace', 'Grace', 'Hopper', 'grace@navy.mil', '5550003333'),
+        ]:
+            user = User.objects.create_user(username=username, email=email, first_name=first, last_name=last)
+            self.patients[username] = Patient.objects.create(
+                user=user,
+                age=36,
+                gender='F',
+                contact=contact,
+                address='Lab',
+                date_of_birth=date(1988, 12, 10)
+            )
+    
+    def ids(self, *usernames):
+        return {self.patients[u].id for u in usernames}
+    
+    def test_substring_matches(self):
+        """Test substrings of names, emails and contacts match"""
+        self.assertEqual(set(search_patient_ids('love')), self.ids('ada'))
+        self.assertEqual(set(search_patient_ids('bletchley')), self.ids('alan'))
+        self.assertEqual(set(search_patient_ids('0003')), self.ids('grace'))
+        self.assertEqual(set(search_patient_ids('555000')), self.ids('ada', 'alan', 'grace'))
+    
+    def test_every_word_must_match(self):
+        """Test multi-word terms narrow results and are case insensitive"""
+        self.assertEqual(search_patient_ids('GRACE hop'), [self.patients['grace'].id])
+        self.assertEqual(search_patient_ids('grace turing'), [])
+    
+    def test_short_terms_prefix_match(self):
+        """Test terms shorter than a trigram prefix match through the index, alone or beside longer words"""
+        self.assertEqual(set(search_patient_ids('Al')), self.ids('alan'))
+        self.assertEqual(set(search_patient_ids('a')), self.ids('ada', 'alan'))
+        self.assertEqual(search_patient_ids('Al turing'), [self.patients['alan'].id])
+        self.assertEqual(search_patient_ids('Gr turing'), [])
+        self.assertEqual(search_patient_ids('  '), [])
+        with CaptureQueriesContext(connection) as queries:
+            search_patient_ids('Al tur')
+        self.assertNotIn('auth_user', queries[0]['sql'])
+    
+    def test_limit_and_rows(self):
+        """Test picker rows come back joined and capped at the limit"""
+        rows = search_patients('555', limit=2)
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(set(rows[0]), {'id', 'first_name', 'last_name', 'email', 'contact'})
+    
+    def test_index_follows_changes(self):
+        """Test user renames, contact edits and deletes reach the index"""
+        user = self.patients['ada'].user
+        user.last_name = 'King'
+        user.save()
+        self.assertEqual(search_patient_ids('love'), [])
+        self.assertEqual(search_patient_ids('king'), [self.patients['ada'].id])
+        
+        grace = self.patients['grace']
+        grace.contact = '7778889999'
+        grace.save()
+        self.assertEqual(search_patient_ids('8889'), [grace.id])
+        
+        grace.delete()
+        self.assertEqual(search_patient_ids('grace'), [])
+    
+    def test_quotes_are_not_query_syntax(self):
+        """Test FTS operators in the term are treated as text"""
+        self.assertEqual(search_patient_ids('"ada OR'), [])
+        self.assertEqual(search_patient_ids('ada*'), [])
+    
+    def test_rebuild(self):
+        """Test rebuilding indexes every patient"""
+        self.assertEqual(rebuild_index(), 3)
+        self.assertEqual(set(search_patient_ids('555')), self.ids('ada', 'alan', 'grace'))
+    
+    def test_admin_search_uses_index(self):
+        """Test admin changelist search goes through the index"""
+        admin = User.objects.create_superuser(username='root', email='root@test.com', password=None)
+        self.client.force_login(admin)
+        response = self.client.get('/admin/patient_app/patient/', {'q': 'opper'})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Grace Hopper')
+        self.assertNotContains(response, 'Alan Turing')
+
+
+class PatientApiTests(TestCase):
+    
+    def setUp(self):
+        self.staff = User.objects.create_user(username='staff', is_staff=True)
+    
+    def test_staff_registers_patient_and_patient_sees_self(self):
+        """Test staff create patients and patients only read their own profile"""
+        self.client.force_login(self.staff)
+        response = self.client.post('/api/patients/', {
+            'email': 'marge@test.com', 'first_name': 'Marge', 'last_name': 'Bouvier', 'age': 34,
+            'gender': 'F', 'contact': '5551234', 'address': '742 Evergreen Terrace', 'date_of_birth': '1990-03-19',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        marge = response.json()
+        self.assertEqual(marge['email'], 'marge@test.com')
+        
+        response = self.client.post('/api/patients/', {'email': 'bad@test.com', 'age': 'old'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(username='bad@test.com').exists())
+        
+        self.assertEqual(self.client.get('/api/patients/', {'q': 'bouv'}).json()['results'][0]['id'], marge['id'])
+        for n in range(3):
+            Patient.objects.create(user=User.objects.create_user(f'b{n}', first_name='Jacqueline', last_name='Bouvier'),
+                                   age=60, gender='F', contact=str(n), address='x', date_of_birth=date(1960, 1, 1))
+        first = self.client.get('/api/patients/', {'q': 'bouv', 'limit': 2}).json()
+        second = self.client.get('/api/patients/', {'q': 'bouv', 'limit': 2, 'cursor': first['next']}).json()
+        self.assertEqual(len(first['results'] + second['results']), 4)
+        self.assertIsNone(second['next'])
+        
+        self.client.force_login(User.objects.get(username='marge@test.com'))
+        self.assertEqual(len(self.client.get('/api/patients/').json()['results']), 1)
+        response = self.client.patch(f"/api/patients/{marge['id']}/", {'contact': '5559999'}, content_type='application/json')
+        self.assertEqual(response.json()['contact'], '5559999')
@@ -0,0 +1,8 @@
+from django.urls import path
+
+from . import views
+
+urlpatterns = [
+    path('api/patients/', views.patients.collection_view, name='api_patients'),
+    path('api/patients/<int:pk>/', views.patients.item_view, name='api_patient'),
+]
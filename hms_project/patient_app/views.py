@@ -1,3 +1,45 @@
-from django.shortcuts import render
+from core.api import Resource, create_user
+from .models import Patient
+from .search import filter_patients
 
-# Create your views here.
+
+class PatientResource(Resource):
+    model = Patient
+    fields = {
+        'id': 'id',
+        'user_id': 'user_id',
+        'first_name': 'user__first_name',
+        'last_name': 'user__last_name',
+        'email': 'user__email',
+        'age': 'age',
+        'gender': 'gender',
+        'contact': 'contact',
+        'address': 'address',
+        'date_of_birth': 'date_of_birth',
+    }
+    filters = {'gender': 'gender'}
+    form_fields = ['age', 'gender', 'contact', 'address', 'date_of_birth']
+
+    def scope(self, principal, queryset):
+        if principal.is_staff or principal.doctor_id:
+            return queryset
+        return queryset.filter(id=principal.patient_id)
+
+    def filter_queryset(self, params, queryset):
+        queryset = super().filter_queryset(params, queryset)
+        if params.get('q'):
+            queryset = filter_patients(queryset, params['q'])
+        return queryset
+
+    def can_update(self, principal, obj):
+        return principal.is_staff or obj.id == principal.patient_id
+
+    def create(self, principal, data):
+        form = self.validate(principal, data)
+        patient = form.save(commit=False)
+        patient.user = create_user(data)
+        patient.save()
+        return patient
+
+
+patients = PatientResource()